@@ -3,16 +3,174 @@ import openai
 import json
 import re
 import csv
-import requests
+import base64
+import asyncio
+import contextvars
+import threading
+import time
+import weakref
 import yaml
 import statistics as st
+from openai import AsyncOpenAI
+from openai.types.chat import ChatCompletion
 from bs4 import BeautifulSoup
 from dotenv import load_dotenv
+from utils.completion_cache import CompletionCache, get_completion_cache
+from utils.image_cache import ImageCache, get_image_cache
+from utils.image_tiers import fallback_tier, image_request_params, select_image_tier
+from utils.rate_limiter import RateLimiter, get_rate_limiter
+from utils.retry_policy import get_retry_policy, request_with_retry
+from utils.token_ledger import current_stage, get_token_ledger
 
 # .env から APIキーを読み込む
 load_dotenv()
 openai.api_key = os.getenv("OPENAI_API_KEY")
 
+# 非同期生成エンジン用の共有クライアント（イベントループごとに1つ）
+_async_clients = weakref.WeakKeyDictionary()
+_async_clients_lock = threading.Lock()
+
+# 同期APIから非同期APIを呼び出すためのバックグラウンドイベントループ
+_sync_loop = None
+_sync_loop_lock = threading.Lock()
+
+def get_async_client() -> AsyncOpenAI:
+    """
+    実行中のイベントループで共有する AsyncOpenAI クライアントを取得
+    同じループ上の記事・ステージはすべてこのクライアント（接続プール）を共有する
+    """
+    loop = asyncio.get_running_loop()
+    with _async_clients_lock:
+        client = _async_clients.get(loop)
+        if client is None:
+            # 再試行は utils.retry_policy で一元管理するためSDK側の自動リトライは無効化
+            client = AsyncOpenAI(api_key=openai.api_key, max_retries=0)
+            _async_clients[loop] = client
+    return client
+
+def _get_sync_loop() -> asyncio.AbstractEventLoop:
+    """
+    同期ラッパー用のバックグラウンドイベントループを取得（初回のみ起動）
+    """
+    global _sync_loop
+    with _sync_loop_lock:
+        if _sync_loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="generate-article-loop", daemon=True).start()
+            _sync_loop = loop
+    return _sync_loop
+
+async def _run_in_context(coro, context: contextvars.Context):
+    """
+    呼び出し元のコンテキスト変数（記事のトークン台帳・ステージ名）を引き継いでコルーチンを実行
+    （バックグラウンドループのタスクはループのスレッドのコンテキストで作られるため）
+    """
+    for var, value in context.items():
+        var.set(value)
+    return await coro
+
+def _submit_to_sync_loop(coro):
+    """呼び出し元のコンテキストを引き継いでバックグラウンドループで実行（concurrent.futures.Future を返す）"""
+    return asyncio.run_coroutine_threadsafe(
+        _run_in_context(coro, contextvars.copy_context()), _get_sync_loop()
+    )
+
+def run_sync(coro):
+    """
+    *_async 関数を同期的に実行して結果を返す
+    どのスレッドから呼ばれても共有のバックグラウンドループ上で実行する
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return _submit_to_sync_loop(coro).result()
+    coro.close()
+    raise RuntimeError("イベントループ内では同期関数ではなく *_async 関数を await してください")
+
+async def _collect_chat_stream(on_delta, **kwargs) -> ChatCompletion:
+    """
+    stream=True で呼び出し、受信した断片を on_delta に渡しながら通常の応答と同じ形にまとめる
+    """
+    stream = await get_async_client().chat.completions.create(
+        stream=True,
+        stream_options={"include_usage": True},
+        **kwargs
+    )
+    parts = []
+    finish_reason = None
+    usage = None
+    response_id, created, model = "", 0, kwargs.get("model")
+    async for chunk in stream:
+        response_id, created, model = chunk.id, chunk.created, chunk.model
+        if chunk.usage:
+            usage = chunk.usage.model_dump()
+        for choice in chunk.choices:
+            if choice.delta.content:
+                parts.append(choice.delta.content)
+                on_delta(choice.delta.content)
+            if choice.finish_reason:
+                finish_reason = choice.finish_reason
+
+    return ChatCompletion.model_validate({
+        "id": response_id,
+        "object": "chat.completion",
+        "created": created,
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "finish_reason": finish_reason or "stop",
+            "message": {"role": "assistant", "content": "".join(parts)}
+        }],
+        "usage": usage
+    })
+
+async def _create_chat_completion(cache: bool = False, on_delta=None, stage: str = None, **kwargs):
+    """
+    Chat Completions 呼び出しの共通入口（すべての生成関数はここを経由する）
+    cache=True を指定した呼び出しだけが永続キャッシュを読み書きする
+    （同じキーワードの再実行で本文が同一にならないよう、リード文・章・タイトルなどの創作的な呼び出しはキャッシュしない。
+      画像プロンプト・SEO情報のような低温度の構造化出力だけが指定する）
+    on_delta を指定するとストリーミングで呼び出し、受信した断片を順次渡す（キャッシュ命中時は全文を1回で渡す）
+    stage はトークン台帳に記録するステージ名
+    """
+    stage = stage or current_stage()
+    started = time.monotonic()
+    completion_cache = get_completion_cache() if cache else None
+    if completion_cache:
+        cache_key = CompletionCache.make_key(**kwargs)
+        cached = completion_cache.get(cache_key)
+        if cached is not None:
+            response = ChatCompletion.model_validate_json(cached)
+            get_token_ledger().record_chat(stage, kwargs.get("model"), response.usage, time.monotonic() - started, cache_hit=True)
+            if on_delta:
+                on_delta(response.choices[0].message.content or "")
+            return response
+
+    # 全プロセス共通のRPM/TPM枠を試行ごとに確保してから呼び出し、実際の usage で見積もりを補正する
+    model = kwargs.get("model")
+    limiter = get_rate_limiter()
+    policy = get_retry_policy("openai_chat")
+    estimated_tokens = RateLimiter.estimate_tokens(kwargs.get("messages"), kwargs.get("max_tokens"))
+
+    async def send():
+        await limiter.acquire_async(model, estimated_tokens)
+        try:
+            if on_delta:
+                return await _collect_chat_stream(on_delta, timeout=policy.timeout, **kwargs)
+            return await get_async_client().chat.completions.create(timeout=policy.timeout, **kwargs)
+        except Exception:
+            limiter.record_usage(model, estimated_tokens, 0)
+            raise
+
+    response = await policy.call_async(send)
+    limiter.record_usage(model, estimated_tokens, response.usage.total_tokens if response.usage else estimated_tokens)
+    get_token_ledger().record_chat(stage, model, response.usage, time.monotonic() - started)
+
+    # 途中で打ち切られた応答は再利用しない
+    if completion_cache and response.choices and response.choices[0].finish_reason == "stop":
+        completion_cache.set(cache_key, response.model_dump_json())
+    return response
+
 # 新しいキーワード管理システム用の定数とインポート
 NEW_KEYWORDS_CSV = "keywords.csv"  # 新しいキーワードファイル（統合形式）
 INDEX_FILE = "current_index.txt"
@@ -127,7 +285,7 @@ def get_next_keyword_legacy(col: int = 0) -> str:
         f.write(str((idx + 1) % len(keywords)))
     return keyword
 
-def generate_integrated_article_from_keywords(keyword_group: dict, style_features: dict = None, num_sections: int = 5) -> dict:
+async def generate_integrated_article_from_keywords_async(keyword_group: dict, style_features: dict = None, num_sections: int = 5) -> dict:
     """
     複数キーワードを統合したSEO効果的な記事を生成
     """
@@ -157,13 +315,13 @@ def generate_integrated_article_from_keywords(keyword_group: dict, style_feature
     # スタイルガイド使用判定
     if style_features and not style_features.get('error'):
         print("🎨 スタイルガイド付きで記事生成")
-        article = generate_keyword_article_with_style_integrated(integrated_prompt, keywords, style_features, num_sections)
+        article = await generate_keyword_article_with_style_integrated_async(integrated_prompt, keywords, style_features, num_sections)
     else:
         print("📝 標準モードで記事生成")
-        article = generate_article_html_integrated(integrated_prompt, keywords, num_sections)
+        article = await generate_article_html_integrated_async(integrated_prompt, keywords, num_sections)
     
     # 生成された記事に基づいて最適なタイトルを生成
-    optimized_title = generate_optimized_title_from_content(article['content'], keywords, primary_keyword)
+    optimized_title = await generate_optimized_title_from_content_async(article['content'], keywords, primary_keyword)
     article['title'] = optimized_title
     
     # カテゴリ情報を追加
@@ -175,7 +333,13 @@ def generate_integrated_article_from_keywords(keyword_group: dict, style_feature
     
     return article
 
-def generate_optimized_title_from_content(content: str, keywords: list, primary_keyword: str) -> str:
+def generate_integrated_article_from_keywords(keyword_group: dict, style_features: dict = None, num_sections: int = 5) -> dict:
+    """
+    generate_integrated_article_from_keywords_async の同期版
+    """
+    return run_sync(generate_integrated_article_from_keywords_async(keyword_group, style_features, num_sections))
+
+async def generate_optimized_title_from_content_async(content: str, keywords: list, primary_keyword: str) -> str:
     """
     完成した記事内容に基づいて最適なタイトルを生成
     """
@@ -214,7 +378,8 @@ JSONで{{"title": "..."}}の形で返してください。
 """
     
     try:
-        resp = openai.chat.completions.create(
+        resp = await _create_chat_completion(
+            stage="title_from_content",
             model="gpt-4o",
             messages=[
                 {"role": "system", "content": title_prompt},
@@ -228,7 +393,13 @@ JSONで{{"title": "..."}}の形で返してください。
     except Exception as e:
         print(f"⚠️ タイトル生成エラー: {e}")
         # フォールバック：従来方式
-        return generate_title_variants(f"{primary_keyword}について", n=1)[0]
+        return (await generate_title_variants_async(f"{primary_keyword}について", n=1))[0]
+
+def generate_optimized_title_from_content(content: str, keywords: list, primary_keyword: str) -> str:
+    """
+    generate_optimized_title_from_content_async の同期版
+    """
+    return run_sync(generate_optimized_title_from_content_async(content, keywords, primary_keyword))
 
 # 既存の get_next_keyword 関数を削除して新システムに対応
 def get_next_keyword(col: int = 0) -> str:
@@ -239,7 +410,7 @@ def get_next_keyword(col: int = 0) -> str:
     keyword_group = get_next_keyword_group()
     return keyword_group['primary_keyword']
 
-def generate_title_variants(prompt: str, n: int = 5) -> list[str]:
+async def generate_title_variants_async(prompt: str, n: int = 5) -> list[str]:
     """
     テーマ(prompt)に合う"イケてる"日本語タイトルをn個生成
     """
@@ -269,7 +440,8 @@ def generate_title_variants(prompt: str, n: int = 5) -> list[str]:
         "出力はJSON形式で → {\"titles\": [\"…\", \"…\", …]}"
     )
 
-    resp = openai.chat.completions.create(
+    resp = await _create_chat_completion(
+        stage="title_variants",
         model="gpt-4o",
         messages=[
             {"role": "system", "content": system_prompt},
@@ -281,10 +453,241 @@ def generate_title_variants(prompt: str, n: int = 5) -> list[str]:
     )
     return json.loads(resp.choices[0].message.content)["titles"]
 
-def generate_article_html(prompt: str, num_sections: int = 5) -> dict:
-    # タイトル生成
-    title = generate_title_variants(prompt, n=1)[0]
+def generate_title_variants(prompt: str, n: int = 5) -> list[str]:
+    """
+    generate_title_variants_async の同期版
+    """
+    return run_sync(generate_title_variants_async(prompt, n))
+
+_JSON_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+class SectionStreamParser:
+    """
+    {"section": "..."} 形式のJSONをストリームの断片から逐次デコードし、
+    閉じタグまで届いた <h2> 見出しを on_heading に通知する
+    """
+
+    def __init__(self, on_heading=None, key: str = "section"):
+        self.on_heading = on_heading
+        self.key = key
+        self.text = ""
+        self.done = False
+        self._raw = ""
+        self._pos = None
+        self._heading_count = 0
+
+    def feed(self, delta: str):
+        """
+        受信した断片を追加してデコードを進める
+        """
+        self._raw += delta
+        if self._pos is None:
+            match = re.search(r'"%s"\s*:\s*"' % re.escape(self.key), self._raw)
+            if not match:
+                return
+            self._pos = match.end()
+        if not self.done:
+            self._decode()
+            self._emit_headings()
+
+    def _decode(self):
+        """
+        JSON文字列の値を、エスケープが途中で切れていない所までデコード
+        """
+        raw, i, out = self._raw, self._pos, []
+        while i < len(raw):
+            char = raw[i]
+            if char == '"':
+                self.done = True
+                i += 1
+                break
+            if char != "\\":
+                out.append(char)
+                i += 1
+                continue
+            if i + 1 >= len(raw):
+                break
+            escape = raw[i + 1]
+            if escape != "u":
+                out.append(_JSON_ESCAPES.get(escape, escape))
+                i += 2
+                continue
+            if i + 6 > len(raw):
+                break
+            code = int(raw[i + 2:i + 6], 16)
+            if 0xD800 <= code < 0xDC00:
+                # サロゲートペアは後半が届くまで待つ
+                if i + 12 > len(raw):
+                    break
+                if raw[i + 6:i + 8] == "\\u":
+                    code = 0x10000 + ((code - 0xD800) << 10) + (int(raw[i + 8:i + 12], 16) - 0xDC00)
+                    i += 6
+            out.append(chr(code))
+            i += 6
+        self.text += "".join(out)
+        self._pos = i
+
+    def _emit_headings(self):
+        """
+        新たに閉じタグまで揃った <h2> 見出しを通知
+        """
+        headings = re.findall(r"<h2[^>]*>(.*?)</h2>", self.text, re.S)
+        for heading_html in headings[self._heading_count:]:
+            heading_text = BeautifulSoup(heading_html, "html.parser").get_text().strip()
+            if heading_text and self.on_heading:
+                self.on_heading(heading_text)
+        self._heading_count = len(headings)
+
+# ストリーミング生成中に見つかった見出しの画像生成（見出し → 画像URLのFuture）
+_heading_image_futures = {}
+_heading_image_futures_lock = threading.Lock()
+
+def _heading_key(heading_text: str) -> str:
+    return " ".join(heading_text.split())
+
+async def _generate_heading_image_async(heading_text: str, slot: str = "inline"):
+    img_prompt = await generate_image_prompt_async(f"Illustration or photograph representing: {heading_text}")
+    return await generate_image_for_upload_async(img_prompt, slot)
+
+def prefetch_heading_image(heading_text: str, slot: str = "inline"):
+    """
+    見出しの画像プロンプト生成とDALL·E生成をバックグラウンドで先行開始
+    結果は take_prefetched_image で受け取る（insert_images_to_html が利用）
+
+    Args:
+        heading_text: 見出しのテキスト
+        slot: 画像の用途（記事の最初の見出しはアイキャッチ画像になるため featured）
+    """
+    key = _heading_key(heading_text)
+    max_prefetch = int(os.getenv("STREAM_IMAGE_PREFETCH_MAX", "6"))
+    # 画像キャッシュで再利用できる見出しは生成しない（post_article と同じく末尾の / を除いたサイトURLで照合）
+    image_cache = get_image_cache()
+    if image_cache and image_cache.has(ImageCache.make_key(key), os.getenv("WP_URL", "").rstrip("/")):
+        return
+    with _heading_image_futures_lock:
+        if not key or key in _heading_image_futures or len(_heading_image_futures) >= max_prefetch:
+            return
+        print(f"🖼️ 見出し「{key}」の画像生成を先行開始")
+        _heading_image_futures[key] = _submit_to_sync_loop(_generate_heading_image_async(key, slot))
+
+def take_prefetched_image(heading_text: str, timeout: float = None):
+    """
+    先行生成した見出し画像を取得（先行生成していない・失敗した場合はNone）
+    DALLE_RESPONSE_FORMAT=b64_json の場合は画像データ（bytes）、url の場合は画像URL（str）
+    """
+    with _heading_image_futures_lock:
+        future = _heading_image_futures.pop(_heading_key(heading_text), None)
+    if future is None:
+        return None
+    try:
+        return future.result(timeout=timeout)
+    except Exception as e:
+        print(f"⚠️ 見出し「{heading_text}」の先行画像生成に失敗: {e}")
+        return None
+
+def has_prefetched_image(heading_text: str) -> bool:
+    """
+    見出しの画像生成が先行開始されているか（待たずに確認する）
+    """
+    with _heading_image_futures_lock:
+        return _heading_key(heading_text) in _heading_image_futures
+
+def clear_prefetched_images():
+    """
+    使われなかった先行画像生成を破棄
+    """
+    with _heading_image_futures_lock:
+        for future in _heading_image_futures.values():
+            future.cancel()
+        _heading_image_futures.clear()
+
+def _stream_chapters_enabled() -> bool:
+    return os.getenv("STREAM_CHAPTERS", "false").lower() == "true"
+
+async def generate_section_async(section_messages: list[dict], chapter: int, stream: bool = False, on_heading=None) -> str:
+    """
+    1章分の本文を生成（失敗時はこの章だけを CHAPTER_MAX_RETRIES 回まで再試行）
+    stream=True の場合はストリーミングで受信し、<h2> 見出しが届いた時点で on_heading に渡す
+    """
+    max_retries = int(os.getenv("CHAPTER_MAX_RETRIES", "2"))
+
+    for attempt in range(max_retries + 1):
+        try:
+            parser = SectionStreamParser(on_heading=on_heading) if stream else None
+            section_resp = await _create_chat_completion(
+                stage="section",
+                on_delta=parser.feed if parser else None,
+                model="gpt-4o",
+                messages=section_messages,
+                temperature=0.7,
+                max_tokens=800,
+                response_format={"type": "json_object"}
+            )
+            return json.loads(section_resp.choices[0].message.content)["section"]
+        except Exception as e:
+            if attempt >= max_retries:
+                print(f"❌ 第{chapter}章の生成に失敗しました: {e}")
+                raise
+            print(f"⚠️ 第{chapter}章の生成に失敗、この章のみ再試行します ({attempt + 1}/{max_retries}): {e}")
+
+def generate_section(section_messages: list[dict], chapter: int, stream: bool = False, on_heading=None) -> str:
+    """
+    generate_section_async の同期版
+    """
+    return run_sync(generate_section_async(section_messages, chapter, stream, on_heading))
+
+async def generate_sections_async(section_messages_list: list[list[dict]], stream: bool = None) -> list[str]:
+    """
+    章ごとのメッセージリストから本文を生成し、章の順序どおりに返す
+    CONCURRENT_CHAPTERS=true（デフォルト）の場合は CHAPTER_CONCURRENCY 件を上限に並列生成
+    stream=True（未指定時は STREAM_CHAPTERS）の場合は届いた見出しから画像生成を先行開始する
+    """
+    concurrent = os.getenv("CONCURRENT_CHAPTERS", "true").lower() == "true"
+    max_workers = max(1, int(os.getenv("CHAPTER_CONCURRENCY", "3")))
+    if stream is None:
+        stream = _stream_chapters_enabled()
+    # 画像を別プロセスのワーカー（image_backfill.py）で反映する場合は、先行生成しても受け取れないので行わない
+    images_in_worker = (os.getenv("DEFER_IMAGES", "false").lower() == "true"
+                        and os.getenv("DEFER_IMAGES_RUN", "after_post") != "after_post")
+    prefetch = stream and os.getenv("ENABLE_IMAGE_GENERATION", "true").lower() == "true" and not images_in_worker
+
+    def _on_heading(chapter: int):
+        """章の見出しの先行画像生成（記事の最初の見出し＝第1章の最初の h2 はアイキャッチ画像になるため featured）"""
+        if not prefetch:
+            return None
+        first = [chapter == 1]
+
+        def on_heading(heading_text: str):
+            slot = "featured" if first[0] else "inline"
+            first[0] = False
+            prefetch_heading_image(heading_text, slot)
+        return on_heading
+
+    if not concurrent or max_workers == 1 or len(section_messages_list) <= 1:
+        return [
+            await generate_section_async(messages, i, stream, _on_heading(i))
+            for i, messages in enumerate(section_messages_list, 1)
+        ]
+
+    print(f"⚡ {len(section_messages_list)}章を並列生成中（同時実行数: {max_workers}）")
+    semaphore = asyncio.Semaphore(max_workers)
+
+    async def _limited(messages: list[dict], chapter: int) -> str:
+        async with semaphore:
+            return await generate_section_async(messages, chapter, stream, _on_heading(chapter))
+
+    # gather は投入順（=章の順序）で結果を返す
+    return list(await asyncio.gather(*[
+        _limited(messages, i) for i, messages in enumerate(section_messages_list, 1)
+    ]))
+
+def generate_sections(section_messages_list: list[list[dict]], stream: bool = None) -> list[str]:
+    """
+    generate_sections_async の同期版
+    """
+    return run_sync(generate_sections_async(section_messages_list, stream))
 
+async def generate_article_html_async(prompt: str, num_sections: int = 5) -> dict:
     # リード文生成
     lead_msg = (
         "あなたはChatGPTです。ユーザーから記事の導入部分を書いてほしいと頼まれました。\n"
@@ -299,7 +702,8 @@ def generate_article_html(prompt: str, num_sections: int = 5) -> dict:
         "・絵文字は使わず、文章の自然さで親しみやすさを表現\n\n"
         "JSONで{\"lead\": \"...\"}の形で返してください。"
     )
-    lead_resp = openai.chat.completions.create(
+    lead_request = _create_chat_completion(
+        stage="lead",
         model="gpt-4o",
         messages=[
             {"role": "system", "content": lead_msg},
@@ -309,11 +713,10 @@ def generate_article_html(prompt: str, num_sections: int = 5) -> dict:
         max_tokens=800,
         response_format={"type": "json_object"}
     )
-    lead_text = json.loads(lead_resp.choices[0].message.content)["lead"]
 
 
     # 章ごと生成
-    sections = []
+    section_messages_list = []
     for i in range(1, num_sections + 1):
         # 表の使用制限（1記事あたり2つまで）
         can_use_table = i <= 2  # 第1章と第2章のみ表を使用可能
@@ -340,24 +743,25 @@ def generate_article_html(prompt: str, num_sections: int = 5) -> dict:
             "・テンプレート的な表現ではなく、ChatGPTが実際に話すような自然さで\n\n"
             "JSONで{\"section\": \"...\"}の形で返してください。"
         )
-        section_resp = openai.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": section_msg},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_tokens=800,
-            response_format={"type": "json_object"}
-        )
-        section_text = json.loads(section_resp.choices[0].message.content)["section"]
-        sections.append(section_text)
+        section_messages_list.append([
+            {"role": "system", "content": section_msg},
+            {"role": "user", "content": prompt}
+        ])
+
+    # タイトル・リード文・各章は互いに独立しているため並行して生成
+    title_variants, lead_resp, sections = await asyncio.gather(
+        generate_title_variants_async(prompt, n=1),
+        lead_request,
+        generate_sections_async(section_messages_list)
+    )
+    title = title_variants[0]
+    lead_text = json.loads(lead_resp.choices[0].message.content)["lead"]
 
     # FAQ生成
-    faq_section = generate_faq_section(prompt, lead_text + "\n".join(sections[:2]))  # 最初の2章を参考に
+    faq_section = await generate_faq_section_async(prompt, lead_text + "\n".join(sections[:2]))  # 最初の2章を参考に
     
     # 結論セクション生成
-    conclusion_section = generate_conclusion_section(prompt, lead_text + "\n".join(sections) + "\n" + faq_section)
+    conclusion_section = await generate_conclusion_section_async(prompt, lead_text + "\n".join(sections) + "\n" + faq_section)
     
     # 結合
     content = lead_text + "\n" + "\n".join(sections) + "\n" + faq_section + "\n" + conclusion_section
@@ -366,12 +770,40 @@ def generate_article_html(prompt: str, num_sections: int = 5) -> dict:
         "content": content
     }
 
+def generate_article_html(prompt: str, num_sections: int = 5) -> dict:
+    """
+    generate_article_html_async の同期版
+    """
+    return run_sync(generate_article_html_async(prompt, num_sections))
+
 
-def generate_image_prompt(article_body: str) -> str:
+# 画像プロンプトの共通要件（単体・一括生成で共有）
+IMAGE_PROMPT_REQUIREMENTS = (
+    "要件：\n"
+    "- flat design, minimalist style を必ず含める\n"
+    "- 複雑な要素は避け、2-3個の基本的な要素のみ\n"
+    "- パステルカラーまたは白背景を使用\n"
+    "- アイコンやイラスト風のシンプルなデザイン\n"
+    "- 文字やテキストは含めない\n"
+    "- 例: 'Simple flat design icon of a lightbulb on white background, minimalist style, pastel colors'"
+)
+
+IMAGE_PROMPTS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "prompts": {"type": "array", "items": {"type": "string"}}
+    },
+    "required": ["prompts"],
+    "additionalProperties": False
+}
+
+async def generate_image_prompt_async(article_body: str) -> str:
     """
     記事本文HTMLから英語の画像生成プロンプトを作成（シンプルスタイル）
     """
-    resp = openai.chat.completions.create(
+    resp = await _create_chat_completion(
+        stage="image_prompt",
+        cache=True,
         model="gpt-4o",
         messages=[
             {
@@ -380,13 +812,7 @@ def generate_image_prompt(article_body: str) -> str:
                     "あなたは画像プロンプト作成のエキスパートです。"
                     "以下のHTML形式の記事に合った、非常にシンプルでミニマルな画像を生成するための"
                     "英語プロンプトを1文だけで答えてください。\n\n"
-                    "要件：\n"
-                    "- flat design, minimalist style を必ず含める\n"
-                    "- 複雑な要素は避け、2-3個の基本的な要素のみ\n"
-                    "- パステルカラーまたは白背景を使用\n"
-                    "- アイコンやイラスト風のシンプルなデザイン\n"
-                    "- 文字やテキストは含めない\n"
-                    "- 例: 'Simple flat design icon of a lightbulb on white background, minimalist style, pastel colors'"
+                    + IMAGE_PROMPT_REQUIREMENTS
                 )
             },
             {"role": "user", "content": article_body}
@@ -396,22 +822,159 @@ def generate_image_prompt(article_body: str) -> str:
     )
     return resp.choices[0].message.content.strip()
 
+def generate_image_prompt(article_body: str) -> str:
+    """
+    generate_image_prompt_async の同期版
+    """
+    return run_sync(generate_image_prompt_async(article_body))
 
-def generate_image_url(image_prompt: str) -> str:
+async def generate_image_prompts_async(headings: list[str], context: str = "") -> list[str]:
     """
-    DALL·E 3 に画像生成を頼み、URLを返す
+    複数の見出しの英語画像プロンプトを1回の呼び出しでまとめて生成（見出しと同じ順序で返す）
+    応答の件数が合わない・空のプロンプトがある見出しだけを generate_image_prompt_async で個別に生成し直す
+    （個別生成にも失敗した見出しは空文字）
     """
-    response = openai.images.generate(
-        model="dall-e-3",
-        prompt=image_prompt,
-        size="1792x1024",
-        n=1
+    if not headings:
+        return []
+
+    system_msg = (
+        "あなたは画像プロンプト作成のエキスパートです。"
+        "番号付きで渡される各見出しについて、その見出しの内容に合った非常にシンプルでミニマルな画像を生成するための"
+        "英語プロンプトを1文ずつ作成してください。\n"
+        "各プロンプトはその見出し固有の内容を表し、他の見出しと同じ内容を使い回さないでください。\n\n"
+        + IMAGE_PROMPT_REQUIREMENTS
+        + "\n\n見出しと同じ順序・同じ件数で、JSONで{\"prompts\": [\"...\", \"...\"]}の形で返してください。"
     )
-    image_url = response.data[0].url
-    return image_url
+    user_msg = "\n".join(f"{i}. {heading}" for i, heading in enumerate(headings, 1))
+    if context:
+        user_msg = f"記事の概要: {context[:500]}\n\n見出し:\n{user_msg}"
 
+    prompts = []
+    try:
+        resp = await _create_chat_completion(
+            stage="image_prompt",
+            cache=True,
+            model="gpt-4o",
+            messages=[
+                {"role": "system", "content": system_msg},
+                {"role": "user", "content": user_msg}
+            ],
+            temperature=0.5,
+            max_tokens=120 * len(headings) + 100,
+            response_format={
+                "type": "json_schema",
+                "json_schema": {"name": "image_prompts", "strict": True, "schema": IMAGE_PROMPTS_SCHEMA}
+            }
+        )
+        prompts = json.loads(resp.choices[0].message.content)["prompts"]
+    except Exception as e:
+        print(f"⚠️ 画像プロンプト一括生成エラー（見出しごとに個別生成）: {e}")
+
+    if len(prompts) != len(headings):
+        if prompts:
+            print(f"⚠️ 画像プロンプトの件数が一致しません（{len(prompts)}/{len(headings)}）。見出しごとに個別生成します")
+        prompts = [""] * len(headings)
+    prompts = [p.strip() if isinstance(p, str) else "" for p in prompts]
+
+    missing = [i for i, p in enumerate(prompts) if not p]
+    if missing:
+        results = await asyncio.gather(*[
+            generate_image_prompt_async(f"Illustration or photograph representing: {headings[i]}")
+            for i in missing
+        ], return_exceptions=True)
+        for i, prompt in zip(missing, results):
+            if isinstance(prompt, Exception):
+                print(f"⚠️ 見出し「{headings[i]}」の画像プロンプト生成エラー: {prompt}")
+                continue
+            prompts[i] = prompt
+    return prompts
 
-def generate_meta_description(prompt: str, content: str) -> str:
+def generate_image_prompts(headings: list[str], context: str = "") -> list[str]:
+    """
+    generate_image_prompts_async の同期版
+    """
+    return run_sync(generate_image_prompts_async(headings, context))
+
+
+
+def _image_b64_enabled() -> bool:
+    """DALL·E の画像をURLではなくbase64で受け取るか（DALLE_RESPONSE_FORMAT、既定は b64_json）"""
+    return os.getenv("DALLE_RESPONSE_FORMAT", "b64_json").lower() == "b64_json"
+
+async def _request_image_async(image_prompt: str, response_format: str, tier: dict):
+    """ティアの設定で画像生成APIを呼び出し、生成結果（response.data[0]）を返す"""
+    policy = get_retry_policy("openai_image")
+    params = image_request_params(tier, image_prompt)
+    started = time.monotonic()
+
+    async def send():
+        await get_rate_limiter().acquire_async(tier["model"])
+        return await get_async_client().images.generate(n=1, response_format=response_format, **params)
+
+    response = await policy.call_async(send)
+    get_token_ledger().record_image(current_stage("image"), tier["model"], tier["size"], tier["quality"],
+                                    time.monotonic() - started)
+    return response.data[0]
+
+async def _generate_image_async(image_prompt: str, response_format: str, slot: str = "inline"):
+    """
+    用途（featured / inline）のティアで画像を生成し、生成結果（response.data[0]）を返す
+    記事の所要時間の予算が残り少ない場合や、ティアでの生成に失敗した場合は fallback ティアで生成する
+    """
+    tier = select_image_tier(slot, get_token_ledger().remaining_seconds())
+    try:
+        return await _request_image_async(image_prompt, response_format, tier)
+    except Exception as e:
+        fallback = fallback_tier(tier)
+        if fallback is None:
+            raise
+        print(f"⚠️ {tier['name']} ティアの画像生成に失敗（fallback ティアで生成します）: {e}")
+        return await _request_image_async(image_prompt, response_format, fallback)
+
+async def generate_image_url_async(image_prompt: str, slot: str = "inline") -> str:
+    """
+    画像を生成し、URLを返す
+    """
+    image = await _generate_image_async(image_prompt, "url", slot)
+    return image.url
+
+async def generate_image_data_async(image_prompt: str, slot: str = "inline") -> bytes:
+    """
+    画像を生成し、画像データ（PNG）を返す
+    response_format="b64_json" で受け取り、URLからのダウンロードを省く
+    """
+    image = await _generate_image_async(image_prompt, "b64_json", slot)
+    return base64.b64decode(image.b64_json)
+
+def generate_image_data(image_prompt: str, slot: str = "inline") -> bytes:
+    """
+    generate_image_data_async の同期版
+    """
+    return run_sync(generate_image_data_async(image_prompt, slot))
+
+async def generate_image_for_upload_async(image_prompt: str, slot: str = "inline"):
+    """
+    DALLE_RESPONSE_FORMAT に従って、用途（featured / inline）のティアで画像を生成
+    b64_json（既定）の場合は画像データ（bytes）、url の場合は画像URL（str）を返す
+    """
+    if _image_b64_enabled():
+        return await generate_image_data_async(image_prompt, slot)
+    return await generate_image_url_async(image_prompt, slot)
+
+def generate_image_for_upload(image_prompt: str, slot: str = "inline"):
+    """
+    generate_image_for_upload_async の同期版
+    """
+    return run_sync(generate_image_for_upload_async(image_prompt, slot))
+
+def generate_image_url(image_prompt: str, slot: str = "inline") -> str:
+    """
+    generate_image_url_async の同期版
+    """
+    return run_sync(generate_image_url_async(image_prompt, slot))
+
+
+async def generate_meta_description_async(prompt: str, content: str) -> str:
     """
     記事のmeta descriptionを生成（150-160文字程度）
     """
@@ -424,7 +987,9 @@ def generate_meta_description(prompt: str, content: str) -> str:
         "・「です・ます」調で統一\n"
         "JSONで{\"description\": \"...\"}の形で返してください。"
     )
-    desc_resp = openai.chat.completions.create(
+    desc_resp = await _create_chat_completion(
+        stage="meta_description",
+        cache=True,
         model="gpt-4o",
         messages=[
             {"role": "system", "content": desc_msg},
@@ -436,8 +1001,14 @@ def generate_meta_description(prompt: str, content: str) -> str:
     )
     return json.loads(desc_resp.choices[0].message.content)["description"]
 
+def generate_meta_description(prompt: str, content: str) -> str:
+    """
+    generate_meta_description_async の同期版
+    """
+    return run_sync(generate_meta_description_async(prompt, content))
 
-def generate_seo_tags(prompt: str, content: str) -> list[str]:
+
+async def generate_seo_tags_async(prompt: str, content: str) -> list[str]:
     """
     記事のSEO効果的なWordPressタグを3つ生成
     """
@@ -451,7 +1022,9 @@ def generate_seo_tags(prompt: str, content: str) -> list[str]:
         "・例: 'AI', 'ChatGPT', '無料ツール', '初心者向け' など\n"
         "JSONで{\"tags\": [\"タグ1\", \"タグ2\", \"タグ3\"]}の形で返してください。"
     )
-    tags_resp = openai.chat.completions.create(
+    tags_resp = await _create_chat_completion(
+        stage="seo_tags",
+        cache=True,
         model="gpt-4o",
         messages=[
             {"role": "system", "content": tags_msg},
@@ -463,8 +1036,14 @@ def generate_seo_tags(prompt: str, content: str) -> list[str]:
     )
     return json.loads(tags_resp.choices[0].message.content)["tags"]
 
+def generate_seo_tags(prompt: str, content: str) -> list[str]:
+    """
+    generate_seo_tags_async の同期版
+    """
+    return run_sync(generate_seo_tags_async(prompt, content))
 
-def generate_seo_slug(prompt: str, title: str) -> str:
+
+async def generate_seo_slug_async(prompt: str, title: str) -> str:
     """
     記事のSEO効果的なアルファベットスラッグを生成（3-5語程度）
     """
@@ -479,7 +1058,9 @@ def generate_seo_slug(prompt: str, title: str) -> str:
         "・数字は使用可能\n"
         "JSONで{\"slug\": \"...\"}の形で返してください。"
     )
-    slug_resp = openai.chat.completions.create(
+    slug_resp = await _create_chat_completion(
+        stage="seo_slug",
+        cache=True,
         model="gpt-4o",
         messages=[
             {"role": "system", "content": slug_msg},
@@ -491,6 +1072,149 @@ def generate_seo_slug(prompt: str, title: str) -> str:
     )
     return json.loads(slug_resp.choices[0].message.content)["slug"]
 
+def generate_seo_slug(prompt: str, title: str) -> str:
+    """
+    generate_seo_slug_async の同期版
+    """
+    return run_sync(generate_seo_slug_async(prompt, title))
+
+
+SLUG_PATTERN = re.compile(r"^[a-z0-9-]+$")
+
+SEO_METADATA_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "description": {"type": "string"},
+        "tags": {"type": "array", "items": {"type": "string"}},
+        "slug": {"type": "string"}
+    },
+    "required": ["description", "tags", "slug"],
+    "additionalProperties": False
+}
+
+def _validate_seo_field(field: str, value) -> bool:
+    """
+    SEOメタデータの各項目を検証
+    """
+    if field == "description":
+        return isinstance(value, str) and 0 < len(value.strip()) <= 200
+    if field == "tags":
+        return (isinstance(value, list) and 1 <= len(value) <= 5
+                and all(isinstance(tag, str) and tag.strip() for tag in value))
+    if field == "slug":
+        return isinstance(value, str) and bool(SLUG_PATTERN.match(value)) and len(value) <= 80
+    return False
+
+def _sanitize_slug(slug: str) -> str:
+    """
+    スラッグを ^[a-z0-9-]+$ に合うよう整形（整形できない場合は空文字＝WordPress側で自動生成）
+    """
+    slug = re.sub(r"[^a-z0-9]+", "-", str(slug).lower()).strip("-")
+    return slug[:80].strip("-")
+
+async def generate_seo_metadata_async(prompt: str,
+                                      title: str,
+                                      content: str,
+                                      description_theme: str = None,
+                                      tags_theme: str = None) -> dict:
+    """
+    meta description・タグ・スラッグを1回の呼び出しでまとめて生成
+    JSONスキーマで構造を固定し、検証に失敗した項目だけ個別の生成関数で作り直す
+    """
+    description_theme = description_theme or prompt
+    tags_theme = tags_theme or prompt
+    meta_msg = (
+        "あなたはSEO専門家です。\n"
+        "この記事のSEOメタデータを作成してください。\n"
+        "■ description: meta description（検索結果に表示される説明文）\n"
+        "・日本語で150文字以内\n"
+        "・検索ユーザーがクリックしたくなるような魅力的な文章\n"
+        "・記事の要点を簡潔にまとめ、キーワードを自然に含める\n"
+        "・「です・ます」調で統一\n"
+        "■ tags: WordPressタグを3つ\n"
+        "・SEO効果が高く、記事内容と関連性が高いキーワード\n"
+        "・一般的すぎず、具体的すぎない適度な粒度\n"
+        "・日本語で、各タグは2-4文字程度（例: 'AI', 'ChatGPT', '無料ツール', '初心者向け'）\n"
+        "■ slug: WordPressスラッグ（URL）\n"
+        "・記事内容を表す3-5語程度の分かりやすい英語\n"
+        "・小文字の英字と数字のみを使い、ハイフンで区切る（例: chatgpt-free-guide）\n"
+        "JSONで{\"description\": \"...\", \"tags\": [\"タグ1\", \"タグ2\", \"タグ3\"], \"slug\": \"...\"}の形で返してください。"
+    )
+    user_msg = f"キーワード: {prompt}\nタイトル: {title}\n"
+    if description_theme != prompt:
+        user_msg += f"説明文のテーマ: {description_theme}\n"
+    if tags_theme != prompt:
+        user_msg += f"タグのテーマ: {tags_theme}\n"
+    user_msg += f"記事内容: {content[:500]}..."
+
+    metadata = {}
+    try:
+        meta_resp = await _create_chat_completion(
+            stage="seo_metadata",
+            cache=True,
+            model="gpt-4o",
+            messages=[
+                {"role": "system", "content": meta_msg},
+                {"role": "user", "content": user_msg}
+            ],
+            temperature=0.4,
+            max_tokens=500,
+            response_format={
+                "type": "json_schema",
+                "json_schema": {"name": "seo_metadata", "strict": True, "schema": SEO_METADATA_SCHEMA}
+            }
+        )
+        metadata = json.loads(meta_resp.choices[0].message.content)
+    except Exception as e:
+        print(f"⚠️ SEOメタデータ一括生成エラー（項目ごとに個別生成）: {e}")
+
+    if isinstance(metadata.get("slug"), str):
+        metadata["slug"] = metadata["slug"].strip().lower()
+
+    # 検証に失敗した項目だけを個別に生成し直す（並列）
+    fallbacks = {
+        "description": lambda: generate_meta_description_async(description_theme, content),
+        "tags": lambda: generate_seo_tags_async(tags_theme, content),
+        "slug": lambda: generate_seo_slug_async(prompt, title)
+    }
+    invalid_fields = [field for field in fallbacks if not _validate_seo_field(field, metadata.get(field))]
+    if invalid_fields:
+        print(f"⚠️ 検証に失敗した項目を個別生成します: {', '.join(invalid_fields)}")
+        results = await asyncio.gather(*[fallbacks[field]() for field in invalid_fields], return_exceptions=True)
+        for field, result in zip(invalid_fields, results):
+            if isinstance(result, Exception):
+                print(f"⚠️ {field} の個別生成エラー: {result}")
+                result = {"description": "", "tags": [], "slug": ""}[field]
+            metadata[field] = result
+
+    # 個別生成の結果も型が崩れている場合がある（スラッグが文字列でなければ空文字＝WordPress側で自動生成）
+    if not isinstance(metadata["slug"], str):
+        metadata["slug"] = ""
+    elif not _validate_seo_field("slug", metadata["slug"]):
+        metadata["slug"] = _sanitize_slug(metadata["slug"])
+    tags = metadata["tags"]
+    if isinstance(tags, str):
+        tags = re.split(r"[,、\n]", tags)
+    elif not isinstance(tags, list):
+        tags = []
+    metadata["tags"] = [tag.strip() for tag in tags if isinstance(tag, str) and tag.strip()][:3]
+
+    return {
+        "description": metadata["description"],
+        "tags": metadata["tags"],
+        "slug": metadata["slug"]
+    }
+
+def generate_seo_metadata(prompt: str,
+                          title: str,
+                          content: str,
+                          description_theme: str = None,
+                          tags_theme: str = None) -> dict:
+    """
+    generate_seo_metadata_async の同期版
+    """
+    return run_sync(generate_seo_metadata_async(prompt, title, content, description_theme, tags_theme))
+
 
 def extract_article_structure(url_or_content: str, content_type: str = "url") -> dict:
     """
@@ -500,7 +1224,7 @@ def extract_article_structure(url_or_content: str, content_type: str = "url") ->
     if content_type == "url":
         # URLから記事を取得
         try:
-            response = requests.get(url_or_content, timeout=30)
+            response = request_with_retry("GET", url_or_content, call_class="download")
             response.raise_for_status()
             html_content = response.text
         except Exception as e:
@@ -592,7 +1316,7 @@ def extract_article_structure(url_or_content: str, content_type: str = "url") ->
     
     return {"error": "サポートされていないコンテンツタイプ"}
 
-def generate_article_from_reference(prompt: str, reference_structure: dict, num_sections: int = 5) -> dict:
+async def generate_article_from_reference_async(prompt: str, reference_structure: dict, num_sections: int = 5) -> dict:
     """
     参考記事の構造に基づいて記事を生成
     """
@@ -617,7 +1341,7 @@ def generate_article_from_reference(prompt: str, reference_structure: dict, num_
 参考記事の構成やアプローチを参考にしつつ、独自性のあるタイトルを作成してください。
 """
     
-    title = generate_title_variants(title_prompt, n=1)[0]
+    title_request = generate_title_variants_async(title_prompt, n=1)
 
     # リード文生成（参考記事を考慮）
     lead_msg = (
@@ -633,7 +1357,8 @@ def generate_article_from_reference(prompt: str, reference_structure: dict, num_
         "JSONで{\"lead\": \"...\"}の形で返してください。"
     )
     
-    lead_resp = openai.chat.completions.create(
+    lead_request = _create_chat_completion(
+        stage="lead",
         model="gpt-4o",
         messages=[
             {"role": "system", "content": lead_msg},
@@ -643,10 +1368,9 @@ def generate_article_from_reference(prompt: str, reference_structure: dict, num_
         max_tokens=800,
         response_format={"type": "json_object"}
     )
-    lead_text = json.loads(lead_resp.choices[0].message.content)["lead"]
 
     # 章ごと生成（参考記事の構造を活用）
-    sections = []
+    section_messages_list = []
     ref_sections = reference_structure.get('sections', [])
     
     for i in range(1, num_sections + 1):
@@ -672,24 +1396,25 @@ def generate_article_from_reference(prompt: str, reference_structure: dict, num_
             "JSONで{\"section\": \"...\"}の形で返してください。"
         )
         
-        section_resp = openai.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": section_msg},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_tokens=800,
-            response_format={"type": "json_object"}
-        )
-        section_text = json.loads(section_resp.choices[0].message.content)["section"]
-        sections.append(section_text)
+        section_messages_list.append([
+            {"role": "system", "content": section_msg},
+            {"role": "user", "content": prompt}
+        ])
+
+    # タイトル・リード文・各章は互いに独立しているため並行して生成
+    title_variants, lead_resp, sections = await asyncio.gather(
+        title_request,
+        lead_request,
+        generate_sections_async(section_messages_list)
+    )
+    title = title_variants[0]
+    lead_text = json.loads(lead_resp.choices[0].message.content)["lead"]
 
     # FAQ生成
-    faq_section = generate_faq_section(prompt, lead_text + "\n".join(sections[:2]))  # 最初の2章を参考に
+    faq_section = await generate_faq_section_async(prompt, lead_text + "\n".join(sections[:2]))  # 最初の2章を参考に
     
     # 結論セクション生成
-    conclusion_section = generate_conclusion_section(prompt, lead_text + "\n".join(sections) + "\n" + faq_section)
+    conclusion_section = await generate_conclusion_section_async(prompt, lead_text + "\n".join(sections) + "\n" + faq_section)
     
     # 結合
     content = lead_text + "\n" + "\n".join(sections) + "\n" + faq_section + "\n" + conclusion_section
@@ -699,6 +1424,12 @@ def generate_article_from_reference(prompt: str, reference_structure: dict, num_
         "reference_used": True
     }
 
+def generate_article_from_reference(prompt: str, reference_structure: dict, num_sections: int = 5) -> dict:
+    """
+    generate_article_from_reference_async の同期版
+    """
+    return run_sync(generate_article_from_reference_async(prompt, reference_structure, num_sections))
+
 def extract_multiple_article_structures(sources: list, content_types: list = None) -> dict:
     """
     複数の参考記事から構造を抽出・統合
@@ -882,7 +1613,7 @@ def enhance_section_with_cluster(main_section: dict, cluster: list) -> str:
     
     return enhanced_content
 
-def generate_article_from_multiple_references(prompt: str, integrated_structure: dict, num_sections: int = 5) -> dict:
+async def generate_article_from_multiple_references_async(prompt: str, integrated_structure: dict, num_sections: int = 5) -> dict:
     """
     複数の参考記事を統合した構造に基づいて記事を生成
     """
@@ -918,7 +1649,7 @@ def generate_article_from_multiple_references(prompt: str, integrated_structure:
 複数の記事のアプローチを融合し、より包括的で魅力的なタイトルを作成してください。
 """
     
-    title = generate_title_variants(title_prompt, n=1)[0]
+    title_request = generate_title_variants_async(title_prompt, n=1)
 
     # リード文生成（複数参考記事を考慮）
     lead_msg = (
@@ -934,7 +1665,8 @@ def generate_article_from_multiple_references(prompt: str, integrated_structure:
         "JSONで{\"lead\": \"...\"}の形で返してください。"
     )
     
-    lead_resp = openai.chat.completions.create(
+    lead_request = _create_chat_completion(
+        stage="lead",
         model="gpt-4o",
         messages=[
             {"role": "system", "content": lead_msg},
@@ -944,10 +1676,9 @@ def generate_article_from_multiple_references(prompt: str, integrated_structure:
         max_tokens=800,
         response_format={"type": "json_object"}
     )
-    lead_text = json.loads(lead_resp.choices[0].message.content)["lead"]
 
     # 章ごと生成（統合された構造を活用）
-    sections = []
+    section_messages_list = []
     integrated_sections = integrated_structure.get('sections', [])
     
     for i in range(1, num_sections + 1):
@@ -976,24 +1707,25 @@ def generate_article_from_multiple_references(prompt: str, integrated_structure:
             "JSONで{\"section\": \"...\"}の形で返してください。"
         )
         
-        section_resp = openai.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": section_msg},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_tokens=800,
-            response_format={"type": "json_object"}
-        )
-        section_text = json.loads(section_resp.choices[0].message.content)["section"]
-        sections.append(section_text)
+        section_messages_list.append([
+            {"role": "system", "content": section_msg},
+            {"role": "user", "content": prompt}
+        ])
+
+    # タイトル・リード文・各章は互いに独立しているため並行して生成
+    title_variants, lead_resp, sections = await asyncio.gather(
+        title_request,
+        lead_request,
+        generate_sections_async(section_messages_list)
+    )
+    title = title_variants[0]
+    lead_text = json.loads(lead_resp.choices[0].message.content)["lead"]
 
     # FAQ生成
-    faq_section = generate_faq_section(prompt, lead_text + "\n".join(sections[:2]))  # 最初の2章を参考に
+    faq_section = await generate_faq_section_async(prompt, lead_text + "\n".join(sections[:2]))  # 最初の2章を参考に
     
     # 結論セクション生成
-    conclusion_section = generate_conclusion_section(prompt, lead_text + "\n".join(sections) + "\n" + faq_section)
+    conclusion_section = await generate_conclusion_section_async(prompt, lead_text + "\n".join(sections) + "\n" + faq_section)
     
     # 結合
     content = lead_text + "\n" + "\n".join(sections) + "\n" + faq_section + "\n" + conclusion_section
@@ -1006,6 +1738,12 @@ def generate_article_from_multiple_references(prompt: str, integrated_structure:
         "sources": sources
     }
 
+def generate_article_from_multiple_references(prompt: str, integrated_structure: dict, num_sections: int = 5) -> dict:
+    """
+    generate_article_from_multiple_references_async の同期版
+    """
+    return run_sync(generate_article_from_multiple_references_async(prompt, integrated_structure, num_sections))
+
 def extract_style_features_from_sources(sources: list, content_types: list = None) -> dict:
     """
     複数ソースからスタイル特徴を抽出
@@ -1028,7 +1766,7 @@ def extract_style_features_from_sources(sources: list, content_types: list = Non
         try:
             # コンテンツを取得
             if content_type == 'url':
-                response = requests.get(source, timeout=30)
+                response = request_with_retry("GET", source, call_class="download")
                 response.raise_for_status()
                 raw_content = response.text
                 # HTMLからテキストを抽出
@@ -1222,7 +1960,7 @@ def generate_style_yaml(merged_features: dict) -> str:
     
     return yaml.dump(style_guide, allow_unicode=True, default_flow_style=False, sort_keys=False)
 
-def generate_article_with_style_guide(prompt: str, integrated_structure: dict, style_features: dict, num_sections: int = 5) -> dict:
+async def generate_article_with_style_guide_async(prompt: str, integrated_structure: dict, style_features: dict, num_sections: int = 5) -> dict:
     """
     スタイルガイドを使用して記事を生成
     """
@@ -1274,33 +2012,35 @@ def generate_article_with_style_guide(prompt: str, integrated_structure: dict, s
 上記の構造とスタイルを融合し、「{prompt}」について包括的で読みやすい記事を生成してください。
 """
 
-    # タイトル生成
-    title_resp = openai.chat.completions.create(
-        model="gpt-4o",
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": f"「{prompt}」というテーマで、上記スタイルガイドに従った魅力的なタイトルを1つ生成してください。JSONで{{\"title\": \"...\"}}の形で返してください。"}
-        ],
-        temperature=0.7,
-        max_tokens=200,
-        response_format={"type": "json_object"}
+    # タイトル生成と記事本文生成は並行して実行
+    title_resp, content_resp = await asyncio.gather(
+        _create_chat_completion(
+            stage="title",
+            model="gpt-4o",
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": f"「{prompt}」というテーマで、上記スタイルガイドに従った魅力的なタイトルを1つ生成してください。JSONで{{\"title\": \"...\"}}の形で返してください。"}
+            ],
+            temperature=0.7,
+            max_tokens=200,
+            response_format={"type": "json_object"}
+        ),
+        _create_chat_completion(
+            stage="content",
+            model="gpt-4o",
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": f"「{prompt}」について、統合されたスタイルガイドに従って2000文字程度の記事を生成してください。参考構造を活用し、{num_sections}つの主要セクションで構成してください。"}
+            ],
+            temperature=0.7,
+            max_tokens=3000
+        )
     )
     title = json.loads(title_resp.choices[0].message.content)["title"]
-
-    # 記事本文生成
-    content_resp = openai.chat.completions.create(
-        model="gpt-4o",
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": f"「{prompt}」について、統合されたスタイルガイドに従って2000文字程度の記事を生成してください。参考構造を活用し、{num_sections}つの主要セクションで構成してください。"}
-        ],
-        temperature=0.7,
-        max_tokens=3000
-    )
     content = content_resp.choices[0].message.content
 
     # FAQ生成
-    faq_section = generate_faq_section(prompt, content[:1000])  # 記事の最初の1000文字を参考に
+    faq_section = await generate_faq_section_async(prompt, content[:1000])  # 記事の最初の1000文字を参考に
     
     # FAQを記事に追加
     content += "\n" + faq_section
@@ -1317,57 +2057,126 @@ def generate_article_with_style_guide(prompt: str, integrated_structure: dict, s
         "style_yaml": style_yaml
     }
 
-def generate_keyword_article_with_style(keyword: str, style_features: dict, num_sections: int = 5) -> dict:
+def generate_article_with_style_guide(prompt: str, integrated_structure: dict, style_features: dict, num_sections: int = 5) -> dict:
     """
-    キーワードベースでスタイルガイドを適用した記事を生成
+    generate_article_with_style_guide_async の同期版
     """
-    if "error" in style_features:
-        return {"error": "スタイル特徴の抽出に失敗しました"}
-    
-    # スタイルガイドYAMLを生成
-    style_yaml = generate_style_yaml(style_features)
-    
-    # スタイルガイド付きシステムプロンプト
-    system_prompt = f"""
-あなたは視覚的にわかりやすい技術ライターです。
+    return run_sync(generate_article_with_style_guide_async(prompt, integrated_structure, style_features, num_sections))
 
-## スタイルガイド（参考記事から抽出されたスタイル特徴）
-```yaml
-{style_yaml}
-```
+# スタイルガイド付き生成で全記事共通の指示（プロバイダー側のプロンプトキャッシュが効くよう、
+# 記事ごとに変わる内容より前に置き、1文字も変えずに送る）
+STYLE_WRITER_INSTRUCTIONS = """あなたは視覚的にわかりやすい技術ライターです。
+
+## 記事生成指針（AI-GENEスタイル準拠）
+以下の要素を必ず含めてください：
+1. **比較表（リッチスタイル）**: 「NG例」「改善例」「効果」の3列構成でわかりやすく
+2. **対話形式の例**: プロンプトは会話形式で表現（「ChatGPTに『〜について教えて』と聞いてみましょう」）
+3. **FAQ形式**: Q&A形式で読みやすく情報を整理
+4. **段階的な手順**: 初心者でもわかるステップバイステップ構成
+5. **具体的な事例**: 実際に使える例を豊富に提供
 
 ## 出力要件
-- 上記YAMLのスタイル特徴を**厳密に反映**して記事を生成
 - すべて **HTML** で書く（WordPressに適した形式）
 - 見出しは &lt;h2&gt;タグを使用（絵文字込み）
-- 見出し頻度: {style_features.get('h2_per_1000_words', 3):.1f}本/1000語 程度
-- 絵文字使用: {style_features.get('emoji_in_headings_ratio', 0)*100:.0f}%の見出しに適切な絵文字
 - 箇条書きは &lt;ul&gt;&lt;li&gt;タグを使用
-- 箇条書き密度: {style_features.get('bullet_density', 0)*100:.1f}%程度
 - **リッチな表を積極活用**: 比較・手順・データは&lt;table&gt;&lt;tr&gt;&lt;td&gt;タグで構造化
 - **対話形式のプロンプト例**: 実際の会話形式で表現（例：「〜について教えて」）
-- 語調: {"です・ます調" if style_features.get('tone') == 'polite' else "自然な混合調"}
-- 文長: 平均{style_features.get('avg_sentence_length', 30):.0f}文字程度
 - **本文**: 地の文では絵文字を使用せず、シンプルで読みやすい文章（表内での絵文字使用は可）
 
-## 記事生成指針（AI-GENEスタイル準拠）
-以下の要素を必ず含めてください：
-1. **比較表（リッチスタイル）**: 「NG例」「改善例」「効果」の3列構成でわかりやすく
-2. **対話形式の例**: プロンプトは会話形式で表現（「ChatGPTに『〜について教えて』と聞いてみましょう」）
-3. **FAQ形式**: Q&A形式で読みやすく情報を整理
-4. **段階的な手順**: 初心者でもわかるステップバイステップ構成
-5. **具体的な事例**: 実際に使える例を豊富に提供
+## 各章の執筆ルール（章の生成を依頼された場合に適用）
+- 340文字以上で生成し、見出しは&lt;h2&gt;&lt;/h2&gt;タグで囲む
+
+📝 文章スタイル指針：
+- 本文の地の文では絵文字は使用しない（シンプルで読みやすい文章）
+- 表内での絵文字使用は可（視覚的な整理に効果的）
+
+🎨 ビジュアライズを積極的に活用してください：
+- 箇条書き（&lt;ul&gt;&lt;li&gt;）で重要ポイントを整理
+- 番号付きリスト（&lt;ol&gt;&lt;li&gt;）で手順や順序を明確化
+- 小見出し（&lt;h3&gt;）で内容を細かく区切る
+- 太字（&lt;strong&gt;）で要点を強調
+- 長い段落は適度に分割し、読みやすく構成
+- 情報を階層化して理解しやすくする
+
+🎯 おすすめプロンプト例を積極的に含めてください：
+- 「ChatGPTに『具体的なシチュエーションを教えて』と聞いてみましょう」
+- 「『〜を初心者向けに分かりやすく説明して』とお願いしてみてください」
+- 実際に使える具体的なプロンプト例を2-3個含めてください
+
+📌 重要な制約：
+- FAQは最後に一括で記述するため、章ではFAQ形式の表は使用しないでください
+- Q&A形式の内容は避け、説明や手順を中心に記述してください
+- 表は記事全体で2つまで（第1章・第2章のみ）
+"""
 
+def _build_style_system_prompt(style_yaml: str, style_features: dict, article_brief: str) -> str:
+    """
+    スタイルガイド付き生成のシステムプロンプトを組み立て
+    全記事共通の指示 → サイトごとのスタイルガイド → 記事ごとのテーマ の順に並べ、
+    タイトル・リード文・各章の呼び出しで同じ接頭辞を共有させる
+    """
+    tone = "です・ます調" if style_features.get('tone') == 'polite' else "自然な混合調"
+    return f"""{STYLE_WRITER_INSTRUCTIONS}
+## スタイルガイド（参考記事から抽出されたスタイル特徴）
+```yaml
+{style_yaml}```
+
+## スタイル別の出力要件
+- 上記YAMLのスタイル特徴を**厳密に反映**して記事を生成
+- 見出し頻度: {style_features.get('h2_per_1000_words', 3):.1f}本/1000語 程度
+- 絵文字使用: {style_features.get('emoji_in_headings_ratio', 0)*100:.0f}%の見出しに適切な絵文字
+- 箇条書き密度: {style_features.get('bullet_density', 0)*100:.1f}%程度
+- 語調: {tone}
+- 文長: 平均{style_features.get('avg_sentence_length', 30):.0f}文字程度
+{article_brief}"""
+
+def _style_chapter_request(subject: str, chapter: int, practical_examples: str = "", extra_instruction: str = "") -> str:
+    """
+    スタイルガイド付き生成の章ごとのユーザーメッセージ（章ごとに変わる指示だけを含める）
+    """
+    if chapter == 3 and practical_examples:
+        return (
+            f"{subject}を、スタイルガイドと各章の執筆ルールに従って生成してください。\n"
+            "この章では表を使用せず、テキストでの説明に集中してください。\n\n"
+            "以下の実践例を活用して実用的な内容にしてください。\n\n"
+            f"実践例:\n{practical_examples}\n\n"
+            "JSONで{\"section\": \"...\"}の形で返してください。"
+        )
+
+    if chapter <= 2:
+        table_instruction = "📊 表を使用する場合は効果的に活用してください（記事全体で2つまで）"
+    else:
+        table_instruction = "📄 この章では表は使用せず、文章での説明を中心にしてください"
+    return (
+        f"{subject}を、スタイルガイドと各章の執筆ルールに従って生成してください。\n"
+        f"{table_instruction}\n\n"
+        f"可能な限り具体例・プロンプト例を含めて実践的な内容にしてください。{extra_instruction}"
+        "JSONで{\"section\": \"...\"}の形で返してください。"
+    )
+
+async def generate_keyword_article_with_style_async(keyword: str, style_features: dict, num_sections: int = 5) -> dict:
+    """
+    キーワードベースでスタイルガイドを適用した記事を生成
+    """
+    if "error" in style_features:
+        return {"error": "スタイル特徴の抽出に失敗しました"}
+    
+    # スタイルガイドYAMLを生成
+    style_yaml = generate_style_yaml(style_features)
+    
+    # スタイルガイド付きシステムプロンプト（記事内のすべての呼び出しで共通の接頭辞）
+    system_prompt = _build_style_system_prompt(style_yaml, style_features, f"""
 ## キーワードベース記事生成
 「{keyword}」というキーワードをテーマに、上記スタイルガイドに従った記事を生成してください。
 - SEOを意識した構成
 - 検索ユーザーのニーズに応える内容
 - 参考記事のスタイルを忠実に再現
 - 表・プロンプト例・具体例を積極的に活用
-"""
+""")
 
     # タイトル生成
-    title_resp = openai.chat.completions.create(
+    title_request = _create_chat_completion(
+        stage="title",
         model="gpt-4o",
         messages=[
             {"role": "system", "content": system_prompt},
@@ -1377,10 +2186,10 @@ def generate_keyword_article_with_style(keyword: str, style_features: dict, num_
         max_tokens=200,
         response_format={"type": "json_object"}
     )
-    title = json.loads(title_resp.choices[0].message.content)["title"]
 
     # リード文生成
-    lead_resp = openai.chat.completions.create(
+    lead_request = _create_chat_completion(
+        stage="lead",
         model="gpt-4o",
         messages=[
             {"role": "system", "content": system_prompt},
@@ -1390,47 +2199,46 @@ def generate_keyword_article_with_style(keyword: str, style_features: dict, num_
         max_tokens=800,
         response_format={"type": "json_object"}
     )
-    lead_text = json.loads(lead_resp.choices[0].message.content)["lead"]
 
     # 実践的な例・プロンプト例を生成
-    try:
-        practical_examples = generate_practical_examples(keyword)
-        print(f"✅ 実践例生成完了: {len(practical_examples)}文字")
-    except Exception as e:
-        print(f"⚠️ 実践例生成失敗: {e}")
-        practical_examples = ""
+    async def _practical_examples() -> str:
+        try:
+            practical_examples = await generate_practical_examples_async(keyword)
+            print(f"✅ 実践例生成完了: {len(practical_examples)}文字")
+            return practical_examples
+        except Exception as e:
+            print(f"⚠️ 実践例生成失敗: {e}")
+            return ""
+
+    # タイトル・リード文・実践例は互いに独立しているため並行して生成（実践例は第3章で使用）
+    title_resp, lead_resp, practical_examples = await asyncio.gather(
+        title_request,
+        lead_request,
+        _practical_examples()
+    )
+    title = json.loads(title_resp.choices[0].message.content)["title"]
+    lead_text = json.loads(lead_resp.choices[0].message.content)["lead"]
 
-    # 章ごと生成
-    sections = []
+    # 章ごと生成（共通の執筆ルールはシステムプロンプト側にあり、ここでは章ごとの差分だけを指定する）
+    section_messages_list = []
     for i in range(1, num_sections + 1):
-        # 3章目に実践例を挿入
-        # 表の使用制限（1記事あたり2つまで）
-        can_use_table = i <= 2  # 第1章と第2章のみ表を使用可能
-        
-        if i == 3 and practical_examples:
-            user_content = f"「{keyword}」についての記事の第{i}章を、スタイルガイドに従って340文字以上で生成してください。見出しは&lt;h2&gt;&lt;/h2&gt;タグで囲んでください。\n\n📝 文章スタイル指針：\n- 本文の地の文では絵文字は使用しない（シンプルで読みやすい文章）\n- 表内での絵文字使用は可（視覚的な整理に効果的）\n\n🎨 ビジュアライズを積極的に活用してください：\n- 箇条書き（&lt;ul&gt;&lt;li&gt;）で重要ポイントを整理\n- 番号付きリスト（&lt;ol&gt;&lt;li&gt;）で手順や順序を明確化\n- 小見出し（&lt;h3&gt;）で内容を細かく区切る\n- 太字（&lt;strong&gt;）で要点を強調\n- 長い段落は適度に分割し、読みやすく構成\n- 情報を階層化して理解しやすくする\n\n🎯 おすすめプロンプト例を積極的に含めてください：\n- 「ChatGPTに『具体的なシチュエーションを教えて』と聞いてみましょう」\n- 「『〜を初心者向けに分かりやすく説明して』とお願いしてみてください」\n- 実際に使える具体的なプロンプト例を2-3個含めてください\n\n📌 重要な制約：\n- FAQは最後に一括で記述するため、この章ではFAQ形式の表は使用しないでください\n- Q&A形式の内容は避け、説明や手順を中心に記述してください\n- この章では表を使用せず、テキストでの説明に集中してください\n\n以下の実践例を活用して実用的な内容にしてください。\n\n実践例:\n{practical_examples}\n\nJSONで{{\"section\": \"...\"}}の形で返してください。"
-        else:
-            table_instruction = "📊 表を使用する場合は効果的に活用してください（記事全体で2つまで）" if can_use_table else "�� この章では表は使用せず、文章での説明を中心にしてください"
-            user_content = f"「{keyword}」についての記事の第{i}章を、スタイルガイドに従って340文字以上で生成してください。見出しは&lt;h2&gt;&lt;/h2&gt;タグで囲んでください。\n\n📝 文章スタイル指針：\n- 本文の地の文では絵文字は使用しない（シンプルで読みやすい文章）\n- 表内での絵文字使用は可（視覚的な整理に効果的）\n\n🎨 ビジュアライズを積極的に活用してください：\n- 箇条書き（&lt;ul&gt;&lt;li&gt;）で重要ポイントを整理\n- 番号付きリスト（&lt;ol&gt;&lt;li&gt;）で手順や順序を明確化\n- 小見出し（&lt;h3&gt;）で内容を細かく区切る\n- 太字（&lt;strong&gt;）で要点を強調\n- 長い段落は適度に分割し、読みやすく構成\n- 情報を階層化して理解しやすくする\n\n🎯 おすすめプロンプト例を積極的に含めてください：\n- 「ChatGPTに『具体的なシチュエーションを教えて』と聞いてみましょう」\n- 「『〜を初心者向けに分かりやすく説明して』とお願いしてみてください」\n- 実際に使える具体的なプロンプト例を2-3個含めてください\n\n📌 重要な制約：\n- FAQは最後に一括で記述するため、この章ではFAQ形式の表は使用しないでください\n- Q&A形式の内容は避け、説明や手順を中心に記述してください\n- {table_instruction}\n\n可能な限り具体例・プロンプト例を含めて実践的な内容にしてください。JSONで{{\"section\": \"...\"}}の形で返してください。"
-        
-        section_resp = openai.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_content}
-            ],
-            temperature=0.7,
-            max_tokens=800,
-            response_format={"type": "json_object"}
+        user_content = _style_chapter_request(
+            f"「{keyword}」についての記事の第{i}章",
+            chapter=i,
+            practical_examples=practical_examples
         )
-        section_text = json.loads(section_resp.choices[0].message.content)["section"]
-        sections.append(section_text)
+        section_messages_list.append([
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_content}
+        ])
+
+    sections = await generate_sections_async(section_messages_list)
 
     # FAQ生成
-    faq_section = generate_faq_section(keyword, lead_text + "\n".join(sections[:2]))  # 最初の2章を参考に
+    faq_section = await generate_faq_section_async(keyword, lead_text + "\n".join(sections[:2]))  # 最初の2章を参考に
     
     # 結論セクション生成
-    conclusion_section = generate_conclusion_section(keyword, lead_text + "\n".join(sections) + "\n" + faq_section)
+    conclusion_section = await generate_conclusion_section_async(keyword, lead_text + "\n".join(sections) + "\n" + faq_section)
     
     # 結合
     content = lead_text + "\n" + "\n".join(sections) + "\n" + faq_section + "\n" + conclusion_section
@@ -1446,12 +2254,39 @@ def generate_keyword_article_with_style(keyword: str, style_features: dict, num_
         "style_yaml": style_yaml
     }
 
-def generate_practical_examples(keyword: str) -> str:
+def generate_keyword_article_with_style(keyword: str, style_features: dict, num_sections: int = 5) -> dict:
+    """
+    generate_keyword_article_with_style_async の同期版
+    """
+    return run_sync(generate_keyword_article_with_style_async(keyword, style_features, num_sections))
+
+def _optional_stage_model(stage_label: str, model: str = "gpt-4o"):
+    """
+    任意ステージ（実践例・FAQ）で使うモデルを決定
+    トークン予算（ARTICLE_TOKEN_BUDGET）超過時は TOKEN_BUDGET_ACTION に従い、
+    skip なら None（ステージを省略）、downgrade なら軽量モデルを返す
+    """
+    ledger = get_token_ledger()
+    if not ledger.over_budget():
+        return model
+    if os.getenv("TOKEN_BUDGET_ACTION", "downgrade").lower() == "skip":
+        print(f"⚠️ トークン予算超過（{ledger.total_tokens()}/{ledger.budget_tokens}）のため{stage_label}を省略します")
+        return None
+    downgrade_model = os.getenv("TOKEN_BUDGET_DOWNGRADE_MODEL", "gpt-4o-mini")
+    print(f"⚠️ トークン予算超過（{ledger.total_tokens()}/{ledger.budget_tokens}）のため{stage_label}を{downgrade_model}で生成します")
+    return downgrade_model
+
+async def generate_practical_examples_async(keyword: str) -> str:
     """
     キーワードに応じた実践的な例・プロンプト例を生成
     """
-    example_resp = openai.chat.completions.create(
-        model="gpt-4o",
+    model = _optional_stage_model("実践例")
+    if model is None:
+        return ""
+
+    example_resp = await _create_chat_completion(
+        stage="practical_examples",
+        model=model,
         messages=[
             {
                 "role": "system", 
@@ -1483,12 +2318,23 @@ JSONで{"examples": "..."}の形で返してください。
     
     return json.loads(example_resp.choices[0].message.content)["examples"]
 
-def generate_faq_section(prompt: str, article_content: str) -> str:
+def generate_practical_examples(keyword: str) -> str:
+    """
+    generate_practical_examples_async の同期版
+    """
+    return run_sync(generate_practical_examples_async(keyword))
+
+async def generate_faq_section_async(prompt: str, article_content: str) -> str:
     """
     記事のテーマに関連したFAQ 3つを生成（AI-GENEスタイル）
     """
-    faq_resp = openai.chat.completions.create(
-        model="gpt-4o",
+    model = _optional_stage_model("FAQ")
+    if model is None:
+        return ""
+
+    faq_resp = await _create_chat_completion(
+        stage="faq",
+        model=model,
         messages=[
             {
                 "role": "system",
@@ -1527,11 +2373,18 @@ JSONで{"faq": "..."}の形で返してください。
     )
     return json.loads(faq_resp.choices[0].message.content)["faq"]
 
-def generate_conclusion_section(prompt: str, article_content: str) -> str:
+def generate_faq_section(prompt: str, article_content: str) -> str:
+    """
+    generate_faq_section_async の同期版
+    """
+    return run_sync(generate_faq_section_async(prompt, article_content))
+
+async def generate_conclusion_section_async(prompt: str, article_content: str) -> str:
     """
     記事の締めの言葉を2文で生成
     """
-    conclusion_resp = openai.chat.completions.create(
+    conclusion_resp = await _create_chat_completion(
+        stage="conclusion",
         model="gpt-4o",
         messages=[
             {
@@ -1571,7 +2424,13 @@ JSONで{"conclusion": "..."}の形で返してください。
     )
     return json.loads(conclusion_resp.choices[0].message.content)["conclusion"]
 
-def generate_article_html_integrated(integrated_prompt: str, keywords: list, num_sections: int = 5) -> dict:
+def generate_conclusion_section(prompt: str, article_content: str) -> str:
+    """
+    generate_conclusion_section_async の同期版
+    """
+    return run_sync(generate_conclusion_section_async(prompt, article_content))
+
+async def generate_article_html_integrated_async(integrated_prompt: str, keywords: list, num_sections: int = 5) -> dict:
     """
     複数キーワードを統合した記事をHTMLで生成（標準モード）
     """
@@ -1596,7 +2455,8 @@ def generate_article_html_integrated(integrated_prompt: str, keywords: list, num
         "JSONで{\"lead\": \"...\"}の形で返してください。"
     )
     
-    lead_resp = openai.chat.completions.create(
+    lead_request = _create_chat_completion(
+        stage="lead",
         model="gpt-4o",
         messages=[
             {"role": "system", "content": lead_msg},
@@ -1606,10 +2466,9 @@ def generate_article_html_integrated(integrated_prompt: str, keywords: list, num
         max_tokens=800,
         response_format={"type": "json_object"}
     )
-    lead_text = json.loads(lead_resp.choices[0].message.content)["lead"]
 
     # 章ごと生成（キーワード統合版）
-    sections = []
+    section_messages_list = []
     for i in range(1, num_sections + 1):
         # 表の使用制限（1記事あたり2つまで）
         can_use_table = i <= 2  # 第1章と第2章のみ表を使用可能
@@ -1648,24 +2507,23 @@ def generate_article_html_integrated(integrated_prompt: str, keywords: list, num
             "JSONで{\"section\": \"...\"}の形で返してください。"
         )
         
-        section_resp = openai.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": section_msg},
-                {"role": "user", "content": integrated_prompt}
-            ],
-            temperature=0.7,
-            max_tokens=800,
-            response_format={"type": "json_object"}
-        )
-        section_text = json.loads(section_resp.choices[0].message.content)["section"]
-        sections.append(section_text)
+        section_messages_list.append([
+            {"role": "system", "content": section_msg},
+            {"role": "user", "content": integrated_prompt}
+        ])
+
+    # リード文と各章は互いに独立しているため並行して生成
+    lead_resp, sections = await asyncio.gather(
+        lead_request,
+        generate_sections_async(section_messages_list)
+    )
+    lead_text = json.loads(lead_resp.choices[0].message.content)["lead"]
 
     # FAQ生成（キーワード統合版）
-    faq_section = generate_faq_section_integrated(keywords, lead_text + "\n".join(sections[:2]))
+    faq_section = await generate_faq_section_integrated_async(keywords, lead_text + "\n".join(sections[:2]))
     
     # 結論セクション生成（キーワード統合版）
-    conclusion_section = generate_conclusion_section_integrated(keywords, lead_text + "\n".join(sections) + "\n" + faq_section)
+    conclusion_section = await generate_conclusion_section_integrated_async(keywords, lead_text + "\n".join(sections) + "\n" + faq_section)
     
     # 結合
     content = lead_text + "\n" + "\n".join(sections) + "\n" + faq_section + "\n" + conclusion_section
@@ -1676,7 +2534,13 @@ def generate_article_html_integrated(integrated_prompt: str, keywords: list, num
         "integrated_article": True
     }
 
-def generate_keyword_article_with_style_integrated(integrated_prompt: str, keywords: list, style_features: dict, num_sections: int = 5) -> dict:
+def generate_article_html_integrated(integrated_prompt: str, keywords: list, num_sections: int = 5) -> dict:
+    """
+    generate_article_html_integrated_async の同期版
+    """
+    return run_sync(generate_article_html_integrated_async(integrated_prompt, keywords, num_sections))
+
+async def generate_keyword_article_with_style_integrated_async(integrated_prompt: str, keywords: list, style_features: dict, num_sections: int = 5) -> dict:
     """
     複数キーワードを統合した記事をスタイルガイド付きで生成
     """
@@ -1685,44 +2549,16 @@ def generate_keyword_article_with_style_integrated(integrated_prompt: str, keywo
     
     if "error" in style_features:
         # エラー時は標準モードにフォールバック
-        return generate_article_html_integrated(integrated_prompt, keywords, num_sections)
+        return await generate_article_html_integrated_async(integrated_prompt, keywords, num_sections)
     
     # スタイルガイドYAMLを生成
     style_yaml = generate_style_yaml(style_features)
     
-    # スタイルガイド付きシステムプロンプト（統合版）
-    system_prompt = f"""
-あなたは視覚的にわかりやすい技術ライターです。
-
-## スタイルガイド（参考記事から抽出されたスタイル特徴）
-```yaml
-{style_yaml}
-```
-
+    # スタイルガイド付きシステムプロンプト（統合版・記事内のすべての呼び出しで共通の接頭辞）
+    keyword_lines = "\n".join(f"- {kw}" for kw in keywords)
+    system_prompt = _build_style_system_prompt(style_yaml, style_features, f"""
 ## 対象キーワード（SEO最適化）
-{chr(10).join([f"- {kw}" for kw in keywords])}
-
-## 出力要件
-- 上記YAMLのスタイル特徴を**厳密に反映**して記事を生成
-- すべて **HTML** で書く（WordPressに適した形式）
-- 見出しは &lt;h2&gt;タグを使用（絵文字込み）
-- 見出し頻度: {style_features.get('h2_per_1000_words', 3):.1f}本/1000語 程度
-- 絵文字使用: {style_features.get('emoji_in_headings_ratio', 0)*100:.0f}%の見出しに適切な絵文字
-- 箇条書きは &lt;ul&gt;&lt;li&gt;タグを使用
-- 箇条書き密度: {style_features.get('bullet_density', 0)*100:.1f}%程度
-- **リッチな表を積極活用**: 比較・手順・データは&lt;table&gt;&lt;tr&gt;&lt;td&gt;タグで構造化
-- **対話形式のプロンプト例**: 実際の会話形式で表現（例：「〜について教えて」）
-- 語調: {"です・ます調" if style_features.get('tone') == 'polite' else "自然な混合調"}
-- 文長: 平均{style_features.get('avg_sentence_length', 30):.0f}文字程度
-- **本文**: 地の文では絵文字を使用せず、シンプルで読みやすい文章（表内での絵文字使用は可）
-
-## 記事生成指針（AI-GENEスタイル準拠）
-以下の要素を必ず含めてください：
-1. **比較表（リッチスタイル）**: 「NG例」「改善例」「効果」の3列構成でわかりやすく
-2. **対話形式の例**: プロンプトは会話形式で表現（「ChatGPTに『〜について教えて』と聞いてみましょう」）
-3. **FAQ形式**: Q&A形式で読みやすく情報を整理
-4. **段階的な手順**: 初心者でもわかるステップバイステップ構成
-5. **具体的な事例**: 実際に使える例を豊富に提供
+{keyword_lines}
 
 ## 統合記事生成
 複数のキーワードを自然に統合し、各キーワードの検索意図を満たす包括的な記事を生成してください。
@@ -1730,10 +2566,11 @@ def generate_keyword_article_with_style_integrated(integrated_prompt: str, keywo
 - 検索ユーザーのニーズに応える内容
 - 参考記事のスタイルを忠実に再現
 - 表・プロンプト例・具体例を積極的に活用
-"""
+""")
 
     # リード文生成
-    lead_resp = openai.chat.completions.create(
+    lead_request = _create_chat_completion(
+        stage="lead",
         model="gpt-4o",
         messages=[
             {"role": "system", "content": system_prompt},
@@ -1743,47 +2580,45 @@ def generate_keyword_article_with_style_integrated(integrated_prompt: str, keywo
         max_tokens=800,
         response_format={"type": "json_object"}
     )
-    lead_text = json.loads(lead_resp.choices[0].message.content)["lead"]
 
     # 実践的な例・プロンプト例を生成
-    try:
-        practical_examples = generate_practical_examples_integrated(keywords)
-        print(f"✅ 統合実践例生成完了: {len(practical_examples)}文字")
-    except Exception as e:
-        print(f"⚠️ 統合実践例生成失敗: {e}")
-        practical_examples = ""
+    async def _practical_examples() -> str:
+        try:
+            practical_examples = await generate_practical_examples_integrated_async(keywords)
+            print(f"✅ 統合実践例生成完了: {len(practical_examples)}文字")
+            return practical_examples
+        except Exception as e:
+            print(f"⚠️ 統合実践例生成失敗: {e}")
+            return ""
 
-    # 章ごと生成
-    sections = []
+    # リード文・実践例は互いに独立しているため並行して生成（実践例は第3章で使用）
+    lead_resp, practical_examples = await asyncio.gather(
+        lead_request,
+        _practical_examples()
+    )
+    lead_text = json.loads(lead_resp.choices[0].message.content)["lead"]
+
+    # 章ごと生成（共通の執筆ルールはシステムプロンプト側にあり、ここでは章ごとの差分だけを指定する）
+    section_messages_list = []
     for i in range(1, num_sections + 1):
-        # 3章目に実践例を挿入
-        # 表の使用制限（1記事あたり2つまで）
-        can_use_table = i <= 2  # 第1章と第2章のみ表を使用可能
-        
-        if i == 3 and practical_examples:
-            user_content = f"複数キーワード「{keywords_text}」についての記事の第{i}章を、スタイルガイドに従って340文字以上で生成してください。見出しは&lt;h2&gt;&lt;/h2&gt;タグで囲んでください。\n\n📝 文章スタイル指針：\n- 本文の地の文では絵文字は使用しない（シンプルで読みやすい文章）\n- 表内での絵文字使用は可（視覚的な整理に効果的）\n\n🎨 ビジュアライズを積極的に活用してください：\n- 箇条書き（&lt;ul&gt;&lt;li&gt;）で重要ポイントを整理\n- 番号付きリスト（&lt;ol&gt;&lt;li&gt;）で手順や順序を明確化\n- 小見出し（&lt;h3&gt;）で内容を細かく区切る\n- 太字（&lt;strong&gt;）で要点を強調\n- 長い段落は適度に分割し、読みやすく構成\n- 情報を階層化して理解しやすくする\n\n🎯 おすすめプロンプト例を積極的に含めてください：\n- 「ChatGPTに『具体的なシチュエーションを教えて』と聞いてみましょう」\n- 「『〜を初心者向けに分かりやすく説明して』とお願いしてみてください」\n- 実際に使える具体的なプロンプト例を2-3個含めてください\n\n📌 重要な制約：\n- FAQは最後に一括で記述するため、この章ではFAQ形式の表は使用しないでください\n- Q&A形式の内容は避け、説明や手順を中心に記述してください\n- この章では表を使用せず、テキストでの説明に集中してください\n\n以下の実践例を活用して実用的な内容にしてください。\n\n実践例:\n{practical_examples}\n\nJSONで{{\"section\": \"...\"}}の形で返してください。"
-        else:
-            table_instruction = "📊 表を使用する場合は効果的に活用してください（記事全体で2つまで）" if can_use_table else "📄 この章では表は使用せず、文章での説明を中心にしてください"
-            user_content = f"複数キーワード「{keywords_text}」についての記事の第{i}章を、スタイルガイドに従って340文字以上で生成してください。見出しは&lt;h2&gt;&lt;/h2&gt;タグで囲んでください。\n\n📝 文章スタイル指針：\n- 本文の地の文では絵文字は使用しない（シンプルで読みやすい文章）\n- 表内での絵文字使用は可（視覚的な整理に効果的）\n\n🎨 ビジュアライズを積極的に活用してください：\n- 箇条書き（&lt;ul&gt;&lt;li&gt;）で重要ポイントを整理\n- 番号付きリスト（&lt;ol&gt;&lt;li&gt;）で手順や順序を明確化\n- 小見出し（&lt;h3&gt;）で内容を細かく区切る\n- 太字（&lt;strong&gt;）で要点を強調\n- 長い段落は適度に分割し、読みやすく構成\n- 情報を階層化して理解しやすくする\n\n🎯 おすすめプロンプト例を積極的に含めてください：\n- 「ChatGPTに『具体的なシチュエーションを教えて』と聞いてみましょう」\n- 「『〜を初心者向けに分かりやすく説明して』とお願いしてみてください」\n- 実際に使える具体的なプロンプト例を2-3個含めてください\n\n📌 重要な制約：\n- FAQは最後に一括で記述するため、この章ではFAQ形式の表は使用しないでください\n- Q&A形式の内容は避け、説明や手順を中心に記述してください\n- {table_instruction}\n\n可能な限り具体例・プロンプト例を含めて実践的な内容にしてください。各キーワードの検索意図を満たす内容を含めてください。JSONで{{\"section\": \"...\"}}の形で返してください。"
-        
-        section_resp = openai.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_content}
-            ],
-            temperature=0.7,
-            max_tokens=800,
-            response_format={"type": "json_object"}
+        user_content = _style_chapter_request(
+            f"複数キーワード「{keywords_text}」についての記事の第{i}章",
+            chapter=i,
+            practical_examples=practical_examples,
+            extra_instruction="各キーワードの検索意図を満たす内容を含めてください。"
         )
-        section_text = json.loads(section_resp.choices[0].message.content)["section"]
-        sections.append(section_text)
+        section_messages_list.append([
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_content}
+        ])
+
+    sections = await generate_sections_async(section_messages_list)
 
     # FAQ生成
-    faq_section = generate_faq_section_integrated(keywords, lead_text + "\n".join(sections[:2]))  # 最初の2章を参考に
+    faq_section = await generate_faq_section_integrated_async(keywords, lead_text + "\n".join(sections[:2]))  # 最初の2章を参考に
     
     # 結論セクション生成
-    conclusion_section = generate_conclusion_section_integrated(keywords, lead_text + "\n".join(sections) + "\n" + faq_section)
+    conclusion_section = await generate_conclusion_section_integrated_async(keywords, lead_text + "\n".join(sections) + "\n" + faq_section)
     
     # 結合
     content = lead_text + "\n" + "\n".join(sections) + "\n" + faq_section + "\n" + conclusion_section
@@ -1801,15 +2636,26 @@ def generate_keyword_article_with_style_integrated(integrated_prompt: str, keywo
         "style_yaml": style_yaml
     }
 
-def generate_practical_examples_integrated(keywords: list) -> str:
+def generate_keyword_article_with_style_integrated(integrated_prompt: str, keywords: list, style_features: dict, num_sections: int = 5) -> dict:
+    """
+    generate_keyword_article_with_style_integrated_async の同期版
+    """
+    return run_sync(generate_keyword_article_with_style_integrated_async(integrated_prompt, keywords, style_features, num_sections))
+
+async def generate_practical_examples_integrated_async(keywords: list) -> str:
     """
     統合キーワードに応じた実践的な例・プロンプト例を生成
     """
     keywords_text = "、".join(keywords)
     primary_keyword = keywords[0] if keywords else "AI活用"
     
-    example_resp = openai.chat.completions.create(
-        model="gpt-4o",
+    model = _optional_stage_model("実践例")
+    if model is None:
+        return ""
+
+    example_resp = await _create_chat_completion(
+        stage="practical_examples",
+        model=model,
         messages=[
             {
                 "role": "system", 
@@ -1842,15 +2688,26 @@ JSONで{"examples": "..."}の形で返してください。
     
     return json.loads(example_resp.choices[0].message.content)["examples"]
 
-def generate_faq_section_integrated(keywords: list, article_content: str) -> str:
+def generate_practical_examples_integrated(keywords: list) -> str:
+    """
+    generate_practical_examples_integrated_async の同期版
+    """
+    return run_sync(generate_practical_examples_integrated_async(keywords))
+
+async def generate_faq_section_integrated_async(keywords: list, article_content: str) -> str:
     """
     統合キーワードに関連したFAQ 3つを生成（AI-GENEスタイル）
     """
     keywords_text = "、".join(keywords)
     primary_keyword = keywords[0] if keywords else "AI活用"
     
-    faq_resp = openai.chat.completions.create(
-        model="gpt-4o",
+    model = _optional_stage_model("FAQ")
+    if model is None:
+        return ""
+
+    faq_resp = await _create_chat_completion(
+        stage="faq",
+        model=model,
         messages=[
             {
                 "role": "system",
@@ -1884,14 +2741,21 @@ JSONで{"faq": "..."}の形で返してください。
     )
     return json.loads(faq_resp.choices[0].message.content)["faq"]
 
-def generate_conclusion_section_integrated(keywords: list, article_content: str) -> str:
+def generate_faq_section_integrated(keywords: list, article_content: str) -> str:
+    """
+    generate_faq_section_integrated_async の同期版
+    """
+    return run_sync(generate_faq_section_integrated_async(keywords, article_content))
+
+async def generate_conclusion_section_integrated_async(keywords: list, article_content: str) -> str:
     """
     統合キーワード記事の締めの言葉を2文で生成
     """
     keywords_text = "、".join(keywords)
     primary_keyword = keywords[0] if keywords else "AI活用"
     
-    conclusion_resp = openai.chat.completions.create(
+    conclusion_resp = await _create_chat_completion(
+        stage="conclusion",
         model="gpt-4o",
         messages=[
             {
@@ -1925,6 +2789,12 @@ JSONで{"conclusion": "..."}の形で返してください。
     )
     return json.loads(conclusion_resp.choices[0].message.content)["conclusion"]
 
+def generate_conclusion_section_integrated(keywords: list, article_content: str) -> str:
+    """
+    generate_conclusion_section_integrated_async の同期版
+    """
+    return run_sync(generate_conclusion_section_integrated_async(keywords, article_content))
+
 if __name__ == "__main__":
     # 新しい統合キーワードシステムのテスト
     print("=== 統合キーワードシステムテスト ===")
@@ -3,9 +3,15 @@ ChatGPTとのやり取りを担当するハンドラー
 """
 
 import os
+import time
 import openai
 from dotenv import load_dotenv
 from typing import List, Dict, Optional
+from openai.types.chat import ChatCompletion
+from utils.completion_cache import CompletionCache, get_completion_cache
+from utils.rate_limiter import RateLimiter, get_rate_limiter
+from utils.retry_policy import get_retry_policy
+from utils.token_ledger import current_stage, get_token_ledger
 
 # 環境変数読み込み
 load_dotenv()
@@ -25,13 +31,15 @@ class ChatGPTHandler:
             raise ValueError("OpenAI APIキーが設定されていません")
         
         openai.api_key = self.api_key
-        self.client = openai.OpenAI(api_key=self.api_key)
+        # 再試行は utils.retry_policy で一元管理するためSDK側の自動リトライは無効化
+        self.client = openai.OpenAI(api_key=self.api_key, max_retries=0)
     
     def generate_completion(self, 
                           messages: List[Dict[str, str]], 
                           model: str = "gpt-3.5-turbo",
                           max_tokens: int = 2000,
-                          temperature: float = 0.7) -> str:
+                          temperature: float = 0.7,
+                          use_cache: bool = False) -> str:
         """
         ChatGPTからの応答を生成
         
@@ -40,17 +48,47 @@ class ChatGPTHandler:
             model: 使用するモデル
             max_tokens: 最大トークン数
             temperature: 温度パラメータ
+            use_cache: 永続キャッシュを使うか（本文・タイトルなど毎回違う結果が必要な呼び出しでは使わない）
             
         Returns:
             生成されたテキスト
         """
         try:
-            response = self.client.chat.completions.create(
-                model=model,
-                messages=messages,
-                max_tokens=max_tokens,
-                temperature=temperature
-            )
+            started = time.monotonic()
+            completion_cache = get_completion_cache() if use_cache else None
+            if completion_cache:
+                cache_key = CompletionCache.make_key(model, messages, temperature, max_tokens=max_tokens)
+                cached = completion_cache.get(cache_key)
+                if cached is not None:
+                    response = ChatCompletion.model_validate_json(cached)
+                    get_token_ledger().record_chat(current_stage("chatgpt_handler"), model, response.usage,
+                                                   time.monotonic() - started, cache_hit=True)
+                    return response.choices[0].message.content.strip()
+
+            limiter = get_rate_limiter()
+            policy = get_retry_policy("openai_chat")
+            estimated_tokens = RateLimiter.estimate_tokens(messages, max_tokens)
+
+            def send():
+                limiter.acquire(model, estimated_tokens)
+                try:
+                    return self.client.chat.completions.create(
+                        model=model,
+                        messages=messages,
+                        max_tokens=max_tokens,
+                        temperature=temperature,
+                        timeout=policy.timeout
+                    )
+                except Exception:
+                    limiter.record_usage(model, estimated_tokens, 0)
+                    raise
+
+            response = policy.call(send)
+            limiter.record_usage(model, estimated_tokens, response.usage.total_tokens if response.usage else estimated_tokens)
+            get_token_ledger().record_chat(current_stage("chatgpt_handler"), model, response.usage,
+                                           time.monotonic() - started)
+            if completion_cache and response.choices[0].finish_reason == "stop":
+                completion_cache.set(cache_key, response.model_dump_json())
             return response.choices[0].message.content.strip()
         except Exception as e:
             print(f"ChatGPT API エラー: {e}")
@@ -152,7 +190,7 @@ class ChatGPTHandler:
             {"role": "user", "content": prompt}
         ]
         
-        return self.generate_completion(messages, max_tokens=200)
+        return self.generate_completion(messages, max_tokens=200, use_cache=True)
     
     def generate_seo_tags(self, content: str, max_tags: int = 10) -> List[str]:
         """
@@ -181,7 +219,7 @@ class ChatGPTHandler:
             {"role": "user", "content": prompt}
         ]
         
-        response = self.generate_completion(messages, max_tokens=200)
+        response = self.generate_completion(messages, max_tokens=200, use_cache=True)
         
         # タグを抽出
         tags = [tag.strip() for tag in response.split(',')]
@@ -3,9 +3,16 @@ DALL-E 3での画像生成を担当するハンドラー
 """
 
 import os
+import json
+import base64
+import time
 import openai
 from dotenv import load_dotenv
-from typing import Optional
+from typing import Dict, List, Optional
+from utils.rate_limiter import RateLimiter, get_rate_limiter
+from utils.retry_policy import get_retry_policy
+from utils.token_ledger import current_stage, get_token_ledger
+from utils.image_tiers import fallback_tier, image_request_params, select_image_tier
 
 # 環境変数読み込み
 load_dotenv()
@@ -25,7 +32,8 @@ class DalleHandler:
             raise ValueError("OpenAI APIキーが設定されていません")
         
         openai.api_key = self.api_key
-        self.client = openai.OpenAI(api_key=self.api_key)
+        # 再試行は utils.retry_policy で一元管理するためSDK側の自動リトライは無効化
+        self.client = openai.OpenAI(api_key=self.api_key, max_retries=0)
     
     def generate_image_prompt(self, article_content: str) -> str:
         """
@@ -52,66 +60,218 @@ DALL-E 3で生成するための具体的で詳細な画像プロンプトを作
 """
         
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are an expert at creating image prompts for DALL-E 3."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=200,
-                temperature=0.7
-            )
-            
-            return response.choices[0].message.content.strip()
+            messages = [
+                {"role": "system", "content": "You are an expert at creating image prompts for DALL-E 3."},
+                {"role": "user", "content": prompt}
+            ]
+            return self._complete(messages, max_tokens=200)
         except Exception as e:
             print(f"画像プロンプト生成エラー: {e}")
             return "A modern, clean illustration representing technology and innovation"
+
+    def generate_image_prompts(self, headings: List[str], context: str = "") -> List[str]:
+        """
+        複数の見出しの画像生成プロンプトを1回の呼び出しでまとめて作成
+        
+        Args:
+            headings: 見出しテキストのリスト
+            context: 記事の概要（省略可）
+            
+        Returns:
+            見出しと同じ順序の画像生成用プロンプトのリスト
+        """
+        if not headings:
+            return []
+
+        numbered = "\n".join(f"{i}. {heading}" for i, heading in enumerate(headings, 1))
+        context_text = f"記事の概要: {context[:500]}\n\n" if context else ""
+        prompt = f"""
+以下の各見出しに最適な画像の説明を英語で作成してください。
+DALL-E 3で生成するための具体的で詳細な画像プロンプトを、見出しごとに1つずつ作成してください。
+
+{context_text}見出し:
+{numbered}
+
+要件:
+- 各見出しの内容を視覚的に表現（他の見出しと同じ内容を使い回さない）
+- 具体的で詳細な描写
+- 英語で出力
+- 各1-2文程度
+
+見出しと同じ順序・同じ件数で、JSONで{{"prompts": ["...", "..."]}}の形で返してください。
+"""
+        prompts = []
+        try:
+            messages = [
+                {"role": "system", "content": "You are an expert at creating image prompts for DALL-E 3."},
+                {"role": "user", "content": prompt}
+            ]
+            content = self._complete(messages, max_tokens=120 * len(headings) + 100,
+                                     response_format={"type": "json_object"})
+            prompts = json.loads(content).get("prompts", [])
+        except Exception as e:
+            print(f"画像プロンプト一括生成エラー: {e}")
+
+        if not isinstance(prompts, list) or len(prompts) != len(headings):
+            prompts = [""] * len(headings)
+        # 件数が合わない・空のプロンプトは見出しごとに作り直す
+        return [
+            p.strip() if isinstance(p, str) and p.strip()
+            else self.generate_image_prompt(f"Section about: {heading}")
+            for p, heading in zip(prompts, headings)
+        ]
+
+    def _complete(self, messages: List[Dict[str, str]], max_tokens: int, response_format: Optional[Dict] = None) -> str:
+        """
+        画像プロンプト作成用のチャット補完（レート制限・リトライ・トークン台帳を適用）
+        """
+        limiter = get_rate_limiter()
+        policy = get_retry_policy("openai_chat")
+        estimated_tokens = RateLimiter.estimate_tokens(messages, max_tokens)
+        started = time.monotonic()
+        extra = {"response_format": response_format} if response_format else {}
+
+        def send():
+            limiter.acquire("gpt-3.5-turbo", estimated_tokens)
+            try:
+                return self.client.chat.completions.create(
+                    model="gpt-3.5-turbo",
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    temperature=0.7,
+                    timeout=policy.timeout,
+                    **extra
+                )
+            except Exception:
+                limiter.record_usage("gpt-3.5-turbo", estimated_tokens, 0)
+                raise
+
+        response = policy.call(send)
+        limiter.record_usage("gpt-3.5-turbo", estimated_tokens, response.usage.total_tokens if response.usage else estimated_tokens)
+        get_token_ledger().record_chat(current_stage("image_prompt"), "gpt-3.5-turbo", response.usage,
+                                       time.monotonic() - started)
+        return response.choices[0].message.content.strip()
     
-    def generate_image_url(self, image_prompt: str, size: str = "1024x1024") -> str:
+    def generate_image_url(self, image_prompt: str, size: Optional[str] = None, slot: str = "inline") -> str:
         """
-        DALL-E 3で画像を生成
+        用途（featured / inline / fallback）のティアで画像を生成
         
         Args:
             image_prompt: 画像生成プロンプト
-            size: 画像サイズ
+            size: 画像サイズ（省略時はティアのサイズ）
+            slot: 画像の用途
             
         Returns:
             生成された画像のURL
         """
         try:
             print(f"🎨 画像生成中: {image_prompt[:50]}...")
-            
-            response = self.client.images.generate(
-                model="dall-e-3",
-                prompt=image_prompt,
-                size=size,
-                quality="standard",
-                n=1
-            )
-            
-            image_url = response.data[0].url
+            image_url = self._generate_image(image_prompt, "url", slot, size).url
             print(f"✅ 画像生成成功: {image_url}")
             return image_url
             
         except Exception as e:
             print(f"❌ 画像生成エラー: {e}")
             raise
+
+    def generate_image_data(self, image_prompt: str, size: Optional[str] = None, slot: str = "inline") -> bytes:
+        """
+        用途のティアで画像を生成し、画像データを直接受け取る（URLからのダウンロードを省く）
+        
+        Args:
+            image_prompt: 画像生成プロンプト
+            size: 画像サイズ（省略時はティアのサイズ）
+            slot: 画像の用途（featured / inline / fallback）
+            
+        Returns:
+            生成された画像のデータ（PNG）
+        """
+        try:
+            print(f"🎨 画像生成中: {image_prompt[:50]}...")
+            image_data = base64.b64decode(self._generate_image(image_prompt, "b64_json", slot, size).b64_json)
+            print(f"✅ 画像生成成功: {len(image_data)} bytes")
+            return image_data
+            
+        except Exception as e:
+            print(f"❌ 画像生成エラー: {e}")
+            raise
+
+    def _generate_image(self, image_prompt: str, response_format: str, slot: str = "inline", size: Optional[str] = None):
+        """
+        用途のティアで画像を生成（記事の所要時間の予算が残り少ない場合や失敗した場合は fallback ティア）
+        
+        Returns:
+            生成結果（response.data[0]）
+        """
+        tier = select_image_tier(slot, get_token_ledger().remaining_seconds())
+        if size:
+            tier = dict(tier, size=size)
+        try:
+            return self._request_image(image_prompt, response_format, tier)
+        except Exception as e:
+            fallback = fallback_tier(tier)
+            if fallback is None:
+                raise
+            print(f"⚠️ {tier['name']} ティアの画像生成に失敗（fallback ティアで生成します）: {e}")
+            return self._request_image(image_prompt, response_format, fallback)
+
+    def _request_image(self, image_prompt: str, response_format: str, tier: Dict):
+        """
+        画像生成APIの呼び出し（レート制限・リトライ・トークン台帳を適用）
+        
+        Returns:
+            生成結果（response.data[0]）
+        """
+        policy = get_retry_policy("openai_image")
+        params = image_request_params(tier, image_prompt)
+        started = time.monotonic()
+
+        def send():
+            get_rate_limiter().acquire(tier["model"])
+            return self.client.images.generate(n=1, response_format=response_format, **params)
+
+        response = policy.call(send)
+        get_token_ledger().record_image(current_stage("image"), tier["model"], tier["size"], tier["quality"],
+                                        time.monotonic() - started)
+        return response.data[0]
     
-    def generate_heading_image(self, heading_text: str) -> str:
+    def generate_heading_image(self, heading_text: str, image_prompt: Optional[str] = None) -> str:
         """
         見出しテキストから画像を生成
         
         Args:
             heading_text: 見出しテキスト
+            image_prompt: 一括生成済みの画像プロンプト（省略時は見出しから生成）
             
         Returns:
             生成された画像のURL
         """
         # 見出しから画像プロンプトを生成
-        image_prompt = self.generate_image_prompt(f"Section about: {heading_text}")
+        if not image_prompt:
+            image_prompt = self.generate_image_prompt(f"Section about: {heading_text}")
         
         # 画像を生成
         return self.generate_image_url(image_prompt)
+
+    def generate_heading_images(self, headings: List[str], context: str = "") -> List[Optional[str]]:
+        """
+        複数の見出しの画像を生成（画像プロンプトは1回の呼び出しでまとめて作成）
+        
+        Args:
+            headings: 見出しテキストのリスト
+            context: 記事の概要（省略可）
+            
+        Returns:
+            見出しと同じ順序の画像URLのリスト（生成に失敗した見出しはNone）
+        """
+        image_urls = []
+        for heading_text, image_prompt in zip(headings, self.generate_image_prompts(headings, context)):
+            try:
+                image_urls.append(self.generate_heading_image(heading_text, image_prompt))
+            except Exception as e:
+                print(f"⚠️ 見出し「{heading_text}」の画像生成に失敗: {e}")
+                image_urls.append(None)
+        return image_urls
     
     def generate_featured_image(self, title: str, content: str) -> str:
         """
@@ -128,5 +288,5 @@ DALL-E 3で生成するための具体的で詳細な画像プロンプトを作
         combined_content = f"Title: {title}\n\nContent: {content[:300]}"
         image_prompt = self.generate_image_prompt(combined_content)
         
-        # 画像を生成
-        return self.generate_image_url(image_prompt) 
\ No newline at end of file
+        # アイキャッチ用のティアで画像を生成
+        return self.generate_image_url(image_prompt, slot="featured") 
\ No newline at end of file
@@ -63,7 +63,7 @@ class SEOOptimizer:
                 {"role": "user", "content": prompt}
             ]
             
-            ai_slug = self.chatgpt_handler.generate_completion(messages, max_tokens=100)
+            ai_slug = self.chatgpt_handler.generate_completion(messages, max_tokens=100, use_cache=True)
             
             # AI生成スラッグの検証
             if ai_slug and re.match(r'^[a-z0-9-]+$', ai_slug.strip()) and len(ai_slug.strip()) <= 50:
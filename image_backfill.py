@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+画像の後追い処理ワーカー
+DEFER_IMAGES=true で先に投稿した記事の画像ジョブを処理し、本文とアイキャッチ画像に反映する
+
+使い方:
+    python image_backfill.py              # 残っているジョブをすべて処理
+    python image_backfill.py <投稿ID>     # 指定した記事のジョブだけを処理
+    python image_backfill.py --loop 60    # 60秒ごとにジョブを確認し続ける
+    python image_backfill.py stats        # ジョブの状態を表示
+"""
+
+import sys
+import time
+
+from post_article import WP_URL, run_image_backfill
+from utils.image_jobs import get_image_job_queue
+from utils.token_ledger import finish_token_ledger, start_token_ledger
+
+def main():
+    args = sys.argv[1:]
+
+    if args and args[0] == "stats":
+        stats = get_image_job_queue().stats(WP_URL)
+        print(f"🗂️ 画像ジョブ: 未処理 {stats['pending']} / 反映待ち {stats['uploaded']} / "
+              f"完了 {stats['done']} / 失敗 {stats['failed']}")
+        return
+
+    if args and args[0] == "--loop":
+        interval = float(args[1]) if len(args) > 1 else 60.0
+        print(f"🔁 {interval:.0f}秒ごとに画像ジョブを確認します（Ctrl+Cで終了）")
+        try:
+            while True:
+                start_token_ledger()
+                try:
+                    run_image_backfill()
+                finally:
+                    finish_token_ledger()
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            print("👋 終了します")
+        return
+
+    post_id = int(args[0]) if args else None
+    start_token_ledger()
+    try:
+        applied = run_image_backfill(post_id=post_id)
+        print(f"✅ 画像を{applied}枚反映しました")
+    finally:
+        finish_token_ledger()
+
+if __name__ == "__main__":
+    main()
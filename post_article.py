@@ -1,19 +1,23 @@
 # 1. モジュールと関数読み込み
 import os, requests, random, re, json
+import contextvars
 from dotenv import load_dotenv
 from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from bs4 import BeautifulSoup
 from generate_article import (
     generate_article_html,          
     generate_title_variants,
     generate_image_prompt,
-    generate_image_url,
+    generate_image_prompts,
+    generate_image_for_upload,
+    take_prefetched_image,
+    has_prefetched_image,
+    clear_prefetched_images,
     get_next_keyword,
     get_next_keyword_group,
     generate_integrated_article_from_keywords,
-    generate_meta_description,
-    generate_seo_tags,
-    generate_seo_slug,
+    generate_seo_metadata,
     extract_article_structure,
     generate_article_from_reference,
     extract_multiple_article_structures,
@@ -22,6 +26,17 @@ from generate_article import (
     generate_article_with_style_guide,
     generate_keyword_article_with_style
 )
+from utils.checkpoint_manager import CheckpointManager
+from utils.image_cache import ImageCache, get_image_cache
+from utils.image_hash import ArticleImageHashes, get_image_hash_index, image_hashes
+from utils.image_jobs import LeaseLostError, get_image_job_queue
+from utils.image_transcoder import detect_content_type, get_image_transcoder, get_slot_settings
+from utils.publish_ledger import article_fingerprint, get_publish_ledger
+from utils.retry_policy import request_with_retry
+from utils.term_cache import TermCache, get_term_cache
+from utils.term_sync import sync_terms
+from utils.wp_client import get_wp_client
+from utils.token_ledger import finish_token_ledger, start_token_ledger
 
 # 2. 環境変数
 load_dotenv()
@@ -30,59 +45,69 @@ WP_USER     = os.getenv("WP_USER")
 WP_APP_PASS = os.getenv("WP_APP_PASS")
 WP_POST_STATUS = os.getenv("WP_POST_STATUS", "publish")
 
+# REST APIの呼び出しごとにレスポンスに含めるフィールド（_fields）
+# 呼び出し側で使う項目だけを返させ、本文のHTML・_links・meta などの転送とJSONの解析を省く
+WP_FIELDS = {
+    "media_upload": "id,source_url",
+    "media_exists": "id",
+    "post_edit": "id,content,featured_media,status",
+    "post_create": "id,link,tags,categories",   # tags・categories は repair_post_terms で使う
+    "post_update": "id,link,tags,categories",
+    "post_lookup": "id,link,title",
+    "term_create": "id"
+}
+
 # 3. 画像アップロード関数（改良版：リサイズ・エラーハンドリング付き）
+def download_image(image_url: str) -> bytes:
+    """画像をダウンロード"""
+    img_response = request_with_retry("GET", image_url, call_class="download")
+    img_response.raise_for_status()
+    return img_response.content
+
 def upload_image_to_wp(image_url: str) -> tuple[int, str]:
     print("アップロード画像URL:", image_url)
     
     try:
         # 画像を取得
-        img_response = requests.get(image_url, timeout=30)
-        img_response.raise_for_status()
-        original_data = img_response.content
+        original_data = download_image(image_url)
+    except Exception as e:
+        print(f"画像アップロード例外: {e}")
+        raise
+    filename = os.path.basename(image_url.split("?")[0]) or "img.jpg"
+    return upload_image_data_to_wp(original_data, filename)
+
+def upload_image_data_to_wp(original_data: bytes, filename: str = "img.jpg", slot: str = "inline") -> tuple[int, str]:
+    """
+    画像データを用途（featured / inline）に合わせて縮小・再エンコードし、WordPressのメディアにアップロード
+    出力形式・サイズ・目標バイト数は IMAGE_FORMAT / IMAGE_<スロット>_MAX_SIZE / IMAGE_<スロット>_TARGET_KB で設定
+
+    Returns:
+        (メディアID, source_url)
+    """
+    try:
         print("元画像サイズ:", len(original_data), "bytes")
         
-        # 画像サイズが大きい場合はリサイズ
-        if len(original_data) > 500 * 1024:  # 500KB以上の場合
-            try:
-                from PIL import Image
-                import io
-                
-                # 画像を開く
-                img = Image.open(io.BytesIO(original_data))
-                print("元画像サイズ:", img.size)
-                
-                # アスペクト比を保持してリサイズ（最大800x600）
-                img.thumbnail((800, 600), Image.Resampling.LANCZOS)
-                print("リサイズ後:", img.size)
-                
-                # JPEG形式で圧縮
-                img_buffer = io.BytesIO()
-                if img.mode == 'RGBA':
-                    img = img.convert('RGB')
-                img.save(img_buffer, format='JPEG', quality=85, optimize=True)
-                img_data = img_buffer.getvalue()
-                print("圧縮後サイズ:", len(img_data), "bytes")
-                
-                filename = "resized_image.jpg"
-                content_type = "image/jpeg"
-                
-            except ImportError:
-                print("Pillowがインストールされていません。元画像を使用します。")
-                img_data = original_data
-                filename = os.path.basename(image_url.split("?")[0]) or "img.jpg"
-                content_type = "image/jpeg"
-        else:
+        # デコード・縮小・エンコードはプロセスプールで実行
+        try:
+            result = get_image_transcoder().transcode(original_data, **get_slot_settings(slot))
+            img_data = result["data"]
+            content_type = result["content_type"]
+            filename = f"{os.path.splitext(filename)[0] or 'img'}.{result['extension']}"
+            print(f"リサイズ後: {result['size']}（{result['format']} 画質{result['quality']}）")
+            print("圧縮後サイズ:", len(img_data), "bytes")
+            
+        except ImportError:
+            print("Pillowがインストールされていません。元画像を使用します。")
             img_data = original_data
-            filename = os.path.basename(image_url.split("?")[0]) or "img.jpg"
-            content_type = "image/jpeg"
+            content_type = detect_content_type(original_data)
         
         # WordPress にアップロード
-        resp = requests.post(
-            f"{WP_URL}/wp-json/wp/v2/media",
-            auth=(WP_USER, WP_APP_PASS),
+        resp = get_wp_client().post(
+            "wp/v2/media",
+            call_class="wp_media",
+            fields=WP_FIELDS["media_upload"],
             headers={"Content-Disposition": f'attachment; filename="{filename}"'},
-            files={"file": (filename, img_data, content_type)},
-            timeout=60
+            files={"file": (filename, img_data, content_type)}
         )
         
         if resp.status_code == 201:
@@ -98,43 +123,583 @@ def upload_image_to_wp(image_url: str) -> tuple[int, str]:
         raise
 
 # 4. h2直下に画像を挿入
-def insert_images_to_html(html: str, max_imgs: int = 6) -> tuple[str, list[int]]:
-    soup = BeautifulSoup(html, "html.parser")
-    media_ids = []
+def _media_exists(media_id: int) -> bool:
+    """WordPressにメディアが残っているか（削除済みの場合はFalse）"""
+    try:
+        resp = get_wp_client().get(
+            f"wp/v2/media/{media_id}",
+            fields=WP_FIELDS["media_exists"]
+        )
+    except Exception:
+        # 確認できない場合は再利用する（壊れていれば次回以降の確認で外れる）
+        return True
+    return resp.status_code != 404 and resp.status_code != 410
 
-    for h2_tag, _ in zip(soup.find_all("h2"), range(max_imgs)):
-        heading_text = h2_tag.get_text()
+def _reuse_cached_image(heading_text: str, slot: str = "inline"):
+    """
+    画像キャッシュから見出しの画像を再利用
+    このサイトにアップロード済みならメディアIDをそのまま、他サイトで生成済みなら画像データをアップロードして使う
 
-        try:
+    Returns:
+        (メディアID, source_url)。再利用できない場合はNone
+    """
+    image_cache = get_image_cache()
+    if image_cache is None:
+        return None
+    key = ImageCache.make_key(heading_text)
+
+    media = image_cache.get_media(key, WP_URL)
+    if media is not None:
+        if os.getenv("IMAGE_CACHE_VERIFY", "true").lower() != "true" or _media_exists(media[0]):
+            print(f"♻️ 見出し「{heading_text}」はアップロード済みの画像を再利用します (ID: {media[0]})")
+            return media
+        image_cache.delete_media(key, WP_URL)
+
+    cached = image_cache.get_image(key)
+    if cached is None:
+        return None
+    print(f"♻️ 見出し「{heading_text}」は生成済みの画像を再利用します")
+    m_id, wp_src = upload_image_data_to_wp(cached[0], "heading_image.png", slot=slot)
+    image_cache.set_media(key, WP_URL, m_id, wp_src)
+    return m_id, wp_src
+
+class DuplicateImageError(Exception):
+    """生成画像が記事内の他の画像とほぼ同じだった"""
+
+def _find_duplicate_image(heading_text: str, image_data: bytes, article_images: ArticleImageHashes):
+    """
+    知覚ハッシュで、記事内・サイト内にほぼ同じ画像がないか確認
+
+    Returns:
+        (ハッシュ, 差し替え先の (メディアID, source_url))。
+        ハッシュは記事内に登録済み（重複検出を使わない場合はNone）、差し替え先はサイト内の既存メディア（ない場合はNone）
+
+    Raises:
+        DuplicateImageError: 記事内にほぼ同じ画像がある場合
+    """
+    index = get_image_hash_index()
+    if index is None:
+        return None, None
+    try:
+        hashes = get_image_transcoder().run(image_hashes, image_data)
+    except (ImportError, OSError) as e:
+        print(f"⚠️ 画像のハッシュを計算できません（重複確認を省略します）: {e}")
+        return None, None
+
+    if not article_images.claim(hashes):
+        raise DuplicateImageError(f"見出し「{heading_text}」の画像は記事内の他の画像とほぼ同じです")
+
+    similar = index.find_similar(WP_URL, hashes)
+    if similar is None:
+        return hashes, None
+    media_id, source_url, label = similar
+    if os.getenv("IMAGE_CACHE_VERIFY", "true").lower() == "true" and not _media_exists(media_id):
+        index.remove(WP_URL, media_id)
+        return hashes, None
+    if not article_images.use_media(media_id):
+        article_images.release(hashes)
+        raise DuplicateImageError(f"見出し「{heading_text}」の画像は記事内の他の画像とほぼ同じです")
+    print(f"🔁 見出し「{heading_text}」の画像は既存のメディアとほぼ同じため差し替えます (ID: {media_id}・「{label}」)")
+    return hashes, (media_id, source_url)
+
+def _create_heading_image(heading_text: str,
+                          img_prompt: str = "",
+                          slot: str = "inline",
+                          article_images: ArticleImageHashes = None) -> tuple[int, str]:
+    """
+    見出し1つ分の画像パイプライン（キャッシュ確認 → プロンプト生成 → 画像生成 → 重複確認 → アップロード）
+    img_prompt を渡した場合（一括生成済み）はプロンプト生成を省く
+    slot はアップロード時の変換設定（featured / inline）
+    記事内の画像とほぼ同じ画像は構図を変えて IMAGE_DEDUP_RETRIES 回まで生成し直し、
+    サイト内の既存メディアとほぼ同じ画像はアップロードせずに既存メディアへ差し替える
+    """
+    if article_images is None:
+        article_images = ArticleImageHashes(int(os.getenv("IMAGE_DEDUP_THRESHOLD", "6")))
+
+    reused = _reuse_cached_image(heading_text, slot)
+    if reused is not None:
+        if article_images.use_media(reused[0]):
+            return reused
+        # 記事内で既に使っているメディアは再利用せず、新しく生成する
+        print(f"⚠️ 見出し「{heading_text}」のキャッシュ画像は記事内で使用済みのため生成し直します (ID: {reused[0]})")
+
+    # ストリーミング生成（STREAM_CHAPTERS=true）中に先行生成した画像があればそれを使う
+    image = take_prefetched_image(heading_text)
+    retries = max(0, int(os.getenv("IMAGE_DEDUP_RETRIES", "1")))
+
+    for attempt in range(retries + 1):
+        if image is None:
             # 1) 見出しから画像プロンプト
-            img_prompt = generate_image_prompt(
-                f"Illustration or photograph representing: {heading_text}"
-            )
+            if not img_prompt:
+                img_prompt = generate_image_prompt(
+                    f"Illustration or photograph representing: {heading_text}"
+                )
+            prompt = img_prompt
+            if attempt > 0:
+                prompt += " Use a clearly different composition, motif and color palette from a typical icon."
+
+            # 2) 画像生成（用途のティアで生成。DALLE_RESPONSE_FORMAT=b64_json なら画像データを直接受け取り、ダウンロードを省く）
+            image = generate_image_for_upload(prompt, slot)
 
-            # 2) 画像URL生成
-            img_url = generate_image_url(img_prompt)
+        if isinstance(image, bytes):
+            original_data, filename = image, "heading_image.png"
+        else:
+            print("アップロード画像URL:", image)
+            original_data = download_image(image)
+            filename = os.path.basename(image.split("?")[0]) or "img.png"
 
-            # 3) WPにアップロード
-            m_id, wp_src = upload_image_to_wp(img_url)
-            media_ids.append(m_id)
+        # 3) 記事内・サイト内のほぼ同じ画像を確認
+        try:
+            hashes, existing = _find_duplicate_image(heading_text, original_data, article_images)
+            break
+        except DuplicateImageError as e:
+            if attempt >= retries:
+                raise
+            print(f"⚠️ {e}（生成し直します）")
+            image = None
+
+    image_cache = get_image_cache()
+    key = ImageCache.make_key(heading_text)
+    if existing is not None:
+        if image_cache is not None:
+            image_cache.set_media(key, WP_URL, *existing)
+        return existing
+
+    # 4) WPにアップロード（生成した画像とメディアIDは次回以降のためにキャッシュ）
+    try:
+        m_id, wp_src = upload_image_data_to_wp(original_data, filename, slot=slot)
+    except Exception:
+        if hashes is not None:
+            article_images.release(hashes)
+        raise
+    article_images.use_media(m_id)
+    if hashes is not None:
+        get_image_hash_index().add(WP_URL, m_id, wp_src, hashes, label=heading_text)
+    if image_cache is not None:
+        image_cache.set_image(key, original_data, "image/png", label=heading_text)
+        image_cache.set_media(key, WP_URL, m_id, wp_src)
+    return m_id, wp_src
 
-            # 4) <img> を h2 直後に挿入
-            img_tag = soup.new_tag("img", src=wp_src, loading="lazy")
-            h2_tag.insert_after(img_tag)
-            print(f"✅ 見出し「{heading_text}」に画像を挿入しました")
+def insert_images_to_html(html: str, max_imgs: int = 6) -> tuple[str, list[int]]:
+    """
+    h2見出しごとの画像パイプラインを IMAGE_CONCURRENCY 件を上限に並列実行し、
+    各見出しの直後に<img>を挿入（media_ids は見出し順。先頭がアイキャッチ画像になる）
+    """
+    soup = BeautifulSoup(html, "html.parser")
+    media_ids = []
+    h2_tags = soup.find_all("h2")[:max_imgs]
+    max_workers = max(1, int(os.getenv("IMAGE_CONCURRENCY", "3")))
 
+    # 先行生成・キャッシュ済みでない見出しの画像プロンプトは1回の呼び出しでまとめて生成
+    headings = [h2_tag.get_text() for h2_tag in h2_tags]
+    image_cache = get_image_cache()
+    pending = [
+        heading for heading in headings
+        if not has_prefetched_image(heading)
+        and not (image_cache and image_cache.has(ImageCache.make_key(heading), WP_URL))
+    ]
+    img_prompts = {}
+    if pending:
+        try:
+            img_prompts = dict(zip(pending, generate_image_prompts(pending)))
         except Exception as e:
-            print(f"⚠️ 見出し「{heading_text}」の画像生成/アップロードに失敗: {e}")
-            print("📝 画像なしで記事作成を続行します")
+            print(f"⚠️ 画像プロンプト一括生成に失敗（見出しごとに生成します）: {e}")
+
+    # 記事内のほぼ同じ画像を検出するため、見出し間でハッシュと使用中のメディアを共有
+    article_images = ArticleImageHashes(int(os.getenv("IMAGE_DEDUP_THRESHOLD", "6")))
+    results = [None] * len(h2_tags)
+    if h2_tags:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(h2_tags))) as executor:
+            futures = {
+                # 最初の見出しの画像はアイキャッチ画像になるため featured 用の設定で変換
+                # 記事のトークン台帳に記録されるよう、呼び出し元のコンテキストを引き継いで実行
+                executor.submit(
+                    contextvars.copy_context().run,
+                    _create_heading_image,
+                    heading,
+                    img_prompts.get(heading, ""),
+                    "featured" if index == 0 else "inline",
+                    article_images
+                ): index
+                for index, heading in enumerate(headings)
+            }
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    results[index] = future.result()
+                except Exception as e:
+                    heading_text = h2_tags[index].get_text()
+                    print(f"⚠️ 見出し「{heading_text}」の画像生成/アップロードに失敗: {e}")
+                    print("📝 画像なしで記事作成を続行します")
+
+    # 5) <img> を h2 直後に挿入（完了順ではなく見出し順）
+    for h2_tag, result in zip(h2_tags, results):
+        if result is None:
             continue
+        m_id, wp_src = result
+        media_ids.append(m_id)
+        img_tag = soup.new_tag("img", src=wp_src, loading="lazy")
+        h2_tag.insert_after(img_tag)
+        print(f"✅ 見出し「{h2_tag.get_text()}」に画像を挿入しました")
 
+    clear_prefetched_images()
     return str(soup), media_ids
 
+# 画像の後追い処理（本文を先に投稿し、画像は後からジョブとして反映）
+def queue_heading_images(post_id: int, html: str, max_imgs: int = 6, publish_status: str | None = None) -> int:
+    """
+    投稿済みの記事のh2見出しごとに画像ジョブを登録
+
+    Args:
+        post_id: WordPressの投稿ID
+        html: 投稿した本文
+        max_imgs: 画像を入れる見出しの最大数
+        publish_status: 全画像の反映後に設定する投稿ステータス（下書きで投稿した場合など）
+
+    Returns:
+        登録したジョブ数
+    """
+    headings = [h2_tag.get_text() for h2_tag in BeautifulSoup(html, "html.parser").find_all("h2")[:max_imgs]]
+    count = get_image_job_queue().enqueue(WP_URL, post_id, headings, publish_status)
+    print(f"🗂️ 画像ジョブを登録しました: 投稿ID {post_id}・{count}件")
+    return count
+
+def _insert_image_after_heading(html: str, position: int, heading_text: str, wp_src: str) -> str:
+    """
+    position 番目のh2（見出しが変わっていれば同じテキストのh2）の直後に<img>を挿入
+    既に同じ画像が入っている場合（反映後・完了記録前に落ちた場合など）はそのまま返す
+    """
+    soup = BeautifulSoup(html, "html.parser")
+    h2_tags = soup.find_all("h2")
+    target = h2_tags[position] if position < len(h2_tags) else None
+    if target is None or target.get_text() != heading_text:
+        target = next((h2 for h2 in h2_tags if h2.get_text() == heading_text), None)
+    if target is None:
+        raise ValueError(f"見出し「{heading_text}」が記事内に見つかりません")
+
+    following = target.find_next_sibling()
+    if following is not None and following.name == "img" and following.get("src") == wp_src:
+        return html
+    target.insert_after(soup.new_tag("img", src=wp_src, loading="lazy"))
+    return str(soup)
+
+def get_post_for_edit(post_id: int) -> dict | None:
+    """
+    編集用の投稿（本文はブロックのマークアップを含む raw）を取得
+
+    Returns:
+        投稿のJSON。削除されていた場合はNone
+    """
+    resp = get_wp_client().get(
+        f"wp/v2/posts/{post_id}",
+        fields=WP_FIELDS["post_edit"],
+        params={"context": "edit"}
+    )
+    if resp.status_code in (404, 410):
+        return None
+    resp.raise_for_status()
+    return resp.json()
+
+def update_post(post_id: int, data: dict) -> dict:
+    """投稿を部分更新"""
+    resp = get_wp_client().post(
+        f"wp/v2/posts/{post_id}",
+        fields=WP_FIELDS["post_update"],
+        json=data
+    )
+    resp.raise_for_status()
+    return resp.json()
+
+def _apply_image_job(job: dict) -> bool:
+    """
+    アップロード済みの画像を記事の本文（とアイキャッチ画像）に反映
+
+    Returns:
+        反映できた場合はTrue。記事が削除されていた場合はFalse
+    """
+    post = get_post_for_edit(job["post_id"])
+    if post is None:
+        return False
+
+    content = post["content"]["raw"]
+    updated = _insert_image_after_heading(content, job["position"], job["heading"], job["source_url"])
+    data = {}
+    if updated != content:
+        data["content"] = updated
+    if job["slot"] == "featured" and not post.get("featured_media"):
+        data["featured_media"] = job["media_id"]
+    if data:
+        update_post(job["post_id"], data)
+    return True
+
+def _finish_image_jobs(post_id: int):
+    """
+    記事の全ジョブが終わったら、アイキャッチ画像が未設定なら最初の画像を設定し、予定の投稿ステータスに更新
+    """
+    queue = get_image_job_queue()
+    if not queue.is_finished(WP_URL, post_id):
+        return
+    jobs = queue.post_jobs(WP_URL, post_id)
+    done = [job for job in jobs if job["status"] == "done"]
+    publish_status = next((job["publish_status"] for job in jobs if job["publish_status"]), None)
+
+    post = get_post_for_edit(post_id)
+    if post is None:
+        return
+    data = {}
+    if done and not post.get("featured_media"):
+        data["featured_media"] = done[0]["media_id"]
+    if publish_status and post.get("status") != publish_status:
+        data["status"] = publish_status
+    if data:
+        update_post(post_id, data)
+    print(f"✅ 投稿ID {post_id} の画像反映が完了しました（{len(done)}/{len(jobs)}枚）")
+
+def backfill_post_images(jobs: list[dict], lease_seconds: float = 600) -> int:
+    """
+    1記事分の占有済みジョブを処理（画像生成・アップロードは IMAGE_CONCURRENCY 件を上限に並列実行し、
+    完了した画像から順に記事へ反映する）
+    本文を書き換える前に記事の占有を延長し、期限切れで別のワーカーに引き継がれていれば LeaseLostError で中断する
+
+    Returns:
+        反映した画像数
+    """
+    queue = get_image_job_queue()
+    post_id = jobs[0]["post_id"]
+    lease = jobs[0]["lease_until"]
+    pending = [job for job in jobs if job["status"] == "pending"]
+    uploaded = [job for job in jobs if job["status"] == "uploaded"]
+    applied = 0
+
+    def apply(job: dict):
+        nonlocal applied, lease
+        lease = queue.renew(WP_URL, post_id, lease, lease_seconds)
+        try:
+            exists = _apply_image_job(job)
+        except Exception as e:
+            print(f"⚠️ 見出し「{job['heading']}」の画像を記事に反映できません: {e}")
+            queue.fail(job["id"], str(e), lease)
+            return
+        if exists:
+            queue.complete(job["id"], lease)
+            applied += 1
+        else:
+            queue.fail(job["id"], "投稿が削除されています", lease, permanent=True)
+
+    try:
+        # 前回アップロード済みで反映前に止まったジョブは生成し直さずに反映する
+        for job in uploaded:
+            apply(job)
+
+        if pending:
+            image_cache = get_image_cache()
+            needs_prompt = [
+                job["heading"] for job in pending
+                if not has_prefetched_image(job["heading"])
+                and not (image_cache and image_cache.has(ImageCache.make_key(job["heading"]), WP_URL))
+            ]
+            img_prompts = {}
+            if needs_prompt:
+                try:
+                    img_prompts = dict(zip(needs_prompt, generate_image_prompts(needs_prompt)))
+                except Exception as e:
+                    print(f"⚠️ 画像プロンプト一括生成に失敗（見出しごとに生成します）: {e}")
+
+            # 記事内で既に使っている画像と重複しないよう、反映済みの画像のメディアも共有する
+            article_images = ArticleImageHashes(int(os.getenv("IMAGE_DEDUP_THRESHOLD", "6")))
+            for job in queue.post_jobs(WP_URL, post_id):
+                if job["media_id"]:
+                    article_images.use_media(job["media_id"])
+
+            max_workers = max(1, int(os.getenv("IMAGE_CONCURRENCY", "3")))
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(pending))) as executor:
+                futures = {
+                    executor.submit(
+                        contextvars.copy_context().run,
+                        _create_heading_image, job["heading"], img_prompts.get(job["heading"], ""), job["slot"], article_images
+                    ): job
+                    for job in pending
+                }
+                try:
+                    # 反映（本文の読み込み→書き換え）は取りこぼしを防ぐためこのスレッドで1件ずつ行う
+                    for future in as_completed(futures):
+                        job = futures[future]
+                        try:
+                            m_id, wp_src = future.result()
+                        except Exception as e:
+                            print(f"⚠️ 見出し「{job['heading']}」の画像生成/アップロードに失敗: {e}")
+                            queue.fail(job["id"], str(e), lease)
+                            continue
+                        queue.mark_uploaded(job["id"], m_id, wp_src, lease)
+                        apply(dict(job, media_id=m_id, source_url=wp_src))
+                except LeaseLostError:
+                    # 引き継いだワーカーが処理するため、未着手の画像は生成しない
+                    for future in futures:
+                        future.cancel()
+                    raise
+    except LeaseLostError:
+        raise
+    except Exception:
+        queue.release(WP_URL, post_id, lease)
+        raise
+    finally:
+        clear_prefetched_images()
+
+    _finish_image_jobs(post_id)
+    return applied
+
+def run_image_backfill(post_id: int | None = None, max_posts: int = 0) -> int:
+    """
+    画像ジョブが残っている記事を順に処理
+
+    Args:
+        post_id: 対象の投稿ID（省略時は古い記事から順に）
+        max_posts: 処理する記事数の上限（0で残りすべて）
+
+    Returns:
+        反映した画像数
+    """
+    queue = get_image_job_queue()
+    lease_seconds = float(os.getenv("IMAGE_JOBS_LEASE_SECONDS", "600"))
+    applied = 0
+    # 失敗したジョブは待ち時間の後に再試行するため、この実行で処理した記事は選び直さない
+    processed = set()
+    while not max_posts or len(processed) < max_posts:
+        jobs = queue.claim_post(WP_URL, lease_seconds, post_id=post_id, exclude=processed)
+        if not jobs:
+            break
+        print(f"🖼️ 投稿ID {jobs[0]['post_id']} の画像を処理します（{len(jobs)}件）")
+        processed.add(jobs[0]["post_id"])
+        try:
+            applied += backfill_post_images(jobs, lease_seconds)
+        except LeaseLostError:
+            print(f"⚠️ 投稿ID {jobs[0]['post_id']} の占有期限が切れ、別のワーカーに引き継がれたため中断します")
+    return applied
+
 # WordPressカテゴリ作成・取得関数
-def get_or_create_categories(main_category: str, sub_category: str = "") -> list[int]:
+class StaleTermError(Exception):
+    """キャッシュしていた親カテゴリがWordPress側で削除されていた"""
+
+TERM_LABELS = {"tags": "タグ", "categories": "カテゴリ"}
+
+def _error_body(resp) -> dict:
+    """WordPressのエラーレスポンス（JSONでない場合は空）"""
+    try:
+        body = resp.json()
+    except ValueError:
+        return {}
+    return body if isinstance(body, dict) else {}
+
+def _resolve_terms(items: list[tuple[str, str, int]]) -> list[int]:
+    """
+    複数のタグ・カテゴリのIDをまとめて取得（存在しない場合は作成）
+    タームキャッシュにあればWordPressに問い合わせず、ないものは /batch/v1 でまとめて作成する
+    （既に存在する場合は作成時の term_exists が既存のIDを返すため、事前の検索はしない）。
+    取得・作成したIDはキャッシュに書き込む
+
+    Args:
+        items: (タクソノミー, ターム名, 親カテゴリID) のリスト（タグの親は0）
+
+    Returns:
+        items と同じ順のタームID（失敗した場合は0）
+
+    Raises:
+        StaleTermError: 親カテゴリがWordPress側で削除されていた場合
+    """
+    term_cache = get_term_cache()
+    term_ids = [0] * len(items)
+    pending: dict[tuple[str, str, int], list[int]] = {}
+    for index, (taxonomy, name, parent) in enumerate(items):
+        term_id = term_cache.get(WP_URL, taxonomy, name, parent) if term_cache is not None else None
+        if term_id:
+            print(f"既存{TERM_LABELS[taxonomy]}使用: {name} (ID: {term_id}・キャッシュ)")
+            term_ids[index] = term_id
+        else:
+            # 同じ名前のタームは1回だけ作成する
+            pending.setdefault((taxonomy, TermCache.normalize(name), parent), []).append(index)
+    if not pending:
+        return term_ids
+
+    requests_ = []
+    for indexes in pending.values():
+        taxonomy, name, parent = items[indexes[0]]
+        body = {"name": name}
+        if taxonomy == "categories":
+            body["parent"] = parent  # 親カテゴリ指定
+        requests_.append({"method": "POST", "path": f"wp/v2/{taxonomy}", "body": body, "fields": WP_FIELDS["term_create"]})
+
+    client = get_wp_client()
+    if len(requests_) == 1:
+        # 1件だけならバッチにせずそのまま作成
+        resp = client.post(requests_[0]["path"], fields=WP_FIELDS["term_create"], json=requests_[0]["body"])
+        results = [(resp.status_code, _error_body(resp))]
+    else:
+        results = client.batch(requests_, max_workers=int(os.getenv("TERM_CREATE_CONCURRENCY", "4")))
+
+    stale = None
+    for indexes, (status, body) in zip(pending.values(), results):
+        taxonomy, name, parent = items[indexes[0]]
+        label = TERM_LABELS[taxonomy]
+        if status == 201:
+            term_id = body["id"]
+            parent_text = f" (親: {parent})" if parent > 0 else ""
+            print(f"新規{label}作成: {name}{parent_text} (ID: {term_id})")
+        elif body.get("code") == "term_exists":
+            term_id = body.get("data", {}).get("term_id") or 0
+            print(f"既存{label}使用: {name} (ID: {term_id})")
+        elif body.get("code") == "rest_term_invalid" and parent > 0:
+            if term_cache is not None:
+                term_cache.invalidate_ids(WP_URL, taxonomy, [parent])
+            stale = StaleTermError(f"親{label}が存在しません (ID: {parent})")
+            continue
+        else:
+            print(f"{label}作成失敗: {name} - {body.get('message', status)}")
+            continue
+
+        if term_id:
+            for index in indexes:
+                term_ids[index] = term_id
+            if term_cache is not None:
+                term_cache.set(WP_URL, taxonomy, name, term_id, parent)
+
+    if stale is not None:
+        raise stale
+    return term_ids
+
+def _get_or_create_term(taxonomy: str, name: str, parent: int = 0) -> int:
+    """
+    タグ・カテゴリのIDを1件取得（存在しない場合は作成）
+
+    Returns:
+        タームID（失敗した場合は0）
+
+    Raises:
+        StaleTermError: 親カテゴリがWordPress側で削除されていた場合
+    """
+    return _resolve_terms([(taxonomy, name, parent)])[0]
+
+def get_or_create_terms(tag_names: list[str], main_category: str = "", sub_category: str = "") -> tuple[list[int], list[int]]:
+    """
+    タグとカテゴリのIDをまとめて取得（存在しない場合は作成）
+    タグとメインカテゴリは1回のバッチで作成し、サブカテゴリは親のIDが決まってから作成する
+
+    Returns:
+        (タグIDのリスト, カテゴリIDのリスト)
+    """
+    items = [("tags", tag_name, 0) for tag_name in tag_names]
+    if main_category:
+        items.append(("categories", main_category, 0))
+    term_ids = _resolve_terms(items)
+
+    tag_ids = [term_id for term_id in term_ids[:len(tag_names)] if term_id]
+    if not main_category:
+        return tag_ids, []
+    return tag_ids, get_or_create_categories(main_category, sub_category, main_category_id=term_ids[-1])
+
+def get_or_create_categories(main_category: str, sub_category: str = "", main_category_id: int = 0) -> list[int]:
     """
     メインカテゴリとサブカテゴリからWordPressカテゴリIDのリストを取得
-    階層構造（親子関係）で作成・管理
+    階層構造（親子関係）で作成・管理（main_category_id は取得済みのメインカテゴリID）
     """
     category_ids = []
     
@@ -142,14 +707,28 @@ def get_or_create_categories(main_category: str, sub_category: str = "") -> list
         return category_ids
     
     # メインカテゴリ（親カテゴリ）の処理
-    main_category_id = get_or_create_single_category(main_category)
+    main_category_id = main_category_id or get_or_create_single_category(main_category)
     if main_category_id:
         category_ids.append(main_category_id)
         print(f"メインカテゴリ設定: {main_category} (ID: {main_category_id})")
     
     # サブカテゴリ（子カテゴリ）の処理
     if sub_category and main_category_id:
-        sub_category_id = get_or_create_single_category(sub_category, parent_id=main_category_id)
+        try:
+            sub_category_id = get_or_create_single_category(sub_category, parent_id=main_category_id)
+        except StaleTermError as e:
+            # キャッシュしていたメインカテゴリが削除されていたので、取得し直してから1回だけやり直す
+            print(f"⚠️ {e}。メインカテゴリを取得し直します")
+            category_ids.remove(main_category_id)
+            main_category_id = get_or_create_single_category(main_category)
+            sub_category_id = 0
+            if main_category_id:
+                category_ids.append(main_category_id)
+                print(f"メインカテゴリ設定: {main_category} (ID: {main_category_id})")
+                try:
+                    sub_category_id = get_or_create_single_category(sub_category, parent_id=main_category_id)
+                except StaleTermError as e:
+                    print(f"カテゴリ処理エラー: {sub_category} - {e}")
         if sub_category_id:
             category_ids.append(sub_category_id)
             print(f"サブカテゴリ設定: {sub_category} (ID: {sub_category_id}, 親: {main_category})")
@@ -161,102 +740,97 @@ def get_or_create_single_category(category_name: str, parent_id: int = 0) -> int
     単一カテゴリを取得または作成
     """
     try:
-        # 既存カテゴリを検索
-        search_resp = requests.get(
-            f"{WP_URL}/wp-json/wp/v2/categories",
-            auth=(WP_USER, WP_APP_PASS),
-            params={
-                "search": category_name,
-                "parent": parent_id  # 親カテゴリ指定
-            }
-        )
-        
-        if search_resp.status_code == 200:
-            existing_categories = search_resp.json()
-            # 完全一致するカテゴリがあるかチェック
-            found_category = next(
-                (cat for cat in existing_categories 
-                 if cat["name"] == category_name and cat["parent"] == parent_id), 
-                None
-            )
-            
-            if found_category:
-                return found_category["id"]
-            else:
-                # カテゴリを新規作成
-                create_data = {
-                    "name": category_name,
-                    "parent": parent_id
-                }
-                create_resp = requests.post(
-                    f"{WP_URL}/wp-json/wp/v2/categories",
-                    auth=(WP_USER, WP_APP_PASS),
-                    json=create_data
-                )
-                if create_resp.status_code == 201:
-                    new_category = create_resp.json()
-                    parent_text = f" (親: {parent_id})" if parent_id > 0 else ""
-                    print(f"新規カテゴリ作成: {category_name}{parent_text} (ID: {new_category['id']})")
-                    return new_category["id"]
-                else:
-                    print(f"カテゴリ作成失敗: {category_name} - {create_resp.text}")
-                    return 0
-        else:
-            print(f"カテゴリ検索失敗: {category_name}")
-            return 0
-            
+        return _get_or_create_term("categories", category_name, parent_id)
+    except StaleTermError:
+        raise
     except Exception as e:
         print(f"カテゴリ処理エラー: {category_name} - {e}")
         return 0
 
+def sync_taxonomies(mode: str = "auto") -> dict:
+    """
+    WordPressのタグ・カテゴリをタームキャッシュへ一括同期（タグ・カテゴリの解決前に呼ぶ）
+    TERM_SYNC_INTERVAL_MINUTES ごとに新しいタームを差分同期し、TERM_SYNC_FULL_INTERVAL_HOURS ごとに全件同期する。
+    同期に失敗しても投稿は続行する（1件ずつの検索にフォールバック）
+
+    Args:
+        mode: auto / incremental / full
+
+    Returns:
+        タクソノミーごとの取得件数（同期しなかった場合はNone）
+    """
+    term_cache = get_term_cache()
+    if term_cache is None or os.getenv("TERM_SYNC", "true").lower() != "true":
+        return {}
+    try:
+        results = sync_terms(
+            get_wp_client(),
+            term_cache,
+            WP_URL,
+            mode=mode,
+            interval=float(os.getenv("TERM_SYNC_INTERVAL_MINUTES", "60")) * 60,
+            full_interval=float(os.getenv("TERM_SYNC_FULL_INTERVAL_HOURS", "24")) * 3600,
+            max_workers=int(os.getenv("TERM_SYNC_CONCURRENCY", "4"))
+        )
+    except Exception as e:
+        print(f"⚠️ タグ・カテゴリの一括同期に失敗しました（1件ずつ検索します）: {e}")
+        return {}
+    for taxonomy, count in results.items():
+        if count is not None:
+            print(f"🔄 {TERM_LABELS[taxonomy]}を同期しました: {count}件")
+    return results
+
 # WordPressタグ作成・取得関数
 def get_or_create_tags(tag_names: list[str]) -> list[int]:
     """
-    タグ名のリストからWordPressタグIDのリストを取得（存在しない場合は作成）
+    タグ名のリストからWordPressタグIDのリストを取得（存在しない場合はまとめて作成）
     """
-    tag_ids = []
-    
-    for tag_name in tag_names:
-        # 既存タグを検索
-        search_resp = requests.get(
-            f"{WP_URL}/wp-json/wp/v2/tags",
-            auth=(WP_USER, WP_APP_PASS),
-            params={"search": tag_name}
-        )
-        
-        if search_resp.status_code == 200:
-            existing_tags = search_resp.json()
-            # 完全一致するタグがあるかチェック
-            found_tag = next((tag for tag in existing_tags if tag["name"] == tag_name), None)
-            
-            if found_tag:
-                tag_ids.append(found_tag["id"])
-                print(f"既存タグ使用: {tag_name} (ID: {found_tag['id']})")
-            else:
-                # タグを新規作成
-                create_resp = requests.post(
-                    f"{WP_URL}/wp-json/wp/v2/tags",
-                    auth=(WP_USER, WP_APP_PASS),
-                    json={"name": tag_name}
-                )
-                if create_resp.status_code == 201:
-                    new_tag = create_resp.json()
-                    tag_ids.append(new_tag["id"])
-                    print(f"新規タグ作成: {tag_name} (ID: {new_tag['id']})")
-                else:
-                    print(f"タグ作成失敗: {tag_name}")
-        else:
-            print(f"タグ検索失敗: {tag_name}")
-    
-    return tag_ids
+    return [tag_id for tag_id in _resolve_terms([("tags", tag_name, 0) for tag_name in tag_names]) if tag_id]
+
+def repair_post_terms(post: dict,
+                      tag_names: list[str],
+                      tag_ids: list[int],
+                      main_category: str = "",
+                      sub_category: str = "",
+                      category_ids: list[int] | None = None) -> dict:
+    """
+    投稿に付かなかったタグ・カテゴリを付け直す
+    WordPressは存在しないタームIDを黙って無視するため、投稿結果のIDと比べてキャッシュの古いIDを検出し、
+    無効化してから取得し直す
+
+    Returns:
+        投稿のJSON（付け直した場合は更新後）
+    """
+    category_ids = category_ids or []
+    missing = {
+        "tags": [term_id for term_id in tag_ids if term_id not in post.get("tags", tag_ids)],
+        "categories": [term_id for term_id in category_ids if term_id not in post.get("categories", category_ids)]
+    }
+    if not missing["tags"] and not missing["categories"]:
+        return post
+
+    term_cache = get_term_cache()
+    data = {}
+    for taxonomy, term_ids in missing.items():
+        if not term_ids:
+            continue
+        print(f"⚠️ {TERM_LABELS[taxonomy]}ID {term_ids} はWordPress側に存在しません。取得し直します")
+        if term_cache is not None:
+            term_cache.invalidate_ids(WP_URL, taxonomy, term_ids)
+    if missing["tags"]:
+        data["tags"] = get_or_create_tags(tag_names)
+    if missing["categories"]:
+        data["categories"] = get_or_create_categories(main_category, sub_category)
+    return update_post(post["id"], data)
 
 # 5. 投稿関数
-def post_to_wp(title: str, content: str, meta_description: str, slug: str, tag_ids: list[int], category_ids: list[int], featured_id: int | None) -> dict:
+def post_to_wp(title: str, content: str, meta_description: str, slug: str, tag_ids: list[int], category_ids: list[int], featured_id: int | None, status: str | None = None, post_id: int | None = None) -> dict:
+    """記事を投稿（post_id を指定した場合はその投稿を同じ内容で更新）"""
     data = {
         "title": title,
         "content": content,
         "slug": slug,  # SEOスラッグ
-        "status": WP_POST_STATUS,
+        "status": status or WP_POST_STATUS,
         "featured_media": featured_id or 0,
         "tags": tag_ids,
         "categories": category_ids,  # カテゴリIDリスト
@@ -265,32 +839,134 @@ def post_to_wp(title: str, content: str, meta_description: str, slug: str, tag_i
             "seo_description": meta_description    # SEO用カスタムフィールド
         }
     }
-    r = requests.post(
-        f"{WP_URL}/wp-json/wp/v2/posts",
-        auth=(WP_USER, WP_APP_PASS),
+    if post_id:
+        return update_post(post_id, data)
+    r = get_wp_client().post(
+        "wp/v2/posts",
+        fields=WP_FIELDS["post_create"],
         json=data
     )
     r.raise_for_status()
     return r.json()
 
+# 投稿の冪等化（再試行・次回実行で同じ記事を二重投稿しない）
+class PublishInProgressError(Exception):
+    """同じ記事を別のワーカーが投稿中"""
+
+def find_post_by_slug(slug: str, title: str) -> dict | None:
+    """
+    スラッグとタイトルが一致する投稿を検索（下書き・予約投稿も含む）
+
+    Returns:
+        投稿のJSON（id・link）。見つからない場合はNone
+    """
+    resp = get_wp_client().get(
+        "wp/v2/posts",
+        fields=WP_FIELDS["post_lookup"],
+        params={"slug": slug, "status": "any", "context": "edit"}
+    )
+    if resp.status_code != 200:
+        print(f"⚠️ スラッグで投稿を検索できません: {slug} ({resp.status_code})")
+        return None
+    for post in resp.json():
+        # 同じスラッグの別記事を上書きしないよう、タイトルも一致するものだけを同じ記事とみなす
+        # （rendered は引用符・--・... が wptexturize で置き換わるため、投稿時のままの raw と比べる）
+        if post.get("title", {}).get("raw") == title:
+            return post
+    return None
+
+def publish_post(title: str,
+                 content: str,
+                 meta_description: str,
+                 slug: str,
+                 tag_ids: list[int],
+                 category_ids: list[int],
+                 featured_id: int | None,
+                 status: str | None = None,
+                 keyword_group: str = "") -> dict:
+    """
+    冪等な記事投稿
+    投稿前に記事の指紋（キーワードグループ・スラッグ・本文のハッシュ）を台帳に記録し、
+    既に投稿済み（台帳・スラッグの記録・前回の投稿が結果不明なら ?slug= の検索で判明）なら既存の投稿を更新する
+
+    Returns:
+        投稿のJSON
+
+    Raises:
+        PublishInProgressError: 同じ記事を別のワーカーが投稿中の場合
+    """
+    ledger = get_publish_ledger()
+    if ledger is None:
+        return post_to_wp(title, content, meta_description, slug, tag_ids, category_ids, featured_id, status)
+
+    fingerprint, content_hash = article_fingerprint(keyword_group, slug, content)
+    record = ledger.claim(
+        WP_URL, fingerprint, keyword_group, slug, content_hash,
+        lease_seconds=float(os.getenv("PUBLISH_LEASE_SECONDS", "300"))
+    )
+    if record is None:
+        raise PublishInProgressError(f"同じ記事を別のワーカーが投稿中です: {slug}")
+
+    post_id = record["post_id"]
+    if not post_id:
+        # 同じキーワードグループ・スラッグで投稿済みの記事（本文を生成し直した再実行など）
+        indexed = ledger.find_slug(WP_URL, slug)
+        if indexed and indexed["keyword_group"] == keyword_group:
+            post_id = indexed["post_id"]
+    if not post_id and record["attempts"] > 0:
+        # 前回の投稿が結果不明（タイムアウトなど）。WordPress側で作成済みかを確認する
+        existing = find_post_by_slug(slug, title)
+        post_id = existing["id"] if existing else None
+
+    try:
+        if post_id:
+            print(f"🔁 投稿済みの記事を更新します: 投稿ID {post_id}")
+            try:
+                res = post_to_wp(title, content, meta_description, slug, tag_ids, category_ids, featured_id, status,
+                                 post_id=post_id)
+            except requests.exceptions.HTTPError as e:
+                if e.response is None or e.response.status_code not in (404, 410):
+                    raise
+                print(f"⚠️ 投稿ID {post_id} は削除されています。新規投稿します")
+                res = post_to_wp(title, content, meta_description, slug, tag_ids, category_ids, featured_id, status)
+        else:
+            res = post_to_wp(title, content, meta_description, slug, tag_ids, category_ids, featured_id, status)
+    except Exception:
+        ledger.release(WP_URL, fingerprint)
+        raise
+
+    ledger.record_post(WP_URL, fingerprint, res["id"], res.get("link", ""))
+    return res
+
 def main():
     """
     メイン処理
     記事生成から投稿まで実行
     """
+    checkpoint = None
     try:
         print("=== デバッグ: main開始 ===")
         
         # 参考記事設定を確認
         reference_mode = os.getenv('REFERENCE_MODE', 'integrated_keywords')  # integrated_keywords, keywords, url, file, multiple, style_with_keywords
         print(f"参考記事モード: {reference_mode}")
+
+        # チェックポイント（前回の実行が途中で止まっていれば完了済みステージを再利用）
+        checkpoint = create_checkpoint(reference_mode)
+        # トークン・コスト台帳（チェックポイントと同じ実行IDで保存）
+        start_token_ledger(checkpoint.run_id)
         
-        if reference_mode == 'integrated_keywords':
+        if checkpoint.has("article"):
+            article = checkpoint.get("article")
+            prompt = checkpoint.get("prompt")
+            print("⏩ チェックポイントから再開: article")
+
+        elif reference_mode == 'integrated_keywords':
             # 🆕 新しいCSVファイルを使用した統合キーワードモード
             print("🎯 統合キーワードモード: 新しいCSVファイルを使用")
             
             # キーワードグループを取得
-            keyword_group = get_next_keyword_group()
+            keyword_group = checkpoint.run_stage("keyword_group", get_next_keyword_group)
             
             print(f"📝 取得したキーワードグループ:")
             print(f"   グループID: {keyword_group['group_id']}")
@@ -348,7 +1024,7 @@ def main():
                 print(f"  {i}. {source}")
             
             # キーワードを取得
-            keyword = get_next_keyword(col=0)
+            keyword = checkpoint.run_stage("keyword", get_next_keyword, col=0)
             print(f"📝 取得したキーワード: {keyword}")
             prompt = f"{keyword}についての記事を書いてください。SEOを意識して、検索ユーザーのニーズに応える内容にしてください。"
             print(f"★今回のプロンプト: {prompt}")
@@ -482,7 +1158,7 @@ def main():
             
         else:
             # 従来のキーワードベース記事生成
-            keyword = get_next_keyword(col=0)
+            keyword = checkpoint.run_stage("keyword", get_next_keyword, col=0)
             print("取得したキーワード:", keyword)
             prompt = f"{keyword}についての記事を書いてください。SEOを意識して、検索ユーザーのニーズに応える内容にしてください。"
             print("★今回のプロンプト:", prompt)
@@ -494,6 +1170,10 @@ def main():
             print(f"記事生成エラー: {article['error']}")
             exit(1)
 
+        if not checkpoint.has("article"):
+            checkpoint.save("prompt", prompt)
+            checkpoint.save("article", article)
+
         print("生成されたタイトル:", article.get("title"))
         print("生成された記事冒頭:", article.get("content", "")[:100])
 
@@ -508,57 +1188,78 @@ def main():
         elif article.get('multiple_references'):
             print(f"🔗 複数参考記事使用: {article.get('source_count')}つのソースから統合")
 
-        # (a-2) meta description生成
+        # (a-2) meta description・SEOタグ・スラッグを1回の呼び出しでまとめて生成
+        # 説明文のテーマ
         if article.get('keyword_based') and article.get('style_guided'):
             # キーワード×スタイルガイド使用時は専用プロンプト
-            meta_desc = generate_meta_description(f"{article['title']} - {article.get('keyword')}の最適化ガイド（スタイル統合）", article["content"])
+            description_theme = f"{article['title']} - {article.get('keyword')}の最適化ガイド（スタイル統合）"
         elif article.get('style_guided'):
             # スタイルガイド使用時は専用プロンプト
-            meta_desc = generate_meta_description(f"{article['title']} - {article.get('source_count')}つの記事のスタイルを統合した最適化ガイド", article["content"])
+            description_theme = f"{article['title']} - {article.get('source_count')}つの記事のスタイルを統合した最適化ガイド"
         elif article.get('multiple_references'):
             # 複数参考記事使用時は専用プロンプト
-            meta_desc = generate_meta_description(f"{article['title']} - {article.get('source_count')}つの記事を統合した包括的ガイド", article["content"])
+            description_theme = f"{article['title']} - {article.get('source_count')}つの記事を統合した包括的ガイド"
         elif article.get('reference_used'):
             # 単一参考記事使用時は専用プロンプト
-            meta_desc = generate_meta_description(f"{article['title']} - 参考記事を基にした詳細解説", article["content"])
+            description_theme = f"{article['title']} - 参考記事を基にした詳細解説"
         else:
-            meta_desc = generate_meta_description(prompt, article["content"])
-        print("生成されたmeta description:", meta_desc)
+            description_theme = prompt
 
-        # (a-3) SEOタグ生成
+        # タグのテーマ
         if article.get('keyword_based') and article.get('style_guided'):
-            # キーワード×スタイルガイド使用時は専用プロンプト
-            seo_tags = generate_seo_tags(f"{article['title']} - {article.get('keyword')} スタイル最適化記事", article["content"])
+            tags_theme = f"{article['title']} - {article.get('keyword')} スタイル最適化記事"
         elif article.get('style_guided'):
-            # スタイルガイド使用時は専用プロンプト
-            seo_tags = generate_seo_tags(f"{article['title']} - スタイル統合による最適化記事", article["content"])
+            tags_theme = f"{article['title']} - スタイル統合による最適化記事"
         elif article.get('multiple_references'):
-            # 複数参考記事使用時は専用プロンプト
-            seo_tags = generate_seo_tags(f"{article['title']} - 複数ソースを統合した包括的解説", article["content"])
+            tags_theme = f"{article['title']} - 複数ソースを統合した包括的解説"
         else:
-            seo_tags = generate_seo_tags(prompt, article["content"])
+            tags_theme = prompt
+
+        seo_metadata = checkpoint.run_stage(
+            "seo_metadata",
+            generate_seo_metadata,
+            prompt, article["title"], article["content"], description_theme, tags_theme
+        )
+        meta_desc = seo_metadata["description"]
+        seo_tags = seo_metadata["tags"]
+        seo_slug = seo_metadata["slug"]
+        print("生成されたmeta description:", meta_desc)
         print("生成されたSEOタグ:", seo_tags)
-        tag_ids = get_or_create_tags(seo_tags)
-        print("WordPressタグID:", tag_ids)
+        print("生成されたSEOスラッグ:", seo_slug)
 
-        # (a-4) カテゴリ設定（統合キーワードモードの場合）
-        category_ids = []
-        if reference_mode == 'integrated_keywords' and 'main_category' in article:
-            category_ids = get_or_create_categories(
-                article.get('main_category', ''),
-                article.get('sub_category', '')
-            )
+        # (a-3) SEOタグ・カテゴリ（統合キーワードモードの場合）をWordPressのIDに変換
+        # タームキャッシュを一括同期してから、作成が必要なタグ・メインカテゴリを1回のバッチで作成する
+        use_categories = reference_mode == 'integrated_keywords' and 'main_category' in article
+        if not checkpoint.has("term_ids"):
+            sync_taxonomies()
+        tag_ids, category_ids = checkpoint.run_stage(
+            "term_ids",
+            get_or_create_terms,
+            seo_tags,
+            article.get('main_category', '') if use_categories else '',
+            article.get('sub_category', '') if use_categories else ''
+        )
+        print("WordPressタグID:", tag_ids)
+        if use_categories:
             print("WordPressカテゴリID:", category_ids)
 
-        # (a-5) SEOスラッグ生成
-        seo_slug = generate_seo_slug(prompt, article["title"])
-        print("生成されたSEOスラッグ:", seo_slug)
-
         # (b) 本文に画像6枚を埋め込み（リサイズ機能付き）
         # 画像生成設定を確認
         enable_images = os.getenv('ENABLE_IMAGE_GENERATION', 'true').lower() == 'true'
         
-        if enable_images:
+        # 画像の後追いモード: 本文を先に投稿し、画像はジョブとして後から反映する
+        defer_images = enable_images and os.getenv('DEFER_IMAGES', 'false').lower() == 'true'
+
+        if defer_images:
+            print("🗂️ 画像は投稿後に反映します（DEFER_IMAGES=true）")
+            media_ids = []
+            featured_id = None
+        elif checkpoint.has("images"):
+            print("⏩ チェックポイントから再開: images")
+            article["content"] = checkpoint.get("images")["content"]
+            media_ids = checkpoint.get("images")["media_ids"]
+            featured_id = media_ids[0] if media_ids else None
+        elif enable_images:
             # 参考記事使用時は異なる画像プロンプト
             if article.get('multiple_references'):
                 print("📸 複数参考記事ベースの画像生成を実行中...")
@@ -570,13 +1271,42 @@ def main():
             updated_html, media_ids = insert_images_to_html(article["content"], max_imgs=6)
             article["content"] = updated_html
             featured_id = media_ids[0] if media_ids else None
+            checkpoint.save("images", {"content": updated_html, "media_ids": media_ids})
         else:
             print("📝 画像生成を無効化しています（ENABLE_IMAGE_GENERATION=false）")
             media_ids = []
             featured_id = None
 
-        # (c) 投稿
-        res = post_to_wp(article["title"], article["content"], meta_desc, seo_slug, tag_ids, category_ids, featured_id)
+        # (c) 投稿（後追いモードで DEFER_IMAGES_POST_STATUS を指定した場合は、そのステータスで先に投稿）
+        post_status = os.getenv('DEFER_IMAGES_POST_STATUS', '') if defer_images else ''
+        # 投稿済みの記事（前回の投稿がタイムアウトした場合など）は新規投稿せず更新する
+        saved_group = checkpoint.get("keyword_group")
+        publish_group = str(saved_group['group_id']) if saved_group else prompt
+        res = checkpoint.run_stage(
+            "post",
+            publish_post,
+            article["title"], article["content"], meta_desc, seo_slug, tag_ids, category_ids, featured_id,
+            post_status or None, publish_group
+        )
+
+        # キャッシュしていたタグ・カテゴリIDがWordPress側で削除されていた場合は付け直す
+        res = repair_post_terms(
+            res, seo_tags, tag_ids, article.get('main_category', ''), article.get('sub_category', ''), category_ids
+        )
+
+        # (d) 後追いモード: 画像ジョブを登録し、DEFER_IMAGES_RUN=after_post ならこのまま反映する
+        if defer_images:
+            checkpoint.run_stage(
+                "image_jobs",
+                queue_heading_images,
+                res["id"], article["content"], 6, WP_POST_STATUS if post_status else None
+            )
+            if os.getenv('DEFER_IMAGES_RUN', 'after_post') == 'after_post':
+                print(f"URL: {res['link']}（画像を反映中）")
+                run_image_backfill(post_id=res["id"])
+            else:
+                print("🗂️ 画像は image_backfill.py で反映されます")
+        checkpoint.complete()
         
         # 投稿完了メッセージ
         if article.get('keyword_based') and article.get('style_guided'):
@@ -600,6 +1330,58 @@ def main():
         import traceback
         traceback.print_exc()
         exit(1)
+    finally:
+        if checkpoint is not None:
+            checkpoint.release()
+        finish_token_ledger()
+
+def create_checkpoint(reference_mode: str) -> CheckpointManager:
+    """
+    今回の実行のチェックポイントを作成
+    RUN_ID が指定されていればそのIDで、未指定なら同じモードの未完了の実行を探して再開する
+    """
+    checkpoint_dir = os.getenv("CHECKPOINT_DIR", "checkpoints")
+    context = {"reference_mode": reference_mode}
+
+    if os.getenv("ENABLE_CHECKPOINT", "true").lower() != "true":
+        return CheckpointManager(checkpoint_dir=checkpoint_dir, context=context, enabled=False)
+
+    CheckpointManager.cleanup(checkpoint_dir, keep_days=float(os.getenv("CHECKPOINT_KEEP_DAYS", "7")))
+
+    # 別のプロセスが処理中の実行は飛ばし、CHECKPOINT_MAX_ATTEMPTS 回再開しても完了しない実行は破棄する
+    # （決まって失敗するチェックポイントがキーワードの巡回を止め続けないように）
+    run_id = os.getenv("RUN_ID")
+    max_attempts = int(os.getenv("CHECKPOINT_MAX_ATTEMPTS", "3"))
+    candidates = [run_id] if run_id else CheckpointManager.resumable_runs(
+        checkpoint_dir,
+        context=context,
+        max_age_hours=float(os.getenv("CHECKPOINT_MAX_AGE_HOURS", "24"))
+    )
+    checkpoint = None
+    for candidate in candidates:
+        resumable = CheckpointManager(run_id=candidate, checkpoint_dir=checkpoint_dir, context=context)
+        if not resumable.acquire():
+            if run_id:
+                raise RuntimeError(f"実行 {run_id} は別のプロセスが処理中か、既に終了しています")
+            print(f"⏭️ 実行 {candidate} は別のプロセスが処理中のためスキップします")
+            continue
+        if not run_id and max_attempts > 0 and resumable.attempts >= max_attempts:
+            print(f"🛑 実行 {candidate} は{resumable.attempts}回再開しても完了しないため破棄します")
+            resumable.abandon()
+            continue
+        checkpoint = resumable
+        break
+
+    if checkpoint is None:
+        checkpoint = CheckpointManager(checkpoint_dir=checkpoint_dir, context=context)
+        checkpoint.acquire()
+    checkpoint.begin_attempt()
+    if checkpoint.resumed:
+        print(f"🔁 前回の実行を再開します: {checkpoint.run_id}"
+              f"（{checkpoint.attempts}回目・完了済み: {', '.join(checkpoint.data['stages'])}）")
+    else:
+        print(f"💾 チェックポイント: {checkpoint.path}")
+    return checkpoint
 
 # 6. 実行(main)
 if __name__ == "__main__":
@@ -17,14 +17,15 @@ from bs4 import BeautifulSoup
 # 新しいモジュールをインポート
 from handlers import ArticleGenerator
 from utils import CronManager, LogManager, ConfigManager
+from utils.token_ledger import finish_token_ledger, start_token_ledger
 
 # 後方互換性のため、既存の関数もインポート
 from post_article import (
     upload_image_to_wp,
     insert_images_to_html,
-    get_or_create_categories,
-    get_or_create_tags,
-    post_to_wp
+    get_or_create_terms,
+    publish_post,
+    sync_taxonomies
 )
 
 class ImprovedArticlePublisher:
@@ -130,16 +131,17 @@ class ImprovedArticlePublisher:
     def publish_to_wordpress(self, article_data: dict, content_with_images: str, media_ids: list) -> dict:
         """WordPressに投稿"""
         try:
-            # カテゴリを取得または作成
-            category_ids = get_or_create_categories(
+            # タームキャッシュを一括同期（前回から間隔が空いていなければ何もしない）
+            sync_taxonomies()
+            
+            # タグ・カテゴリを取得または作成（作成が必要なものはまとめて作成）
+            tag_names = article_data.get('seo_tags', [])
+            tag_ids, category_ids = get_or_create_terms(
+                tag_names,
                 article_data.get('main_category', ''),
                 article_data.get('sub_category', '')
             )
             
-            # タグを取得または作成
-            tag_names = article_data.get('seo_tags', [])
-            tag_ids = get_or_create_tags(tag_names) if tag_names else []
-            
             # メタディスクリプション
             meta_description = article_data.get('meta_description', '')
             
@@ -149,15 +151,16 @@ class ImprovedArticlePublisher:
             # アイキャッチ画像ID
             featured_id = media_ids[0] if media_ids else None
             
-            # WordPressに投稿
-            result = post_to_wp(
+            # WordPressに投稿（投稿済みの記事は新規投稿せず更新）
+            result = publish_post(
                 title=article_data['title'],
                 content=content_with_images,
                 meta_description=meta_description,
                 slug=slug,
                 tag_ids=tag_ids,
                 category_ids=category_ids,
-                featured_id=featured_id
+                featured_id=featured_id,
+                keyword_group=article_data.get('primary_keyword', '')
             )
             
             if result.get('success'):
@@ -190,6 +193,7 @@ class ImprovedArticlePublisher:
     def run_single_article_generation(self) -> dict:
         """単一記事の生成・投稿を実行"""
         start_time = time.time()
+        start_token_ledger()
         
         try:
             self.logger.log_process_start("記事生成・投稿プロセス")
@@ -224,6 +228,8 @@ class ImprovedArticlePublisher:
                 error=str(e)
             )
             raise
+        finally:
+            finish_token_ledger()
 
 def main():
     """メイン処理"""
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+タグ・カテゴリの一括同期
+WordPressのタグ・カテゴリをタームキャッシュに取り込み、投稿時の検索リクエストを省く
+
+使い方:
+    python sync_terms.py              # 前回の同期から間隔が空いていれば差分同期（未同期なら全件）
+    python sync_terms.py full         # 全件同期（削除されたタームも対応表から消える）
+    python sync_terms.py incremental  # 新しいタームだけを同期
+    python sync_terms.py --loop 600   # 600秒ごとに確認し、同期の間隔（TERM_SYNC_*）が空いていれば同期
+    python sync_terms.py stats        # 対応表の状態を表示
+"""
+
+import sys
+import time
+
+from post_article import TERM_LABELS, WP_URL, sync_taxonomies
+from utils.term_cache import get_term_cache
+
+def main():
+    args = sys.argv[1:]
+    term_cache = get_term_cache()
+    if term_cache is None:
+        print("⚠️ TERM_CACHE=false のため同期できません")
+        return
+
+    if args and args[0] == "stats":
+        stats = term_cache.stats()
+        print(f"🗂️ タームキャッシュ: {stats['sites']}サイト / {stats['terms']}件")
+        for taxonomy, label in TERM_LABELS.items():
+            state = term_cache.get_sync_state(WP_URL, taxonomy)
+            if state is None:
+                print(f"  {label}: 未同期")
+            else:
+                synced = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(state["synced_at"]))
+                full = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(state["full_synced_at"]))
+                print(f"  {label}: 最大ID {state['max_id']} / 最終同期 {synced} / 全件同期 {full}")
+        return
+
+    if args and args[0] == "--loop":
+        interval = float(args[1]) if len(args) > 1 else 600.0
+        print(f"🔁 {interval:.0f}秒ごとにタグ・カテゴリを同期します（Ctrl+Cで終了）")
+        try:
+            while True:
+                sync_taxonomies()
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            print("👋 終了します")
+        return
+
+    mode = args[0] if args else "auto"
+    if mode not in ("auto", "full", "incremental"):
+        print(__doc__)
+        return
+    sync_taxonomies(mode)
+
+if __name__ == "__main__":
+    main()
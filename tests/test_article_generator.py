@@ -4,7 +4,7 @@ AI記事生成システム - 単体テスト
 """
 
 import unittest
-from unittest.mock import Mock, patch, MagicMock
+from unittest.mock import Mock, patch, MagicMock, AsyncMock
 import os
 import sys
 import json
@@ -21,6 +21,37 @@ except ImportError:
     generate_article = Mock()
     post_article = Mock()
 
+try:
+    from utils.completion_cache import CompletionCache
+    from utils.checkpoint_manager import CheckpointManager
+    from utils.rate_limiter import RateLimiter
+    from utils.retry_policy import RetryPolicy
+    from utils.token_ledger import TokenLedger
+    from utils.image_cache import ImageCache
+    from utils.image_transcoder import ImageTranscoder
+    from utils.image_hash import ArticleImageHashes, ImageHashIndex, hash_distance, image_hashes
+    from utils.image_jobs import ImageJobQueue, LeaseLostError
+    from utils.term_cache import TermCache
+    from utils.term_sync import sync_terms
+    from utils.publish_ledger import PublishLedger, article_fingerprint
+    from utils.shared_instance import SharedInstance
+    from utils.sqlite_store import SQLiteStore
+except ImportError:
+    CompletionCache = None
+    CheckpointManager = None
+    RateLimiter = None
+    RetryPolicy = None
+    TokenLedger = None
+    ImageCache = None
+    ImageTranscoder = None
+    ImageHashIndex = None
+    ImageJobQueue = LeaseLostError = None
+    TermCache = None
+    sync_terms = None
+    PublishLedger = None
+    SharedInstance = None
+    SQLiteStore = None
+
 
 class TestArticleGenerator(unittest.TestCase):
     """記事生成機能のテスト"""
@@ -91,6 +122,1153 @@ class TestArticleGenerator(unittest.TestCase):
             self.assertIsNotNone(test_article[field])
 
 
+@unittest.skipIf(isinstance(generate_article, Mock), "generate_articleを読み込めません")
+class TestConcurrentSections(unittest.TestCase):
+    """章の並列生成のテスト"""
+
+    def _make_response(self, text):
+        response = Mock()
+        response.choices = [Mock()]
+        response.choices[0].message.content = json.dumps({"section": text})
+        return response
+
+    @patch.dict(os.environ, {'CONCURRENT_CHAPTERS': 'true', 'CHAPTER_CONCURRENCY': '3'})
+    @patch('generate_article._create_chat_completion', new_callable=AsyncMock)
+    def test_sections_keep_chapter_order(self, mock_create):
+        """並列生成でも章の順序が保たれること"""
+        mock_create.side_effect = (
+            lambda **kwargs: self._make_response(kwargs['messages'][1]['content'])
+        )
+        messages_list = [
+            [{"role": "system", "content": "sys"}, {"role": "user", "content": f"第{i}章"}]
+            for i in range(1, 6)
+        ]
+
+        sections = generate_article.generate_sections(messages_list)
+
+        self.assertEqual(sections, [f"第{i}章" for i in range(1, 6)])
+
+    @patch.dict(os.environ, {'CONCURRENT_CHAPTERS': 'true', 'CHAPTER_MAX_RETRIES': '2'})
+    @patch('generate_article._create_chat_completion', new_callable=AsyncMock)
+    def test_failed_chapter_is_retried_alone(self, mock_create):
+        """失敗した章だけが再試行されること"""
+        calls = []
+        failures = {"第2章": 1}
+
+        def create(**kwargs):
+            chapter = kwargs['messages'][1]['content']
+            calls.append(chapter)
+            if failures.get(chapter):
+                failures[chapter] -= 1
+                raise Exception("一時的なエラー")
+            return self._make_response(chapter)
+
+        mock_create.side_effect = create
+        messages_list = [
+            [{"role": "system", "content": "sys"}, {"role": "user", "content": f"第{i}章"}]
+            for i in range(1, 4)
+        ]
+
+        sections = generate_article.generate_sections(messages_list)
+
+        self.assertEqual(sections, ["第1章", "第2章", "第3章"])
+        self.assertEqual(calls.count("第2章"), 2)
+        self.assertEqual(calls.count("第1章"), 1)
+        self.assertEqual(calls.count("第3章"), 1)
+
+
+@unittest.skipIf(isinstance(generate_article, Mock), "generate_articleを読み込めません")
+class TestAsyncGeneration(unittest.TestCase):
+    """非同期生成エンジンのテスト"""
+
+    @patch('generate_article._create_chat_completion', new_callable=AsyncMock)
+    def test_sync_wrapper_runs_async_counterpart(self, mock_create):
+        """同期関数が *_async 関数の結果をそのまま返すこと"""
+        response = Mock()
+        response.choices = [Mock()]
+        response.choices[0].message.content = json.dumps({"slug": "chatgpt-guide"})
+        mock_create.return_value = response
+
+        self.assertEqual(generate_article.generate_seo_slug("ChatGPT", "タイトル"), "chatgpt-guide")
+
+    @patch('generate_article._create_chat_completion', new_callable=AsyncMock)
+    def test_seo_metadata_in_single_call(self, mock_create):
+        """SEOメタデータが1回の呼び出しでまとめて生成されること"""
+        response = Mock()
+        response.choices = [Mock()]
+        response.choices[0].message.content = json.dumps({
+            "description": "ChatGPTの使い方を解説します。",
+            "tags": ["AI", "ChatGPT", "初心者向け"],
+            "slug": "chatgpt-guide"
+        })
+        mock_create.return_value = response
+
+        metadata = generate_article.generate_seo_metadata("ChatGPT", "タイトル", "本文")
+
+        self.assertEqual(metadata["slug"], "chatgpt-guide")
+        self.assertEqual(metadata["tags"], ["AI", "ChatGPT", "初心者向け"])
+        self.assertEqual(mock_create.call_count, 1)
+        self.assertEqual(mock_create.call_args.kwargs["response_format"]["type"], "json_schema")
+
+    @patch('generate_article.get_rate_limiter')
+    @patch('generate_article.get_async_client')
+    def test_image_data_is_decoded_from_base64(self, mock_client, mock_limiter):
+        """DALL·E に b64_json を指定し、ダウンロードせずに画像データを返すこと"""
+        import base64
+        response = Mock()
+        response.data = [Mock()]
+        response.data[0].b64_json = base64.b64encode(b"\x89PNG").decode()
+        mock_client.return_value.images.generate = AsyncMock(return_value=response)
+        mock_limiter.return_value.acquire_async = AsyncMock()
+
+        with patch.dict(os.environ, {"DALLE_RESPONSE_FORMAT": "b64_json"}):
+            image = generate_article.generate_image_for_upload("Flat design icon of a robot")
+
+        self.assertEqual(image, b"\x89PNG")
+        self.assertEqual(mock_client.return_value.images.generate.call_args.kwargs["response_format"], "b64_json")
+
+    @patch('generate_article.get_rate_limiter')
+    @patch('generate_article.get_async_client')
+    def test_image_tier_by_slot_and_deadline(self, mock_client, mock_limiter):
+        """用途ごとのティアで生成し、失敗時・時間予算の残りが少ないときは fallback ティアに切り替えること"""
+        response = Mock()
+        response.data = [Mock(url="https://example.com/a.png")]
+        generate = AsyncMock(side_effect=[RuntimeError("server error"), response, response])
+        mock_client.return_value.images.generate = generate
+        mock_limiter.return_value.acquire_async = AsyncMock()
+
+        with patch.dict(os.environ, {"IMAGE_TIER_FALLBACK_ON_ERROR": "true"}), \
+                patch('generate_article.get_retry_policy', return_value=RetryPolicy(max_attempts=1)):
+            with patch('generate_article.get_token_ledger', return_value=TokenLedger()):
+                generate_article.generate_image_url("Flat design icon of a robot", slot="featured")
+            with patch('generate_article.get_token_ledger', return_value=TokenLedger(budget_seconds=10)):
+                generate_article.generate_image_url("Flat design icon of a robot", slot="inline")
+
+        calls = [c.kwargs for c in generate.call_args_list]
+        self.assertEqual((calls[0]["model"], calls[0]["size"]), ("dall-e-3", "1792x1024"))
+        self.assertEqual((calls[1]["model"], calls[1]["size"]), ("dall-e-2", "512x512"))
+        self.assertEqual((calls[2]["model"], calls[2]["size"]), ("dall-e-2", "512x512"))
+        self.assertNotIn("quality", calls[2])
+
+    @patch('generate_article.generate_image_prompt_async', new_callable=AsyncMock, return_value="Flat design icon of a calendar")
+    @patch('generate_article._create_chat_completion', new_callable=AsyncMock)
+    def test_image_prompts_in_single_call(self, mock_create, mock_single):
+        """画像プロンプトを1回の呼び出しでまとめて生成し、空の項目だけ個別に作り直すこと"""
+        response = Mock()
+        response.choices = [Mock()]
+        response.choices[0].message.content = json.dumps({"prompts": ["Flat design icon of a robot", ""]})
+        mock_create.return_value = response
+
+        prompts = generate_article.generate_image_prompts(["ChatGPTとは", "予定管理に使う"])
+
+        self.assertEqual(prompts, ["Flat design icon of a robot", "Flat design icon of a calendar"])
+        self.assertEqual(mock_create.call_count, 1)
+        self.assertIn("flat design, minimalist style", mock_create.call_args.kwargs["messages"][0]["content"])
+        mock_single.assert_awaited_once_with("Illustration or photograph representing: 予定管理に使う")
+
+    @patch('generate_article.generate_seo_slug_async', new_callable=AsyncMock, return_value="chatgpt-guide")
+    @patch('generate_article._create_chat_completion', new_callable=AsyncMock)
+    def test_seo_metadata_falls_back_per_field(self, mock_create, mock_slug):
+        """検証に失敗した項目だけ個別に生成し直すこと"""
+        response = Mock()
+        response.choices = [Mock()]
+        response.choices[0].message.content = json.dumps({
+            "description": "ChatGPTの使い方を解説します。",
+            "tags": ["AI"],
+            "slug": "ChatGPTガイド"
+        })
+        mock_create.return_value = response
+
+        metadata = generate_article.generate_seo_metadata("ChatGPT", "タイトル", "本文")
+
+        self.assertEqual(metadata["slug"], "chatgpt-guide")
+        self.assertEqual(metadata["description"], "ChatGPTの使い方を解説します。")
+        mock_slug.assert_awaited_once()
+        self.assertEqual(mock_create.call_count, 1)
+
+    @patch('generate_article.generate_seo_tags_async', new_callable=AsyncMock, return_value="AI, ChatGPT、初心者向け")
+    @patch('generate_article.generate_seo_slug_async', new_callable=AsyncMock, return_value=None)
+    @patch('generate_article._create_chat_completion', new_callable=AsyncMock, side_effect=ValueError("invalid"))
+    def test_seo_metadata_normalizes_fallback_types(self, *_):
+        """個別生成のスラッグが文字列でなければ空文字にし、文字列のタグは区切って使うこと"""
+        with patch('generate_article.generate_meta_description_async', new_callable=AsyncMock, return_value="説明文です。"):
+            metadata = generate_article.generate_seo_metadata("ChatGPT", "タイトル", "本文")
+
+        self.assertEqual(metadata["slug"], "")
+        self.assertEqual(metadata["tags"], ["AI", "ChatGPT", "初心者向け"])
+
+    def test_section_stream_parser_decodes_partial_json(self):
+        """断片的に届くJSONから本文をデコードし、閉じた見出しを通知すること"""
+        headings = []
+        parser = generate_article.SectionStreamParser(on_heading=headings.append)
+        payload = json.dumps({"section": "<h2>第1章 \"基本\"</h2>\n<p>本文</p><h2>第2章</h2>"}, ensure_ascii=True)
+
+        for i in range(0, len(payload), 3):
+            parser.feed(payload[i:i + 3])
+
+        self.assertEqual(headings, ['第1章 "基本"', '第2章'])
+        self.assertTrue(parser.done)
+        self.assertEqual(parser.text, json.loads(payload)["section"])
+
+    @patch('generate_article._create_chat_completion', new_callable=AsyncMock)
+    def test_stream_section_reports_heading_before_completion(self, mock_create):
+        """ストリーミング生成では本文の完成前に見出しが通知されること"""
+        events = []
+        payload = json.dumps({"section": "<h2>見出し</h2><p>本文</p>"}, ensure_ascii=False)
+        split = payload.index("</h2>") + len("</h2>")
+
+        def create(on_delta=None, **kwargs):
+            on_delta(payload[:split])
+            events.append("first chunk")
+            on_delta(payload[split:])
+            response = Mock()
+            response.choices = [Mock()]
+            response.choices[0].message.content = payload
+            return response
+
+        mock_create.side_effect = create
+        messages = [{"role": "system", "content": "sys"}, {"role": "user", "content": "第1章"}]
+
+        section = generate_article.generate_section(
+            messages, 1, stream=True, on_heading=lambda heading: events.append(heading)
+        )
+
+        self.assertEqual(section, "<h2>見出し</h2><p>本文</p>")
+        self.assertEqual(events, ["見出し", "first chunk"])
+
+    @patch('generate_article.prefetch_heading_image')
+    @patch('generate_article.generate_section_async', new_callable=AsyncMock)
+    def test_first_heading_prefetched_as_featured(self, mock_section, mock_prefetch):
+        """先行生成では記事の最初の見出し（第1章の最初の h2）だけを featured のティアで生成すること"""
+        async def section(messages, chapter, stream, on_heading):
+            on_heading(f"第{chapter}章A")
+            on_heading(f"第{chapter}章B")
+            return ""
+        mock_section.side_effect = section
+
+        with patch.dict(os.environ, {"CONCURRENT_CHAPTERS": "false", "ENABLE_IMAGE_GENERATION": "true",
+                                     "DEFER_IMAGES": "false"}):
+            generate_article.generate_sections([[], []], stream=True)
+
+        self.assertEqual([c.args for c in mock_prefetch.call_args_list], [
+            ("第1章A", "featured"), ("第1章B", "inline"), ("第2章A", "inline"), ("第2章B", "inline")
+        ])
+
+    @patch('generate_article._submit_to_sync_loop')
+    @patch('generate_article.get_image_cache')
+    def test_prefetch_skips_cached_heading_with_trailing_slash_site(self, mock_cache, mock_submit):
+        """サイトURLの末尾に / があっても、post_article と同じサイトURLでキャッシュを照合すること"""
+        mock_cache.return_value.has.return_value = True
+        with patch.dict(os.environ, {"WP_URL": "https://a.test/"}):
+            generate_article.prefetch_heading_image("見出し", "featured")
+
+        self.assertEqual(mock_cache.return_value.has.call_args.args[1], "https://a.test")
+        mock_submit.assert_not_called()
+
+    def test_sync_wrapper_rejects_running_loop(self):
+        """イベントループ内から同期関数を呼ぶとエラーになること"""
+        import asyncio
+
+        async def call_sync():
+            generate_article.generate_seo_slug("ChatGPT", "タイトル")
+
+        with self.assertRaises(RuntimeError):
+            asyncio.run(call_sync())
+
+
+@unittest.skipIf(isinstance(generate_article, Mock), "generate_articleを読み込めません")
+class TestStylePromptLayout(unittest.TestCase):
+    """スタイルガイド付き生成のプロンプト構成のテスト"""
+
+    @patch('generate_article.generate_conclusion_section_async', new_callable=AsyncMock, return_value="")
+    @patch('generate_article.generate_faq_section_async', new_callable=AsyncMock, return_value="")
+    @patch('generate_article.generate_practical_examples_async', new_callable=AsyncMock, return_value="実践例")
+    @patch('generate_article.generate_sections_async', new_callable=AsyncMock)
+    @patch('generate_article._create_chat_completion', new_callable=AsyncMock)
+    def test_shared_prefix_is_stable(self, mock_create, mock_sections, *_):
+        """タイトル・リード文・各章が同じシステムプロンプトを共有し、記事ごとの内容は末尾に置かれること"""
+        response = Mock()
+        response.choices = [Mock()]
+        response.choices[0].message.content = json.dumps({"title": "タイトル", "lead": "リード"})
+        mock_create.return_value = response
+        mock_sections.return_value = ["<h2>章</h2>"] * 5
+        style_features = {"tone": "polite", "h2_per_1000_words": 3.0}
+
+        generate_article.generate_keyword_article_with_style("ChatGPT 使い方", style_features)
+
+        section_messages = mock_sections.call_args[0][0]
+        system_prompts = {call.kwargs["messages"][0]["content"] for call in mock_create.call_args_list}
+        system_prompts |= {messages[0]["content"] for messages in section_messages}
+        self.assertEqual(len(system_prompts), 1)
+
+        system_prompt = system_prompts.pop()
+        self.assertTrue(system_prompt.startswith(generate_article.STYLE_WRITER_INSTRUCTIONS))
+        self.assertGreater(system_prompt.index("ChatGPT 使い方"), system_prompt.index("```yaml"))
+        self.assertIn("実践例", section_messages[2][1]["content"])
+
+
+@unittest.skipIf(SQLiteStore is None, "utils.sqlite_storeを読み込めません")
+class TestSQLiteStore(unittest.TestCase):
+    """SQLiteストアの共通処理と共有インスタンスのテスト"""
+
+    class CounterStore(SQLiteStore if SQLiteStore else object):
+        def _create_tables(self, conn):
+            conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+    def setUp(self):
+        import tempfile
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.store = self.CounterStore(os.path.join(self.tmpdir.name, "nested", "store.sqlite3"))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_write_lock_commits_or_rolls_back(self):
+        """書き込みロック中の更新は正常終了でコミットされ、例外ではロールバックされること"""
+        with self.store._write_lock() as conn:
+            conn.execute("INSERT INTO counters VALUES ('a', 1)")
+        with self.assertRaises(RuntimeError):
+            with self.store._write_lock() as conn:
+                conn.execute("UPDATE counters SET value = 2 WHERE name = 'a'")
+                raise RuntimeError("abort")
+
+        with self.store._connect() as conn:
+            self.assertEqual(conn.execute("SELECT value FROM counters").fetchone()[0], 1)
+            self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+
+    def test_shared_instance_is_created_once_and_can_be_disabled(self):
+        """共有インスタンスは初回の取得時に1回だけ生成し、無効化の環境変数ではNoneを返すこと"""
+        factory = Mock(side_effect=lambda: object())
+        shared = SharedInstance(factory, enabled_env="TEST_SHARED_INSTANCE")
+
+        with patch.dict(os.environ, {"TEST_SHARED_INSTANCE": "false"}):
+            self.assertIsNone(shared.get())
+        factory.assert_not_called()
+        self.assertIs(shared.get(), shared.get())
+        factory.assert_called_once()
+
+
+@unittest.skipIf(CompletionCache is None, "utils.completion_cacheを読み込めません")
+class TestCompletionCache(unittest.TestCase):
+    """LLM応答キャッシュのテスト"""
+
+    def setUp(self):
+        import tempfile
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "llm_cache.sqlite3")
+        self.messages = [{"role": "user", "content": "テスト"}]
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_key_depends_on_request(self):
+        """同じリクエストは同じキー、温度が違えば別のキーになること"""
+        key = CompletionCache.make_key("gpt-4o", self.messages, 0.7, {"type": "json_object"})
+        self.assertEqual(key, CompletionCache.make_key("gpt-4o", list(self.messages), 0.7, {"type": "json_object"}))
+        self.assertNotEqual(key, CompletionCache.make_key("gpt-4o", self.messages, 0.2, {"type": "json_object"}))
+        # 出力上限の違うリクエストで途中までの応答を使い回さない
+        self.assertNotEqual(
+            CompletionCache.make_key("gpt-4o", self.messages, 0.7, None, max_tokens=300),
+            CompletionCache.make_key("gpt-4o", self.messages, 0.7, None, max_tokens=800)
+        )
+
+    @unittest.skipIf(isinstance(generate_article, Mock), "generate_articleを読み込めません")
+    @patch('generate_article.get_rate_limiter')
+    @patch('generate_article.get_async_client')
+    def test_only_opted_in_calls_use_cache(self, mock_client, mock_limiter):
+        """既定では永続キャッシュを使わず、cache=True を指定した呼び出しだけがキャッシュから返すこと"""
+        cache = CompletionCache(db_path=self.db_path)
+        response = Mock()
+        response.choices = [Mock(finish_reason="stop")]
+        response.usage = None
+        response.model_dump_json.return_value = json.dumps({
+            "id": "c", "object": "chat.completion", "created": 0, "model": "gpt-4o",
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": "{}"}}]
+        })
+        mock_client.return_value.chat.completions.create = AsyncMock(return_value=response)
+        mock_limiter.return_value.acquire_async = AsyncMock()
+        kwargs = {"model": "gpt-4o", "messages": self.messages, "temperature": 0.7, "max_tokens": 300}
+
+        with patch('generate_article.get_completion_cache', return_value=cache), \
+                patch('generate_article.get_token_ledger', return_value=TokenLedger()):
+            for _ in range(2):
+                generate_article.run_sync(generate_article._create_chat_completion(stage="lead", **kwargs))
+            for _ in range(2):
+                generate_article.run_sync(generate_article._create_chat_completion(stage="seo_slug", cache=True, **kwargs))
+
+        self.assertEqual(mock_client.return_value.chat.completions.create.call_count, 3)
+        self.assertEqual(cache.stats()["entries"], 1)
+
+    def test_expired_entry_is_not_returned(self):
+        """有効期限切れの応答は返さないこと"""
+        cache = CompletionCache(db_path=self.db_path, ttl=60)
+        with patch('utils.completion_cache.time.time', return_value=1000.0):
+            cache.set("key", '{"ok": true}')
+            self.assertEqual(cache.get("key"), '{"ok": true}')
+        with patch('utils.completion_cache.time.time', return_value=1061.0):
+            self.assertIsNone(cache.get("key"))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        """サイズ上限を超えると最終利用が古いものから削除されること"""
+        cache = CompletionCache(db_path=self.db_path, ttl=0, max_bytes=25)
+        with patch('utils.completion_cache.time.time', return_value=1000.0):
+            cache.set("a", "x" * 10)
+        with patch('utils.completion_cache.time.time', return_value=1001.0):
+            cache.set("b", "y" * 10)
+        with patch('utils.completion_cache.time.time', return_value=1002.0):
+            cache.get("a")
+        with patch('utils.completion_cache.time.time', return_value=1003.0):
+            cache.set("c", "z" * 10)
+
+        self.assertIsNotNone(cache.get("a"))
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("c"))
+
+
+@unittest.skipIf(ImageCache is None, "utils.image_cacheを読み込めません")
+class TestImageCache(unittest.TestCase):
+    """生成画像の再利用キャッシュのテスト"""
+
+    def setUp(self):
+        import tempfile
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "image_cache.sqlite3")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_key_is_normalized(self):
+        """全角・大文字・記号・絵文字の違いは同じキーになること"""
+        self.assertEqual(ImageCache.make_key("🚀 ChatGPT 議事録　プロンプト！"),
+                         ImageCache.make_key("ＣｈａｔＧＰＴ  議事録 プロンプト"))
+        self.assertNotEqual(ImageCache.make_key("ChatGPT 議事録"), ImageCache.make_key("ChatGPT 要約"))
+
+    def test_media_is_per_site_and_respects_freshness(self):
+        """メディアIDはサイトごとに保存され、鮮度切れは返さないこと"""
+        cache = ImageCache(db_path=self.db_path, max_age=60)
+        key = ImageCache.make_key("ChatGPT 議事録")
+        with patch('utils.image_cache.time.time', return_value=1000.0):
+            cache.set_image(key, b"png", label="ChatGPT 議事録")
+            cache.set_media(key, "https://a.test", 10, "https://a.test/a.png")
+            self.assertEqual(cache.get_media(key, "https://a.test"), (10, "https://a.test/a.png"))
+            self.assertIsNone(cache.get_media(key, "https://b.test"))
+            self.assertTrue(cache.has(key, "https://b.test"))
+        with patch('utils.image_cache.time.time', return_value=1061.0):
+            self.assertIsNone(cache.get_media(key, "https://a.test"))
+            self.assertIsNone(cache.get_image(key))
+
+    @unittest.skipIf(isinstance(post_article, Mock), "post_articleを読み込めません")
+    @patch.dict(os.environ, {"IMAGE_CACHE_VERIFY": "false"})
+    @patch('post_article.generate_image_for_upload')
+    @patch('post_article.upload_image_data_to_wp', return_value=(20, "https://b.test/a.png"))
+    def test_heading_image_is_reused(self, mock_upload, mock_generate):
+        """キャッシュ済みの見出しは画像を生成せず、アップロード済みならメディアIDをそのまま使うこと"""
+        cache = ImageCache(db_path=self.db_path)
+        key = ImageCache.make_key("ChatGPT 議事録")
+        cache.set_image(key, b"png", label="ChatGPT 議事録")
+
+        with patch('post_article.get_image_cache', return_value=cache):
+            self.assertEqual(post_article._create_heading_image("ChatGPT 議事録"), (20, "https://b.test/a.png"))
+            self.assertEqual(post_article._create_heading_image("ChatGPT 議事録"), (20, "https://b.test/a.png"))
+
+        mock_generate.assert_not_called()
+        mock_upload.assert_called_once_with(b"png", "heading_image.png", slot="inline")
+
+
+@unittest.skipIf(ImageTranscoder is None, "utils.image_transcoderを読み込めません")
+class TestImageTranscoder(unittest.TestCase):
+    """画像トランスコードのテスト"""
+
+    def _make_png(self, size):
+        import io
+        from PIL import Image
+        buffer = io.BytesIO()
+        Image.new("RGBA", size, (120, 200, 255, 255)).save(buffer, format="PNG")
+        return buffer.getvalue()
+
+    def test_transcode_downscales_to_jpeg(self):
+        """アスペクト比を保って縮小し、JPEGにエンコードすること"""
+        transcoder = ImageTranscoder(use_pool=False)
+
+        result = transcoder.transcode(self._make_png((1792, 1024)), max_size=(800, 600), image_format="JPEG")
+
+        self.assertEqual(result["original_size"], (1792, 1024))
+        self.assertEqual(result["size"], (800, 457))
+        self.assertEqual(result["content_type"], "image/jpeg")
+        self.assertTrue(result["data"].startswith(b"\xff\xd8"))
+
+    def test_transcode_searches_quality_for_target_bytes(self):
+        """WebPで目標バイト数に収まる画質を選び、正しいContent-Typeを返すこと"""
+        import io
+        from PIL import Image
+        buffer = io.BytesIO()
+        Image.effect_noise((1792, 1024), 80).convert("RGB").save(buffer, format="PNG")
+        transcoder = ImageTranscoder(use_pool=False)
+        full_quality = transcoder.transcode(buffer.getvalue(), max_size=(800, 600), image_format="WEBP", quality=90)
+        target_bytes = len(full_quality["data"]) * 2 // 3
+
+        result = transcoder.transcode(
+            buffer.getvalue(), max_size=(800, 600), image_format="WEBP", quality=90, target_bytes=target_bytes
+        )
+
+        self.assertEqual(result["content_type"], "image/webp")
+        self.assertLessEqual(len(result["data"]), target_bytes)
+        self.assertLess(result["quality"], 90)
+
+
+@unittest.skipIf(ImageHashIndex is None, "utils.image_hashを読み込めません")
+class TestImageHash(unittest.TestCase):
+    """知覚ハッシュによる画像の重複検出のテスト"""
+
+    def setUp(self):
+        import tempfile
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "image_hashes.sqlite3")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _make_image(self, size=(1792, 1024), flip=False, image_format="PNG"):
+        import io
+        from PIL import Image
+        img = Image.linear_gradient("L").resize(size).convert("RGB")
+        if flip:
+            img = img.transpose(Image.Transpose.FLIP_TOP_BOTTOM)
+        buffer = io.BytesIO()
+        img.save(buffer, format=image_format)
+        return buffer.getvalue()
+
+    def test_near_duplicate_is_close(self):
+        """縮小・再エンコードした画像は近く、別の画像は遠いこと"""
+        original = image_hashes(self._make_image())
+        resized = image_hashes(self._make_image(size=(800, 457), image_format="JPEG"))
+        different = image_hashes(self._make_image(flip=True))
+
+        self.assertLessEqual(hash_distance(original, resized), 6)
+        self.assertGreater(hash_distance(original, different), 6)
+
+    def test_index_is_per_site_and_article_rejects_duplicates(self):
+        """索引はサイトごとに検索し、記事内ではほぼ同じ画像を1枚しか登録しないこと"""
+        index = ImageHashIndex(db_path=self.db_path, threshold=6)
+        hashes = image_hashes(self._make_image())
+        index.add("https://a.test", 10, "https://a.test/a.webp", hashes, label="ChatGPT 議事録")
+
+        self.assertEqual(index.find_similar("https://a.test", hashes), (10, "https://a.test/a.webp", "ChatGPT 議事録"))
+        self.assertIsNone(index.find_similar("https://b.test", hashes))
+        self.assertIsNone(index.find_similar("https://a.test", image_hashes(self._make_image(flip=True))))
+
+        article_images = ArticleImageHashes(threshold=6)
+        self.assertTrue(article_images.claim(hashes))
+        self.assertFalse(article_images.claim(image_hashes(self._make_image(size=(800, 457)))))
+
+    @unittest.skipIf(isinstance(post_article, Mock), "post_articleを読み込めません")
+    @patch.dict(os.environ, {"IMAGE_CACHE_VERIFY": "false"})
+    @patch('post_article.get_image_cache', return_value=None)
+    @patch('post_article.take_prefetched_image', return_value=None)
+    @patch('post_article.upload_image_data_to_wp')
+    @patch('post_article.generate_image_for_upload')
+    def test_duplicate_of_site_media_is_swapped(self, mock_generate, mock_upload, *_):
+        """サイト内の既存メディアとほぼ同じ画像はアップロードせずに差し替えること"""
+        index = ImageHashIndex(db_path=self.db_path, threshold=6)
+        index.add(post_article.WP_URL, 10, "https://a.test/a.webp", image_hashes(self._make_image()))
+        mock_generate.return_value = self._make_image(size=(1024, 1024))
+
+        with patch('post_article.get_image_hash_index', return_value=index), \
+                patch('post_article.get_image_transcoder', return_value=ImageTranscoder(use_pool=False)):
+            result = post_article._create_heading_image("ChatGPT 議事録", "flat icon")
+
+        self.assertEqual(result, (10, "https://a.test/a.webp"))
+        mock_upload.assert_not_called()
+
+    @unittest.skipIf(isinstance(post_article, Mock), "post_articleを読み込めません")
+    @patch('post_article.get_image_cache', return_value=None)
+    @patch('post_article.get_image_hash_index', return_value=None)
+    @patch('post_article.take_prefetched_image', return_value=None)
+    @patch('post_article._reuse_cached_image', return_value=(10, "https://a.test/a.webp"))
+    @patch('post_article.upload_image_data_to_wp', return_value=(20, "https://a.test/b.webp"))
+    @patch('post_article.generate_image_for_upload', return_value=b"png")
+    def test_cached_media_used_in_article_is_regenerated(self, mock_generate, mock_upload, *_):
+        """記事内で使用済みのキャッシュ画像は再利用せずに新しく生成すること"""
+        article_images = ArticleImageHashes(threshold=6)
+        article_images.use_media(10)
+
+        result = post_article._create_heading_image("ChatGPT 議事録", "flat icon", article_images=article_images)
+
+        self.assertEqual(result, (20, "https://a.test/b.webp"))
+        mock_generate.assert_called_once()
+        mock_upload.assert_called_once_with(b"png", "heading_image.png", slot="inline")
+
+
+@unittest.skipIf(ImageJobQueue is None, "utils.image_jobsを読み込めません")
+class TestImageJobQueue(unittest.TestCase):
+    """画像の後追い処理ジョブのテスト"""
+
+    def setUp(self):
+        import tempfile
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.queue = ImageJobQueue(db_path=os.path.join(self.tmpdir.name, "image_jobs.sqlite3"), max_attempts=2)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_claim_is_leased_per_post_and_failures_are_retried(self):
+        """記事単位で占有し、期限切れで引き継ぎ、失敗は上限まで再試行すること"""
+        self.assertEqual(self.queue.enqueue("https://a.test", 1, ["A", "B"]), 2)
+        self.assertEqual(self.queue.enqueue("https://a.test", 1, ["A", "B"]), 0)
+
+        with patch('utils.image_jobs.time.time', return_value=1000.0):
+            jobs = self.queue.claim_post("https://a.test", lease_seconds=60)
+            self.assertEqual([(job["heading"], job["slot"]) for job in jobs], [("A", "featured"), ("B", "inline")])
+            self.assertEqual(self.queue.claim_post("https://a.test", lease_seconds=60), [])
+            self.queue.mark_uploaded(jobs[0]["id"], 10, "https://a.test/a.webp", jobs[0]["lease_until"])
+        with patch('utils.image_jobs.time.time', return_value=1061.0):
+            resumed = self.queue.claim_post("https://a.test", lease_seconds=60)
+            self.assertEqual([job["status"] for job in resumed], ["uploaded", "pending"])
+            lease = resumed[0]["lease_until"]
+            self.queue.fail(resumed[1]["id"], "timeout", lease)
+        self.assertEqual(self.queue.post_jobs("https://a.test", 1)[1]["status"], "pending")
+        self.queue.complete(resumed[0]["id"], lease)
+
+        with patch('utils.image_jobs.time.time', return_value=2000.0):
+            retry = self.queue.claim_post("https://a.test", lease_seconds=60)
+            self.queue.fail(retry[0]["id"], "timeout", retry[0]["lease_until"])
+        self.assertEqual(self.queue.stats("https://a.test"), {"pending": 0, "uploaded": 0, "done": 1, "failed": 1})
+        self.assertTrue(self.queue.is_finished("https://a.test", 1))
+
+    def test_failed_job_waits_for_backoff(self):
+        """失敗したジョブは待ち時間（試行ごとに倍増）が過ぎるまで占有されず、処理済みの記事は除外できること"""
+        queue = ImageJobQueue(db_path=os.path.join(self.tmpdir.name, "backoff.sqlite3"), max_attempts=3, retry_backoff=30)
+        queue.enqueue("https://a.test", 1, ["A"])
+        queue.enqueue("https://a.test", 2, ["B"])
+
+        with patch('utils.image_jobs.time.time', return_value=1000.0):
+            job = queue.claim_post("https://a.test", post_id=1)[0]
+            queue.fail(job["id"], "timeout", job["lease_until"])
+            self.assertEqual(queue.claim_post("https://a.test", post_id=1), [])
+        with patch('utils.image_jobs.time.time', return_value=1031.0):
+            job = queue.claim_post("https://a.test", post_id=1)[0]
+            queue.fail(job["id"], "timeout", job["lease_until"])
+        with patch('utils.image_jobs.time.time', return_value=1080.0):
+            self.assertEqual(queue.claim_post("https://a.test", post_id=1), [])
+        with patch('utils.image_jobs.time.time', return_value=1092.0):
+            self.assertEqual(queue.claim_post("https://a.test", exclude=[2])[0]["post_id"], 1)
+            self.assertEqual(queue.claim_post("https://a.test", exclude=[2]), [])
+
+    def test_updates_after_lease_is_taken_over_are_rejected(self):
+        """期限切れで別のワーカーが占有し直した記事は、元のワーカーが延長・更新できないこと"""
+        self.queue.enqueue("https://a.test", 1, ["A", "B"])
+        with patch('utils.image_jobs.time.time', return_value=1000.0):
+            stale = self.queue.claim_post("https://a.test", lease_seconds=60)
+        with patch('utils.image_jobs.time.time', return_value=1030.0):
+            lease = self.queue.renew("https://a.test", 1, stale[0]["lease_until"], lease_seconds=60)
+        with patch('utils.image_jobs.time.time', return_value=1100.0):
+            current = self.queue.claim_post("https://a.test", lease_seconds=60)
+
+        with self.assertRaises(LeaseLostError):
+            self.queue.renew("https://a.test", 1, lease)
+        with self.assertRaises(LeaseLostError):
+            self.queue.mark_uploaded(stale[0]["id"], 10, "https://a.test/a.webp", lease)
+        with self.assertRaises(LeaseLostError):
+            self.queue.complete(stale[0]["id"], lease)
+        self.queue.release("https://a.test", 1, lease)
+        self.queue.complete(current[0]["id"], current[0]["lease_until"])
+        self.assertEqual([job["status"] for job in self.queue.post_jobs("https://a.test", 1)], ["done", "pending"])
+        self.assertEqual(self.queue.post_jobs("https://a.test", 1)[1]["lease_until"], current[1]["lease_until"])
+
+    @unittest.skipIf(isinstance(post_article, Mock), "post_articleを読み込めません")
+    @patch('post_article.clear_prefetched_images')
+    @patch('post_article.generate_image_prompts', side_effect=lambda headings: list(headings))
+    @patch('post_article.has_prefetched_image', return_value=False)
+    @patch('post_article.get_image_cache', return_value=None)
+    @patch('post_article.update_post')
+    @patch('post_article.get_post_for_edit')
+    @patch('post_article._create_heading_image')
+    def test_backfill_patches_post_as_images_land(self, mock_create, mock_get, mock_update, *_):
+        """画像ごとに本文へ反映し、最後にアイキャッチ画像と投稿ステータスを設定すること"""
+        post = {"id": 1, "content": {"raw": "<h2>A</h2><p>1</p><h2>B</h2><p>2</p>"}, "featured_media": 0, "status": "draft"}
+
+        def update(post_id, data):
+            post["content"]["raw"] = data.get("content", post["content"]["raw"])
+            post["featured_media"] = data.get("featured_media", post["featured_media"])
+            post["status"] = data.get("status", post["status"])
+            return post
+        mock_get.side_effect = lambda post_id: post
+        mock_update.side_effect = update
+        mock_create.side_effect = lambda heading, prompt, slot, article_images: (ord(heading), f"https://a.test/{heading}.webp")
+
+        self.queue.enqueue(post_article.WP_URL, 1, ["A", "B"], publish_status="publish")
+        with patch('post_article.get_image_job_queue', return_value=self.queue):
+            applied = post_article.run_image_backfill()
+
+        self.assertEqual(applied, 2)
+        self.assertLess(post["content"]["raw"].index("A.webp"), post["content"]["raw"].index("<p>1</p>"))
+        self.assertLess(post["content"]["raw"].index("B.webp"), post["content"]["raw"].index("<p>2</p>"))
+        self.assertEqual(post["featured_media"], ord("A"))
+        self.assertEqual(post["status"], "publish")
+        self.assertTrue(self.queue.is_finished(post_article.WP_URL, 1))
+
+    @unittest.skipIf(isinstance(post_article, Mock), "post_articleを読み込めません")
+    @patch('post_article.clear_prefetched_images')
+    @patch('post_article.update_post')
+    @patch('post_article.get_post_for_edit')
+    def test_backfill_stops_when_lease_is_lost(self, mock_get, mock_update, _):
+        """占有が引き継がれた記事は本文を書き換えずに中断し、次の記事へ進むこと"""
+        self.queue.enqueue(post_article.WP_URL, 1, ["A"])
+        jobs = self.queue.claim_post(post_article.WP_URL, lease_seconds=60)
+        self.queue.mark_uploaded(jobs[0]["id"], 10, "https://a.test/a.webp", jobs[0]["lease_until"])
+        self.queue.release(post_article.WP_URL, 1, jobs[0]["lease_until"])
+
+        with patch('post_article.get_image_job_queue', return_value=self.queue), \
+                patch.object(self.queue, 'renew', side_effect=LeaseLostError("taken over")):
+            self.assertEqual(post_article.run_image_backfill(), 0)
+
+        mock_get.assert_not_called()
+        mock_update.assert_not_called()
+        self.assertEqual(self.queue.post_jobs(post_article.WP_URL, 1)[0]["status"], "uploaded")
+
+
+@unittest.skipIf(TermCache is None, "utils.term_cacheを読み込めません")
+class TestTermCache(unittest.TestCase):
+    """タグ・カテゴリのID対応表のテスト"""
+
+    def setUp(self):
+        import tempfile
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "term_cache.sqlite3")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _response(self, status_code, body):
+        response = Mock(status_code=status_code, text=json.dumps(body))
+        response.json.return_value = body
+        return response
+
+    def test_lookup_is_normalized_persistent_and_invalidated_with_children(self):
+        """名前の表記揺れを吸収して保存し、削除されたIDは子カテゴリごと無効化すること"""
+        cache = TermCache(db_path=self.db_path)
+        cache.set("https://a.test", "categories", "AI &amp; 業務効率化", 5)
+        cache.set("https://a.test", "categories", "議事録", 6, parent=5)
+
+        reloaded = TermCache(db_path=self.db_path)
+        self.assertEqual(reloaded.get("https://a.test", "categories", "ai & 業務効率化 "), 5)
+        self.assertEqual(reloaded.get("https://a.test", "categories", "議事録", parent=5), 6)
+        self.assertIsNone(reloaded.get("https://b.test", "categories", "AI & 業務効率化"))
+
+        reloaded.invalidate_ids("https://a.test", "categories", [5])
+        self.assertIsNone(reloaded.get("https://a.test", "categories", "AI & 業務効率化"))
+        self.assertIsNone(TermCache(db_path=self.db_path).get("https://a.test", "categories", "議事録", parent=5))
+
+    @unittest.skipIf(isinstance(post_article, Mock), "post_articleを読み込めません")
+    def test_repeat_tags_need_no_requests(self):
+        """作成時の term_exists もキャッシュし、2回目以降はWordPressに問い合わせないこと"""
+        client = Mock()
+        client.get.return_value = self._response(200, [])
+        client.post.return_value = self._response(400, {"code": "term_exists", "data": {"status": 400, "term_id": 7}})
+        cache = TermCache(db_path=self.db_path)
+
+        with patch('post_article.get_wp_client', return_value=client), \
+                patch('post_article.get_term_cache', return_value=cache):
+            self.assertEqual(post_article.get_or_create_tags(["ChatGPT"]), [7])
+            self.assertEqual(post_article.get_or_create_tags(["chatgpt"]), [7])
+
+        self.assertEqual(client.get.call_count, 0)
+        self.assertEqual(client.post.call_count, 1)
+
+    @unittest.skipIf(isinstance(post_article, Mock), "post_articleを読み込めません")
+    def test_stale_parent_category_is_refetched(self):
+        """キャッシュの親カテゴリが削除されていた場合は取得し直してサブカテゴリを作成すること"""
+        cache = TermCache(db_path=self.db_path)
+        cache.set(post_article.WP_URL, "categories", "AI活用", 5)
+        client = Mock()
+        client.get.side_effect = lambda path, params: self._response(200, [])
+        client.post.side_effect = [
+            self._response(400, {"code": "rest_term_invalid", "data": {"status": 400}}),
+            self._response(201, {"id": 9}),
+            self._response(201, {"id": 10})
+        ]
+
+        with patch('post_article.get_wp_client', return_value=client), \
+                patch('post_article.get_term_cache', return_value=cache):
+            self.assertEqual(post_article.get_or_create_categories("AI活用", "議事録"), [9, 10])
+
+        self.assertEqual(cache.get(post_article.WP_URL, "categories", "議事録", parent=9), 10)
+
+    def test_bulk_sync_full_then_incremental(self):
+        """全件同期は全ページを取得して対応表を置き換え、差分同期は新しいタームだけを取得すること"""
+        site = "https://a.test"
+        terms = [{"id": i, "name": f"タグ{i}", "slug": f"tag-{i}"} for i in range(1, 251)]
+
+        def get(path, params, fields=None):
+            ordered = sorted(terms, key=lambda term: term["id"], reverse=params["order"] == "desc")
+            start = (params["page"] - 1) * params["per_page"]
+            response = self._response(200, ordered[start:start + params["per_page"]])
+            response.headers = {"X-WP-TotalPages": str(-(-len(ordered) // params["per_page"]))}
+            return response
+
+        client = Mock()
+        client.get.side_effect = get
+        cache = TermCache(db_path=self.db_path)
+        cache.set(site, "tags", "削除済み", 999)
+
+        self.assertEqual(sync_terms(client, cache, site, taxonomies=("tags",)), {"tags": 250})
+        self.assertEqual(client.get.call_count, 3)
+        self.assertEqual(client.get.call_args.kwargs["fields"], "id,name,parent,slug")
+        self.assertEqual(cache.get(site, "tags", "タグ250"), 250)
+        self.assertIsNone(cache.get(site, "tags", "削除済み"))
+
+        # 間隔内は同期しない
+        self.assertEqual(sync_terms(client, cache, site, taxonomies=("tags",)), {"tags": None})
+        self.assertEqual(client.get.call_count, 3)
+
+        terms.append({"id": 251, "name": "新タグ", "slug": "new-tag"})
+        self.assertEqual(sync_terms(client, cache, site, taxonomies=("tags",), mode="incremental"), {"tags": 1})
+        self.assertEqual(client.get.call_count, 4)
+        self.assertEqual(TermCache(db_path=self.db_path).get(site, "tags", "新タグ"), 251)
+        self.assertEqual(cache.get_sync_state(site, "tags")["max_id"], 251)
+
+
+@unittest.skipIf(PublishLedger is None, "utils.publish_ledgerを読み込めません")
+class TestPublishLedger(unittest.TestCase):
+    """記事投稿の冪等化台帳のテスト"""
+
+    def setUp(self):
+        import tempfile
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.ledger = PublishLedger(db_path=os.path.join(self.tmpdir.name, "publish_ledger.sqlite3"))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_claim_blocks_parallel_workers_until_released(self):
+        """投稿中の記事は別のワーカーが占有できず、解除後は前回の試行として引き継げること"""
+        fingerprint, content_hash = article_fingerprint("1", "ai-tools", "<p>本文</p>")
+        self.assertNotEqual(fingerprint, article_fingerprint("1", "ai-tools", "<p>別の本文</p>")[0])
+
+        first = self.ledger.claim("https://a.test", fingerprint, "1", "ai-tools", content_hash)
+        self.assertEqual(first["attempts"], 0)
+        self.assertIsNone(self.ledger.claim("https://a.test", fingerprint, "1", "ai-tools", content_hash))
+
+        self.ledger.release("https://a.test", fingerprint)
+        retry = self.ledger.claim("https://a.test", fingerprint, "1", "ai-tools", content_hash)
+        self.assertEqual(retry["attempts"], 1)
+
+        self.ledger.record_post("https://a.test", fingerprint, 42, "https://a.test/ai-tools/")
+        self.assertEqual(self.ledger.find_slug("https://a.test", "ai-tools")["post_id"], 42)
+        self.assertEqual(self.ledger.stats("https://a.test"), {"pending": 0, "posted": 1})
+
+    @unittest.skipIf(isinstance(post_article, Mock), "post_articleを読み込めません")
+    def test_retry_after_timeout_updates_existing_post(self):
+        """投稿がタイムアウトした後の再試行は、スラッグで見つけた既存の投稿の更新になること"""
+        import requests as real_requests
+        created = Mock(status_code=201)
+        created.json.return_value = {"id": 5, "link": "https://a.test/ai-tools/"}
+        lookup = Mock(status_code=200)
+        lookup.json.return_value = [{"id": 5, "link": "https://a.test/ai-tools/", "title": {"raw": "AI & ツール"}}]
+        client = Mock()
+        client.post.side_effect = [real_requests.exceptions.ReadTimeout("timeout"), created, created]
+        client.get.return_value = lookup
+        args = ("AI & ツール", "<p>本文</p>", "説明", "ai-tools", [1], [2], None)
+
+        with patch('post_article.get_wp_client', return_value=client), \
+                patch('post_article.get_publish_ledger', return_value=self.ledger):
+            with self.assertRaises(real_requests.exceptions.ReadTimeout):
+                post_article.publish_post(*args, keyword_group="1")
+            result = post_article.publish_post(*args, keyword_group="1")
+            # 投稿済みの記事は台帳から更新対象が分かる
+            post_article.publish_post(*args, keyword_group="1")
+
+        self.assertEqual(result["id"], 5)
+        paths = [c.args[0] for c in client.post.call_args_list]
+        self.assertEqual(paths, ["wp/v2/posts", "wp/v2/posts/5", "wp/v2/posts/5"])
+        self.assertEqual(client.get.call_count, 1)
+        self.assertEqual(client.get.call_args.kwargs["params"]["context"], "edit")
+
+    @unittest.skipIf(isinstance(post_article, Mock), "post_articleを読み込めません")
+    def test_slug_lookup_compares_raw_title(self):
+        """引用符・... を含むタイトルも、wptexturize後の rendered ではなく raw で同じ記事と判定すること"""
+        title = '"AI" -- ツール入門...'
+        lookup = Mock(status_code=200)
+        lookup.json.return_value = [
+            {"id": 7, "link": "https://a.test/other/", "title": {"raw": "別の記事", "rendered": "別の記事"}},
+            {"id": 8, "link": "https://a.test/ai/", "title": {"raw": title, "rendered": "&#8220;AI&#8221; &#8211; ツール入門&#8230;"}}
+        ]
+        client = Mock()
+        client.get.return_value = lookup
+
+        with patch('post_article.get_wp_client', return_value=client):
+            self.assertEqual(post_article.find_post_by_slug("ai", title)["id"], 8)
+            self.assertIsNone(post_article.find_post_by_slug("ai", "AI ツール入門"))
+
+
+@unittest.skipIf(CheckpointManager is None, "utils.checkpoint_managerを読み込めません")
+class TestCheckpointManager(unittest.TestCase):
+    """ステージのチェックポイントのテスト"""
+
+    def setUp(self):
+        import tempfile
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.checkpoint_dir = self.tmpdir.name
+        self.context = {"reference_mode": "integrated_keywords"}
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_resume_skips_finished_stages(self):
+        """再開時は完了済みのステージを実行しないこと"""
+        first = CheckpointManager(checkpoint_dir=self.checkpoint_dir, context=self.context)
+        first.run_stage("slug", lambda: "chatgpt-guide")
+
+        run_id = CheckpointManager.find_resumable(self.checkpoint_dir, context=self.context)
+        self.assertEqual(run_id, first.run_id)
+
+        resumed = CheckpointManager(run_id=run_id, checkpoint_dir=self.checkpoint_dir, context=self.context)
+        stage = Mock(return_value="other-slug")
+        self.assertTrue(resumed.resumed)
+        self.assertEqual(resumed.run_stage("slug", stage), "chatgpt-guide")
+        stage.assert_not_called()
+
+    def test_completed_or_other_mode_runs_are_not_resumed(self):
+        """完了済み・別モードの実行は再開対象にならないこと"""
+        completed = CheckpointManager(checkpoint_dir=self.checkpoint_dir, context=self.context)
+        completed.save("article", {"title": "タイトル"})
+        completed.complete()
+        other = CheckpointManager(run_id="other", checkpoint_dir=self.checkpoint_dir, context={"reference_mode": "url"})
+        other.save("article", {"title": "タイトル"})
+
+        self.assertIsNone(CheckpointManager.find_resumable(self.checkpoint_dir, context=self.context))
+
+    def test_running_checkpoint_is_locked(self):
+        """処理中の実行は別のプロセス（別の占有）から再開できず、完了後は再開対象から外れること"""
+        first = CheckpointManager(run_id="running", checkpoint_dir=self.checkpoint_dir, context=self.context)
+        self.assertTrue(first.acquire())
+        first.save("article", {"title": "タイトル"})
+
+        second = CheckpointManager(run_id="running", checkpoint_dir=self.checkpoint_dir, context=self.context)
+        self.assertFalse(second.acquire())
+
+        first.complete()
+        self.assertFalse(second.acquire())
+
+    @unittest.skipIf(isinstance(post_article, Mock), "post_articleを読み込めません")
+    def test_checkpoint_abandoned_after_max_attempts(self):
+        """CHECKPOINT_MAX_ATTEMPTS 回再開しても完了しない実行は破棄して新しく始めること"""
+        stuck = CheckpointManager(run_id="stuck", checkpoint_dir=self.checkpoint_dir, context=self.context)
+        stuck.save("keyword_group", {"group_id": 1})
+
+        with patch.dict(os.environ, {"CHECKPOINT_DIR": self.checkpoint_dir, "CHECKPOINT_MAX_ATTEMPTS": "2"}):
+            for attempt in (1, 2):
+                resumed = post_article.create_checkpoint("integrated_keywords")
+                self.assertEqual((resumed.run_id, resumed.attempts), ("stuck", attempt))
+                resumed.release()
+            fresh = post_article.create_checkpoint("integrated_keywords")
+
+        self.assertNotEqual(fresh.run_id, "stuck")
+        self.assertFalse(fresh.resumed)
+        fresh.release()
+        abandoned = CheckpointManager(run_id="stuck", checkpoint_dir=self.checkpoint_dir, context=self.context)
+        self.assertEqual(abandoned.data["status"], "abandoned")
+
+
+@unittest.skipIf(RateLimiter is None, "utils.rate_limiterを読み込めません")
+class TestRateLimiter(unittest.TestCase):
+    """プロセス間共有レートリミッターのテスト"""
+
+    def setUp(self):
+        import tempfile
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.state_file = os.path.join(self.tmpdir.name, "ratelimit.json")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    @patch('utils.rate_limiter.time.time', return_value=1000.0)
+    def test_request_budget_is_shared(self, _mock_time):
+        """同じ状態ファイルを使うリミッター同士で枠が共有されること"""
+        limits = {"gpt-4o": (2, 0)}
+        first = RateLimiter(state_file=self.state_file, limits=limits)
+        second = RateLimiter(state_file=self.state_file, limits=limits)
+
+        self.assertEqual(first._try_acquire("gpt-4o", 0), 0)
+        self.assertEqual(second._try_acquire("gpt-4o", 0), 0)
+        self.assertAlmostEqual(first._try_acquire("gpt-4o", 0), 30.0)
+
+    @patch('utils.rate_limiter.time.time', return_value=1000.0)
+    def test_usage_corrects_token_estimate(self, _mock_time):
+        """実際の usage が見積もりより少なければ差分が戻ること"""
+        limiter = RateLimiter(state_file=self.state_file, limits={"gpt-4o": (100, 1000)})
+
+        self.assertEqual(limiter._try_acquire("gpt-4o", 900), 0)
+        self.assertGreater(limiter._try_acquire("gpt-4o", 500), 0)
+        limiter.record_usage("gpt-4o", 900, 300)
+        self.assertEqual(limiter._try_acquire("gpt-4o", 500), 0)
+
+
+@unittest.skipIf(RetryPolicy is None, "utils.retry_policyを読み込めません")
+class TestRetryPolicy(unittest.TestCase):
+    """共通リトライポリシーのテスト"""
+
+    def _make_response(self, status_code, headers=None):
+        response = Mock()
+        response.status_code = status_code
+        response.headers = headers or {}
+        return response
+
+    def test_parse_retry_after(self):
+        """Retry-After の秒数・ミリ秒指定を解釈できること"""
+        self.assertEqual(RetryPolicy.parse_retry_after({"retry-after": "7"}), 7.0)
+        self.assertEqual(RetryPolicy.parse_retry_after({"retry-after-ms": "1500"}), 1.5)
+        self.assertIsNone(RetryPolicy.parse_retry_after({}))
+
+    @patch('utils.retry_policy.time.sleep')
+    def test_request_honors_retry_after(self, mock_sleep):
+        """429は Retry-After 以上待ってから再試行すること"""
+        session = Mock()
+        session.request.side_effect = [
+            self._make_response(429, {"retry-after": "3"}),
+            self._make_response(200)
+        ]
+        policy = RetryPolicy(max_attempts=3, base_delay=0.1, max_elapsed=60)
+
+        response = policy.request("GET", "https://test-site.com/wp-json/wp/v2/tags", session=session)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertGreaterEqual(mock_sleep.call_args[0][0], 3.0)
+        self.assertEqual(session.request.call_args.kwargs["timeout"], policy.requests_timeout)
+
+    @patch('utils.retry_policy.time.sleep')
+    def test_non_idempotent_request_is_not_retried_on_server_error(self, mock_sleep):
+        """投稿などの書き込みは500では再試行しないこと"""
+        session = Mock()
+        session.request.return_value = self._make_response(500)
+        policy = RetryPolicy(max_attempts=3, idempotent=False)
+
+        response = policy.request("POST", "https://test-site.com/wp-json/wp/v2/posts", session=session)
+
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(session.request.call_count, 1)
+        mock_sleep.assert_not_called()
+
+
+@unittest.skipIf(TokenLedger is None, "utils.token_ledgerを読み込めません")
+class TestTokenLedger(unittest.TestCase):
+    """トークン・コスト台帳のテスト"""
+
+    def _make_usage(self, prompt_tokens, completion_tokens, cached_tokens=0):
+        usage = Mock()
+        usage.prompt_tokens = prompt_tokens
+        usage.completion_tokens = completion_tokens
+        usage.prompt_tokens_details.cached_tokens = cached_tokens
+        return usage
+
+    def test_summary_by_stage(self):
+        """ステージ別に集計され、キャッシュ済み入力が割引単価で計算されること"""
+        ledger = TokenLedger(run_id="test")
+        ledger.record_chat("section", "gpt-4o", self._make_usage(1000, 500, cached_tokens=1000), 1.0)
+        ledger.record_chat("section", "gpt-4o", self._make_usage(1000, 500), 1.0, cache_hit=True)
+        ledger.record_image("image", "dall-e-3", "1792x1024", "standard", 5.0)
+
+        summary = ledger.summary()
+
+        self.assertEqual(summary["total_tokens"], 1500)
+        self.assertEqual(summary["stages"]["section"]["calls"], 2)
+        self.assertEqual(summary["stages"]["section"]["cache_hits"], 1)
+        self.assertAlmostEqual(summary["stages"]["section"]["cost"], (1000 * 1.25 + 500 * 10.00) / 1_000_000)
+        self.assertAlmostEqual(summary["cost"], summary["stages"]["section"]["cost"] + 0.080)
+        self.assertEqual(summary["prompt_cache_ratio"], 1.0)
+
+    def test_over_budget(self):
+        """予算を超えたら over_budget がTrueになること（0は無制限）"""
+        ledger = TokenLedger(budget_tokens=1000)
+        ledger.record_chat("section", "gpt-4o", self._make_usage(800, 300), 1.0)
+        self.assertTrue(ledger.over_budget())
+        self.assertFalse(TokenLedger(budget_tokens=0).over_budget())
+
+    def test_ledger_is_scoped_per_article(self):
+        """同じループで並行生成する記事は、それぞれのタスク内で開始した別々の台帳に記録されること"""
+        import asyncio
+        from utils.token_ledger import get_token_ledger, start_token_ledger
+
+        async def article(run_id, tokens):
+            start_token_ledger(run_id)
+            await asyncio.sleep(0)
+            get_token_ledger().record_chat("section", "gpt-4o", self._make_usage(tokens, 0), 0.1)
+            await asyncio.sleep(0)
+            return get_token_ledger()
+
+        async def run_both():
+            return await asyncio.gather(article("a", 100), article("b", 200))
+
+        first, second = asyncio.run(run_both())
+        self.assertEqual((first.run_id, first.total_tokens()), ("a", 100))
+        self.assertEqual((second.run_id, second.total_tokens()), ("b", 200))
+
+    @unittest.skipIf(isinstance(generate_article, Mock), "generate_articleを読み込めません")
+    def test_sync_wrappers_record_to_caller_ledger(self):
+        """同期ラッパーがバックグラウンドループで実行する処理も、呼び出し元の記事の台帳を使うこと"""
+        import contextvars
+        from utils.token_ledger import get_token_ledger, start_token_ledger
+
+        async def current_ledger():
+            return get_token_ledger()
+
+        def article():
+            ledger = start_token_ledger("sync-article")
+            return ledger, generate_article.run_sync(current_ledger())
+
+        started, seen = contextvars.copy_context().run(article)
+        self.assertIs(seen, started)
+
+    @unittest.skipIf(isinstance(generate_article, Mock), "generate_articleを読み込めません")
+    @patch('generate_article._create_chat_completion', new_callable=AsyncMock)
+    def test_optional_stage_skipped_over_budget(self, mock_create):
+        """予算超過かつ TOKEN_BUDGET_ACTION=skip の場合はFAQを生成しないこと"""
+        ledger = TokenLedger(budget_tokens=10)
+        ledger.record_chat("section", "gpt-4o", self._make_usage(100, 100), 1.0)
+
+        with patch('generate_article.get_token_ledger', return_value=ledger), \
+                patch.dict(os.environ, {"TOKEN_BUDGET_ACTION": "skip"}):
+            self.assertEqual(generate_article.generate_faq_section("ChatGPT", "本文"), "")
+        mock_create.assert_not_called()
+
+    @unittest.skipIf(isinstance(generate_article, Mock), "generate_articleを読み込めません")
+    @patch('generate_article._create_chat_completion', new_callable=AsyncMock)
+    def test_optional_stage_downgraded_over_budget(self, mock_create):
+        """予算超過時の既定動作では軽量モデルで生成すること"""
+        response = Mock()
+        response.choices = [Mock()]
+        response.choices[0].message.content = json.dumps({"faq": "<h3>よくある質問</h3>"})
+        mock_create.return_value = response
+        ledger = TokenLedger(budget_tokens=10)
+        ledger.record_chat("section", "gpt-4o", self._make_usage(100, 100), 1.0)
+
+        with patch('generate_article.get_token_ledger', return_value=ledger), \
+                patch.dict(os.environ, {"TOKEN_BUDGET_ACTION": "downgrade", "TOKEN_BUDGET_DOWNGRADE_MODEL": "gpt-4o-mini"}):
+            generate_article.generate_faq_section("ChatGPT", "本文")
+        self.assertEqual(mock_create.call_args.kwargs["model"], "gpt-4o-mini")
+
+    def test_resumed_run_appends_to_saved_ledger(self):
+        """同じ実行IDで再開した実行は保存済みの台帳を読み込み、前回分に追記して保存すること"""
+        import contextvars
+        import tempfile
+        from utils.token_ledger import start_token_ledger
+
+        def run(tokens):
+            ledger = start_token_ledger("resume-run")
+            ledger.record_chat("section", "gpt-4o", self._make_usage(tokens, 0), 0.1)
+            return ledger, ledger.save(tmpdir)
+
+        with tempfile.TemporaryDirectory() as tmpdir, \
+                patch.dict(os.environ, {"TOKEN_LEDGER_DIR": tmpdir, "ARTICLE_TOKEN_BUDGET": "250"}):
+            contextvars.copy_context().run(run, 100)
+            resumed, path = contextvars.copy_context().run(run, 200)
+            with open(path, encoding="utf-8") as f:
+                saved = json.load(f)
+
+        self.assertTrue(resumed.over_budget())
+        self.assertEqual([e["prompt_tokens"] for e in saved["entries"]], [100, 200])
+        self.assertEqual(saved["summary"]["total_tokens"], 300)
+
 class TestWordPressConnector(unittest.TestCase):
     """WordPress投稿機能のテスト"""
 
@@ -137,6 +1315,105 @@ class TestWordPressConnector(unittest.TestCase):
             self.assertIsInstance(result, dict)
             self.assertIn('id', result)
 
+    @unittest.skipIf(isinstance(post_article, Mock), "post_articleを読み込めません")
+    @patch.dict(os.environ, {"IMAGE_CONCURRENCY": "3", "IMAGE_CACHE": "false", "IMAGE_DEDUP": "false"})
+    @patch('post_article.clear_prefetched_images')
+    @patch('post_article.upload_image_data_to_wp')
+    @patch('post_article.generate_image_for_upload', side_effect=lambda prompt, slot="inline": prompt.encode())
+    @patch('post_article.generate_image_prompts', side_effect=lambda headings: list(headings))
+    @patch('post_article.take_prefetched_image', return_value=None)
+    def test_insert_images_keeps_heading_order(self, mock_prefetched, mock_prompts, mock_image, mock_upload, mock_clear):
+        """並列生成でも見出し順に画像を挿入し、失敗した見出しだけを飛ばすこと"""
+        import time
+
+        def upload(image_data, filename, slot="inline"):
+            label = image_data.decode()
+            if label == "A":
+                time.sleep(0.05)  # 最初の見出しを最後に完了させる
+            if label == "B":
+                raise RuntimeError("upload failed")
+            return ord(label), f"https://test-site.com/{label}.png"
+        mock_upload.side_effect = upload
+
+        html, media_ids = post_article.insert_images_to_html("<h2>A</h2><p>1</p><h2>B</h2><p>2</p><h2>C</h2><p>3</p>")
+
+        self.assertEqual(media_ids, [ord("A"), ord("C")])
+        self.assertLess(html.index("A.png"), html.index("<p>1</p>"))
+        self.assertLess(html.index("C.png"), html.index("<p>3</p>"))
+        self.assertNotIn("B.png", html)
+        mock_prompts.assert_called_once_with(["A", "B", "C"])
+
+    @unittest.skipIf(isinstance(post_article, Mock), "post_articleを読み込めません")
+    def test_requests_share_pooled_session(self):
+        """WordPressへの呼び出しは認証済みの共有セッションで、呼び出し種別のタイムアウト付きで送ること"""
+        from utils.wp_client import WordPressClient
+        client = WordPressClient("https://test-site.com/", "user", "pass", pool_maxsize=8)
+        response = Mock(status_code=201)
+        response.json.return_value = {'id': 123, 'link': 'https://test-site.com/post/123'}
+
+        with patch.object(client.session, 'request', return_value=response) as mock_request, \
+                patch('post_article.get_wp_client', return_value=client):
+            result = post_article.post_to_wp("タイトル", "<p>本文</p>", "説明", "slug", [1], [2], None)
+            post_article.update_post(123, {"featured_media": 5})
+
+        self.assertEqual(result['id'], 123)
+        self.assertEqual(client.session.auth, ("user", "pass"))
+        self.assertEqual(client.session.get_adapter("https://test-site.com")._pool_maxsize, 8)
+        urls = [c.args[1] for c in mock_request.call_args_list]
+        self.assertEqual(urls, ["https://test-site.com/wp-json/wp/v2/posts", "https://test-site.com/wp-json/wp/v2/posts/123"])
+        self.assertTrue(all("timeout" in c.kwargs for c in mock_request.call_args_list))
+        # 投稿本文のHTMLなどを返させず、使うフィールドだけを取得する
+        self.assertEqual([c.kwargs["params"]["_fields"] for c in mock_request.call_args_list],
+                         ["id,link,tags,categories", "id,link,tags,categories"])
+
+    @unittest.skipIf(isinstance(post_article, Mock), "post_articleを読み込めません")
+    def test_terms_created_in_one_batch_parent_first(self):
+        """タグとメインカテゴリは /batch/v1 の1回で作成し、サブカテゴリは親のID確定後に作成すること"""
+        from utils.wp_client import WordPressClient
+        client = WordPressClient("https://test-site.com", "user", "pass")
+        batch_response = Mock(status_code=200)
+        batch_response.json.return_value = {"responses": [
+            {"status": 201, "body": {"id": 11}},
+            {"status": 400, "body": {"code": "term_exists", "data": {"status": 400, "term_id": 12}}},
+            {"status": 201, "body": {"id": 20}}
+        ]}
+        sub_response = Mock(status_code=201)
+        sub_response.json.return_value = {"id": 21}
+
+        with patch.object(client.session, 'request', side_effect=[batch_response, sub_response]) as mock_request, \
+                patch('post_article.get_wp_client', return_value=client), \
+                patch('post_article.get_term_cache', return_value=None):
+            tag_ids, category_ids = post_article.get_or_create_terms(["新タグ", "既存タグ", "新タグ"], "AI活用", "議事録")
+
+        self.assertEqual(tag_ids, [11, 12, 11])
+        self.assertEqual(category_ids, [20, 21])
+        batch_call, sub_call = mock_request.call_args_list
+        self.assertEqual(batch_call.args[1], "https://test-site.com/wp-json/batch/v1")
+        self.assertEqual([r["path"] for r in batch_call.kwargs["json"]["requests"]],
+                         ["/wp/v2/tags?_fields=id", "/wp/v2/tags?_fields=id", "/wp/v2/categories?_fields=id"])
+        self.assertEqual(sub_call.kwargs["json"], {"name": "議事録", "parent": 20})
+
+    def test_batch_falls_back_to_individual_requests(self):
+        """/batch/v1 に対応していないサーバーでは個別リクエストで送り、以後はバッチを試さないこと"""
+        from utils.wp_client import WordPressClient
+        client = WordPressClient("https://test-site.com")
+
+        def request(method, url, **kwargs):
+            if url.endswith("batch/v1"):
+                return Mock(status_code=404)
+            response = Mock(status_code=201)
+            response.json.return_value = {"id": len(kwargs["json"]["name"])}
+            return response
+
+        requests_ = [{"path": "wp/v2/tags", "body": {"name": "a" * n}} for n in (1, 2, 3)]
+        with patch.object(client.session, 'request', side_effect=request) as mock_request:
+            self.assertEqual(client.batch(requests_), [(201, {"id": 1}), (201, {"id": 2}), (201, {"id": 3})])
+            client.batch(requests_)
+
+        batch_calls = [c for c in mock_request.call_args_list if c.args[1].endswith("batch/v1")]
+        self.assertEqual(len(batch_calls), 1)
+        self.assertFalse(client.batch_supported)
+
     def test_post_data_validation(self):
         """投稿データの検証テスト"""
         # 必須フィールドの検証
@@ -181,6 +1458,20 @@ class TestConfigurationManagement(unittest.TestCase):
             if not os.getenv(config):
                 print(f"Warning: {config} not set in environment")
 
+    def test_config_manager_quiet_in_worker_processes(self):
+        """spawn で起動した子プロセス（画像変換のプロセスプールなど）では読み込み結果を表示しないこと"""
+        import io
+        import contextlib
+        import importlib
+        from types import SimpleNamespace
+        from utils import config_manager
+
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output), \
+                patch('multiprocessing.current_process', return_value=SimpleNamespace(name="SpawnProcess-1")):
+            importlib.reload(config_manager)
+        self.assertEqual(output.getvalue(), "")
+
 
 class TestErrorHandling(unittest.TestCase):
     """エラーハンドリングのテスト"""
@@ -5,9 +5,66 @@
 from .cron_manager import CronManager
 from .log_manager import LogManager
 from .config_manager import ConfigManager
+from .completion_cache import CompletionCache, get_completion_cache
+from .image_cache import ImageCache, get_image_cache
+from .image_jobs import ImageJobQueue, get_image_job_queue
+from .image_tiers import get_image_tier, select_image_tier
+from .image_hash import ArticleImageHashes, ImageHashIndex, get_image_hash_index, image_hashes
+from .image_transcoder import (
+    ImageTranscoder, get_image_transcoder, transcode_image, get_slot_settings, resolve_format, detect_content_type
+)
+from .checkpoint_manager import CheckpointManager
+from .rate_limiter import RateLimiter, get_rate_limiter
+from .retry_policy import RetryPolicy, get_retry_policy, request_with_retry
+from .wp_client import WordPressClient, get_wp_client
+from .term_cache import TermCache, get_term_cache
+from .term_sync import sync_terms
+from .publish_ledger import PublishLedger, article_fingerprint, get_publish_ledger
+from .shared_instance import SharedInstance
+from .sqlite_store import SQLiteStore
+from .token_ledger import TokenLedger, ledger_stage, start_token_ledger, get_token_ledger, finish_token_ledger
 
 __all__ = [
     'CronManager',
     'LogManager',
-    'ConfigManager'
+    'ConfigManager',
+    'CompletionCache',
+    'get_completion_cache',
+    'ImageCache',
+    'get_image_cache',
+    'ImageJobQueue',
+    'get_image_job_queue',
+    'get_image_tier',
+    'select_image_tier',
+    'ArticleImageHashes',
+    'ImageHashIndex',
+    'get_image_hash_index',
+    'image_hashes',
+    'ImageTranscoder',
+    'get_image_transcoder',
+    'transcode_image',
+    'get_slot_settings',
+    'resolve_format',
+    'detect_content_type',
+    'CheckpointManager',
+    'RateLimiter',
+    'get_rate_limiter',
+    'RetryPolicy',
+    'get_retry_policy',
+    'request_with_retry',
+    'WordPressClient',
+    'get_wp_client',
+    'TermCache',
+    'get_term_cache',
+    'sync_terms',
+    'PublishLedger',
+    'article_fingerprint',
+    'get_publish_ledger',
+    'SharedInstance',
+    'SQLiteStore',
+    'TokenLedger',
+    'ledger_stage',
+    'start_token_ledger',
+    'get_token_ledger',
+    'finish_token_ledger'
 ] 
\ No newline at end of file
@@ -0,0 +1,246 @@
+"""
+記事生成ステージのチェックポイント管理
+各ステージの結果を checkpoints/<run_id>.json に保存し、再実行時は完了済みステージをスキップする。
+処理中の実行は checkpoints/<run_id>.lock の排他ロックで占有し、重なったcronの別プロセスが同じ実行を再開しないようにする
+"""
+
+import os
+import json
+import time
+import fcntl
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+def _json_default(value: Any) -> Any:
+    """numpy/pandas の数値型などJSON化できない値を変換"""
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+class CheckpointManager:
+    """1回の実行（run）ごとのステージ結果を保存・復元するクラス"""
+
+    def __init__(self,
+                 run_id: Optional[str] = None,
+                 checkpoint_dir: str = "checkpoints",
+                 context: Optional[Dict[str, Any]] = None,
+                 enabled: bool = True):
+        """
+        チェックポイントの初期化
+
+        Args:
+            run_id: 実行ID（既存のIDを指定した場合はその続きから再開）
+            checkpoint_dir: チェックポイントの保存ディレクトリ
+            context: 実行条件（REFERENCE_MODEなど）。再開対象の照合に使用
+            enabled: Falseの場合はファイルに保存せずメモリ上でのみ管理
+        """
+        self.checkpoint_dir = checkpoint_dir
+        self.enabled = enabled
+        self.run_id = run_id or datetime.now().strftime("%Y%m%d-%H%M%S-") + str(os.getpid())
+        self.path = os.path.join(checkpoint_dir, f"{self.run_id}.json")
+        if enabled:
+            os.makedirs(checkpoint_dir, exist_ok=True)
+
+        self.data = self._load() or {
+            "run_id": self.run_id,
+            "status": "running",
+            "context": context or {},
+            "attempts": 0,
+            "created_at": time.time(),
+            "updated_at": time.time(),
+            "stages": {}
+        }
+        self.resumed = bool(self.data["stages"])
+        self._lock_fd = None
+
+    @property
+    def attempts(self) -> int:
+        """この実行を開始・再開した回数"""
+        return self.data.get("attempts", 0)
+
+    def acquire(self) -> bool:
+        """
+        実行を排他的に占有（プロセスが終了するとロックは自動で外れる）
+
+        Returns:
+            占有できた場合はTrue。別のプロセスが処理中・既に完了していた場合はFalse
+        """
+        if not self.enabled or self._lock_fd is not None:
+            return True
+        lock_fd = open(os.path.join(self.checkpoint_dir, f"{self.run_id}.lock"), "w")
+        try:
+            fcntl.flock(lock_fd.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_fd.close()
+            return False
+        self._lock_fd = lock_fd
+
+        # 一覧を見てからロックを取るまでの間に他のプロセスが完了・破棄していないか読み直して確認
+        self.data = self._load() or self.data
+        self.resumed = bool(self.data["stages"])
+        if self.data.get("status", "running") != "running":
+            self.release()
+            return False
+        return True
+
+    def release(self):
+        """占有を解除"""
+        if self._lock_fd is not None:
+            fcntl.flock(self._lock_fd.fileno(), fcntl.LOCK_UN)
+            self._lock_fd.close()
+            self._lock_fd = None
+
+    def begin_attempt(self):
+        """開始・再開の回数を記録"""
+        self.data["attempts"] = self.attempts + 1
+        self._write()
+
+    def _load(self) -> Optional[Dict[str, Any]]:
+        """既存のチェックポイントを読み込み"""
+        if not self.enabled or not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"⚠️ チェックポイント読み込みエラー（新規に開始）: {e}")
+            return None
+
+    def _write(self):
+        """一時ファイル経由で書き込み（途中で落ちても壊れたJSONを残さない）"""
+        self.data["updated_at"] = time.time()
+        if not self.enabled:
+            return
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, ensure_ascii=False, indent=2, default=_json_default)
+        os.replace(tmp_path, self.path)
+
+    def has(self, stage: str) -> bool:
+        """ステージが完了済みか"""
+        return stage in self.data["stages"]
+
+    def get(self, stage: str, default: Any = None) -> Any:
+        """完了済みステージの結果を取得"""
+        return self.data["stages"].get(stage, default)
+
+    def save(self, stage: str, value: Any):
+        """
+        ステージの結果を保存
+
+        Args:
+            stage: ステージ名
+            value: 結果（JSON化できる値）
+        """
+        self.data["stages"][stage] = value
+        self._write()
+
+    def run_stage(self, stage: str, func: Callable, *args, **kwargs) -> Any:
+        """
+        完了済みなら保存済みの結果を返し、未完了なら実行して結果を保存
+
+        Args:
+            stage: ステージ名
+            func: ステージの処理
+            *args, **kwargs: 処理に渡す引数
+
+        Returns:
+            ステージの結果
+        """
+        if self.has(stage):
+            print(f"⏩ チェックポイントから再開: {stage}")
+            return self.get(stage)
+
+        value = func(*args, **kwargs)
+        self.save(stage, value)
+        return value
+
+    def complete(self):
+        """実行完了を記録して占有を解除"""
+        self.data["status"] = "completed"
+        self._write()
+        self.release()
+
+    def abandon(self):
+        """再開しても完了しない実行を破棄（以後は再開対象にしない）して占有を解除"""
+        self.data["status"] = "abandoned"
+        self._write()
+        self.release()
+
+    @classmethod
+    def resumable_runs(cls,
+                       checkpoint_dir: str = "checkpoints",
+                       context: Optional[Dict[str, Any]] = None,
+                       max_age_hours: float = 24) -> List[str]:
+        """
+        再開可能な（未完了で期限内の）実行IDを新しい順に検索
+
+        Args:
+            checkpoint_dir: チェックポイントの保存ディレクトリ
+            context: 実行条件（一致するものだけを対象にする）
+            max_age_hours: 再開対象とする最終更新からの経過時間
+
+        Returns:
+            実行IDのリスト
+        """
+        if not os.path.isdir(checkpoint_dir):
+            return []
+
+        now = time.time()
+        candidates = []
+        for filename in os.listdir(checkpoint_dir):
+            if not filename.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(checkpoint_dir, filename), "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                continue
+
+            if data.get("status", "running") != "running":
+                continue
+            if now - data.get("updated_at", 0) > max_age_hours * 3600:
+                continue
+            if context is not None and data.get("context") != context:
+                continue
+            candidates.append((data.get("updated_at", 0), data.get("run_id")))
+
+        return [run_id for _, run_id in sorted(candidates, reverse=True)]
+
+    @classmethod
+    def find_resumable(cls,
+                       checkpoint_dir: str = "checkpoints",
+                       context: Optional[Dict[str, Any]] = None,
+                       max_age_hours: float = 24) -> Optional[str]:
+        """
+        再開可能な最新の実行IDを検索
+
+        Returns:
+            実行ID。見つからない場合はNone
+        """
+        runs = cls.resumable_runs(checkpoint_dir, context, max_age_hours)
+        return runs[0] if runs else None
+
+    @classmethod
+    def cleanup(cls, checkpoint_dir: str = "checkpoints", keep_days: float = 7) -> int:
+        """
+        古いチェックポイントを削除
+
+        Args:
+            checkpoint_dir: チェックポイントの保存ディレクトリ
+            keep_days: 保持日数
+
+        Returns:
+            削除したファイル数
+        """
+        if not os.path.isdir(checkpoint_dir):
+            return 0
+
+        cutoff = time.time() - keep_days * 86400
+        removed = 0
+        for filename in os.listdir(checkpoint_dir):
+            path = os.path.join(checkpoint_dir, filename)
+            if filename.endswith((".json", ".lock")) and os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        return removed
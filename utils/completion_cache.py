@@ -0,0 +1,188 @@
+"""
+LLM応答の永続キャッシュ
+モデル・メッセージ・温度・response_formatのハッシュをキーにSQLiteへ保存
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+from typing import Any, Dict, List, Optional
+
+from utils.shared_instance import SharedInstance
+from utils.sqlite_store import SQLiteStore
+
+class CompletionCache(SQLiteStore):
+    """Chat Completions応答のコンテンツアドレス型キャッシュ（TTL・サイズ上限付きLRU）"""
+
+    def __init__(self,
+                 db_path: str = "cache/llm_cache.sqlite3",
+                 ttl: int = 86400,
+                 max_bytes: int = 100 * 1024 * 1024):
+        """
+        キャッシュの初期化
+
+        Args:
+            db_path: SQLiteファイルのパス
+            ttl: 有効期限（秒）。0以下の場合は無期限
+            max_bytes: 保存する応答の合計サイズ上限（超過時は最終アクセスが古い順に削除）
+        """
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+
+        super().__init__(db_path)
+
+    def _create_tables(self, conn: sqlite3.Connection):
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS completions (
+                key TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_completions_last_access ON completions(last_access)")
+
+    @staticmethod
+    def make_key(model: str,
+                 messages: List[Dict[str, Any]],
+                 temperature: Optional[float] = None,
+                 response_format: Optional[Dict[str, Any]] = None,
+                 **params: Any) -> str:
+        """
+        リクエスト内容からキャッシュキーを作成
+
+        Args:
+            model: モデル名
+            messages: 会話のメッセージリスト
+            temperature: 温度パラメータ
+            response_format: 応答フォーマット指定
+            **params: その他のリクエストパラメータ（max_tokens・top_p・seed など。上限の違う応答を使い回さないようキーに含める）
+
+        Returns:
+            SHA-256のハッシュ文字列
+        """
+        material = json.dumps(
+            {
+                "model": model,
+                "messages": messages,
+                "temperature": temperature,
+                "response_format": response_format,
+                "params": {name: value for name, value in params.items() if value is not None}
+            },
+            ensure_ascii=False,
+            sort_keys=True,
+            separators=(",", ":")
+        )
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        キャッシュされた応答を取得
+
+        Args:
+            key: キャッシュキー
+
+        Returns:
+            保存された応答（JSON文字列）。存在しない・期限切れの場合はNone
+        """
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT payload, created_at FROM completions WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            payload, created_at = row
+            if self.ttl > 0 and now - created_at > self.ttl:
+                conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+                return None
+
+            conn.execute("UPDATE completions SET last_access = ? WHERE key = ?", (now, key))
+            return payload
+
+    def set(self, key: str, payload: str):
+        """
+        応答をキャッシュに保存
+
+        Args:
+            key: キャッシュキー
+            payload: 保存する応答（JSON文字列）
+        """
+        now = time.time()
+        size = len(payload.encode("utf-8"))
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO completions (key, payload, size, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, payload, size, now, now)
+            )
+            self._evict(conn, now)
+
+    def delete(self, key: str):
+        """指定キーのキャッシュを削除"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+
+    def clear(self):
+        """キャッシュを全削除"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM completions")
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        """期限切れエントリとサイズ上限を超えた分（LRU順）を削除"""
+        if self.ttl > 0:
+            conn.execute("DELETE FROM completions WHERE created_at < ?", (now - self.ttl,))
+
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM completions").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        for key, size in conn.execute(
+            "SELECT key, size FROM completions ORDER BY last_access ASC"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+            total -= size
+
+    def stats(self) -> Dict[str, int]:
+        """
+        キャッシュの統計情報を取得
+
+        Returns:
+            エントリ数と合計サイズ
+        """
+        with self._connect() as conn:
+            entries, total = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM completions"
+            ).fetchone()
+        return {"entries": entries, "bytes": total}
+
+_default_cache = SharedInstance(lambda: CompletionCache(
+    db_path=os.getenv("LLM_CACHE_PATH", "cache/llm_cache.sqlite3"),
+    ttl=int(os.getenv("LLM_CACHE_TTL", "86400")),
+    max_bytes=int(os.getenv("LLM_CACHE_MAX_MB", "100")) * 1024 * 1024
+), enabled_env="LLM_CACHE")
+
+def get_completion_cache() -> Optional[CompletionCache]:
+    """
+    環境変数の設定に基づく共有キャッシュを取得
+    LLM_CACHE=false の場合はNone（キャッシュ無効）
+    """
+    return _default_cache.get()
+
+if __name__ == "__main__":
+    import sys
+
+    cache = CompletionCache(db_path=os.getenv("LLM_CACHE_PATH", "cache/llm_cache.sqlite3"))
+    if len(sys.argv) > 1 and sys.argv[1] == "clear":
+        cache.clear()
+        print("✅ LLMキャッシュを削除しました")
+    else:
+        stats = cache.stats()
+        print(f"📦 LLMキャッシュ: {stats['entries']}件 / {stats['bytes'] / 1024:.1f}KB")
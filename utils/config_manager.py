@@ -5,26 +5,29 @@ wp-auto用の統一設定管理
 
 import os
 import json
+import multiprocessing
 from typing import Dict, Any, Optional, List
 from dotenv import load_dotenv
 
 class ConfigManager:
     """wp-auto用の設定管理クラス"""
     
-    def __init__(self, env_file: str = ".env"):
+    def __init__(self, env_file: str = ".env", verbose: bool = True):
         """
         設定管理器の初期化
         
         Args:
             env_file: .envファイルのパス
+            verbose: Falseの場合は読み込み結果を表示しない
         """
         self.env_file = env_file
         
         # .envファイルを読み込み
         if os.path.exists(env_file):
             load_dotenv(env_file)
-            print(f"✅ 環境変数ファイル読み込み: {env_file}")
-        else:
+            if verbose:
+                print(f"✅ 環境変数ファイル読み込み: {env_file}")
+        elif verbose:
             print(f"⚠️ 環境変数ファイルが見つかりません: {env_file}")
             print("   .envファイルを作成してください。")
     
@@ -203,7 +206,9 @@ NUM_SECTIONS=5
         print("   このファイルをコピーして.envファイルを作成し、適切な値を設定してください。")
 
 # グローバルインスタンス
-config_manager = ConfigManager()
+# （画像変換のプロセスプールなど spawn で起動した子プロセスは起動時に呼び出し元のスクリプトを読み込み直すため、
+#   読み込み結果はメインプロセスでだけ表示する）
+config_manager = ConfigManager(verbose=multiprocessing.current_process().name == "MainProcess")
 
 if __name__ == "__main__":
     import sys
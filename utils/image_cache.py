@@ -0,0 +1,253 @@
+"""
+生成画像の再利用キャッシュ
+正規化した見出し（またはプロンプト）のハッシュをキーに、生成画像のバイト列と
+サイトごとのWordPressメディアID・source_url をSQLiteへ保存する
+"""
+
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import unicodedata
+from typing import Dict, Optional, Tuple
+
+from utils.shared_instance import SharedInstance
+from utils.sqlite_store import SQLiteStore
+
+class ImageCache(SQLiteStore):
+    """生成画像とWordPressメディアの対応表（鮮度・サイズ上限付きLRU）"""
+
+    def __init__(self,
+                 db_path: str = "cache/image_cache.sqlite3",
+                 max_age: int = 0,
+                 max_bytes: int = 500 * 1024 * 1024):
+        """
+        キャッシュの初期化
+
+        Args:
+            db_path: SQLiteファイルのパス
+            max_age: 再利用する画像の鮮度（秒）。これより古い画像は生成し直す。0以下の場合は無期限
+            max_bytes: 保存する画像の合計サイズ上限（超過時は最終利用が古い順に画像データを削除）
+        """
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+
+        super().__init__(db_path)
+
+    def _create_tables(self, conn: sqlite3.Connection):
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS images (
+                key TEXT PRIMARY KEY,
+                label TEXT NOT NULL,
+                data BLOB NOT NULL,
+                content_type TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS media (
+                key TEXT NOT NULL,
+                site TEXT NOT NULL,
+                media_id INTEGER NOT NULL,
+                source_url TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (key, site)
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_images_last_access ON images(last_access)")
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """
+        見出し・プロンプトを正規化（全角/半角・大文字/小文字・記号・絵文字・空白の違いを吸収）
+        """
+        text = unicodedata.normalize("NFKC", text).lower()
+        text = re.sub(r"[^\w\s]", " ", text)
+        return " ".join(text.split())
+
+    @classmethod
+    def make_key(cls, text: str) -> str:
+        """
+        見出し・プロンプトからキャッシュキーを作成
+
+        Returns:
+            正規化した文字列のSHA-256ハッシュ
+        """
+        return hashlib.sha256(cls.normalize(text).encode("utf-8")).hexdigest()
+
+    def _is_fresh(self, created_at: float, now: float) -> bool:
+        return self.max_age <= 0 or now - created_at <= self.max_age
+
+    def get_media(self, key: str, site: str) -> Optional[Tuple[int, str]]:
+        """
+        サイトにアップロード済みのメディアを取得
+
+        Args:
+            key: キャッシュキー
+            site: サイトURL
+
+        Returns:
+            (メディアID, source_url)。存在しない・鮮度切れの場合はNone
+        """
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT media_id, source_url, created_at FROM media WHERE key = ? AND site = ?", (key, site)
+            ).fetchone()
+            if row is None:
+                return None
+
+            media_id, source_url, created_at = row
+            if not self._is_fresh(created_at, now):
+                conn.execute("DELETE FROM media WHERE key = ? AND site = ?", (key, site))
+                return None
+
+            conn.execute("UPDATE images SET last_access = ? WHERE key = ?", (now, key))
+            return media_id, source_url
+
+    def set_media(self, key: str, site: str, media_id: int, source_url: str):
+        """
+        サイトにアップロードしたメディアを記録
+
+        Args:
+            key: キャッシュキー
+            site: サイトURL
+            media_id: WordPressのメディアID
+            source_url: メディアのURL
+        """
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO media (key, site, media_id, source_url, created_at) VALUES (?, ?, ?, ?, ?)",
+                (key, site, media_id, source_url, time.time())
+            )
+
+    def delete_media(self, key: str, site: str):
+        """サイトのメディア対応を削除（WordPress側でメディアが削除されていた場合など）"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM media WHERE key = ? AND site = ?", (key, site))
+
+    def get_image(self, key: str) -> Optional[Tuple[bytes, str]]:
+        """
+        生成済みの画像データを取得
+
+        Args:
+            key: キャッシュキー
+
+        Returns:
+            (画像データ, Content-Type)。存在しない・鮮度切れの場合はNone
+        """
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT data, content_type, created_at FROM images WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            data, content_type, created_at = row
+            if not self._is_fresh(created_at, now):
+                conn.execute("DELETE FROM images WHERE key = ?", (key,))
+                return None
+
+            conn.execute("UPDATE images SET last_access = ? WHERE key = ?", (now, key))
+            return bytes(data), content_type
+
+    def set_image(self, key: str, data: bytes, content_type: str = "image/png", label: str = ""):
+        """
+        生成した画像データを保存
+
+        Args:
+            key: キャッシュキー
+            data: 画像データ
+            content_type: 画像のContent-Type
+            label: 元の見出し・プロンプト（確認用）
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO images (key, label, data, content_type, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, label, data, content_type, len(data), now, now)
+            )
+            self._evict(conn, now)
+
+    def has(self, key: str, site: str) -> bool:
+        """サイトのメディアまたは画像データのどちらかが再利用できるか"""
+        now = time.time()
+        with self._connect() as conn:
+            for table, condition, params in (("media", "key = ? AND site = ?", (key, site)),
+                                             ("images", "key = ?", (key,))):
+                row = conn.execute(f"SELECT created_at FROM {table} WHERE {condition}", params).fetchone()
+                if row is not None and self._is_fresh(row[0], now):
+                    return True
+        return False
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        """鮮度切れのエントリとサイズ上限を超えた画像データ（LRU順）を削除"""
+        if self.max_age > 0:
+            conn.execute("DELETE FROM images WHERE created_at < ?", (now - self.max_age,))
+            conn.execute("DELETE FROM media WHERE created_at < ?", (now - self.max_age,))
+
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM images").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        # メディアIDの対応は小さいので残す（アップロード済みのサイトでは引き続き再利用できる）
+        for key, size in conn.execute(
+            "SELECT key, size FROM images ORDER BY last_access ASC"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM images WHERE key = ?", (key,))
+            total -= size
+
+    def clear(self):
+        """キャッシュを全削除"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM images")
+            conn.execute("DELETE FROM media")
+
+    def stats(self) -> Dict[str, int]:
+        """
+        キャッシュの統計情報を取得
+
+        Returns:
+            画像数・合計サイズ・メディア対応数
+        """
+        with self._connect() as conn:
+            images, total = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM images"
+            ).fetchone()
+            media = conn.execute("SELECT COUNT(*) FROM media").fetchone()[0]
+        return {"images": images, "bytes": total, "media": media}
+
+_default_cache = SharedInstance(lambda: ImageCache(
+    db_path=os.getenv("IMAGE_CACHE_PATH", "cache/image_cache.sqlite3"),
+    max_age=int(float(os.getenv("IMAGE_CACHE_MAX_AGE_DAYS", "0")) * 86400),
+    max_bytes=int(os.getenv("IMAGE_CACHE_MAX_MB", "500")) * 1024 * 1024
+), enabled_env="IMAGE_CACHE")
+
+def get_image_cache() -> Optional[ImageCache]:
+    """
+    環境変数の設定に基づく共有画像キャッシュを取得
+    IMAGE_CACHE=false の場合はNone（キャッシュ無効）
+    """
+    return _default_cache.get()
+
+if __name__ == "__main__":
+    import sys
+
+    cache = ImageCache(db_path=os.getenv("IMAGE_CACHE_PATH", "cache/image_cache.sqlite3"))
+    if len(sys.argv) > 1 and sys.argv[1] == "clear":
+        cache.clear()
+        print("✅ 画像キャッシュを削除しました")
+    else:
+        stats = cache.stats()
+        print(f"🖼️ 画像キャッシュ: {stats['images']}枚 / {stats['bytes'] / 1024 / 1024:.1f}MB / メディア対応 {stats['media']}件")
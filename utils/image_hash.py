@@ -0,0 +1,206 @@
+"""
+生成画像の知覚ハッシュ（aHash / dHash）による重複検出
+見た目がほぼ同じ画像を、同じ記事内とサイトのメディアライブラリ（サイトごとの索引）から探す
+"""
+
+import io
+import os
+import time
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from utils.shared_instance import SharedInstance
+from utils.sqlite_store import SQLiteStore
+
+HASH_SIZE = 8
+
+def image_hashes(data: bytes) -> Tuple[int, int]:
+    """
+    画像の知覚ハッシュを計算（プロセスプールから呼び出すためモジュール直下に定義）
+
+    Args:
+        data: 画像データ
+
+    Returns:
+        (aHash, dHash)。それぞれ64ビットの整数
+    """
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as img:
+        img.draft("L", (HASH_SIZE * 8, HASH_SIZE * 8))
+        gray = img.convert("L")
+
+    # aHash: 8x8に縮小し、平均より明るい画素を1にする
+    small = list(gray.resize((HASH_SIZE, HASH_SIZE), Image.Resampling.LANCZOS).tobytes())
+    average = sum(small) / len(small)
+    ahash = 0
+    for pixel in small:
+        ahash = (ahash << 1) | (1 if pixel > average else 0)
+
+    # dHash: 9x8に縮小し、横に隣り合う画素の明暗の向きを1ビットにする
+    wide = list(gray.resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.LANCZOS).tobytes())
+    dhash = 0
+    for row in range(HASH_SIZE):
+        for col in range(HASH_SIZE):
+            left = wide[row * (HASH_SIZE + 1) + col]
+            right = wide[row * (HASH_SIZE + 1) + col + 1]
+            dhash = (dhash << 1) | (1 if left > right else 0)
+    return ahash, dhash
+
+def hamming_distance(a: int, b: int) -> int:
+    """2つのハッシュの異なるビット数"""
+    return bin(a ^ b).count("1")
+
+def hash_distance(a: Tuple[int, int], b: Tuple[int, int]) -> int:
+    """aHash・dHash の距離の大きい方（両方が近い場合だけ近いとみなす）"""
+    return max(hamming_distance(a[0], b[0]), hamming_distance(a[1], b[1]))
+
+class ArticleImageHashes:
+    """1記事分の画像ハッシュと使用中のメディアID（見出しごとの並列処理の間で共有）"""
+
+    def __init__(self, threshold: int = 6):
+        """
+        Args:
+            threshold: ほぼ同じ画像とみなすハッシュ距離の上限
+        """
+        self.threshold = threshold
+        self._hashes: List[Tuple[int, int]] = []
+        self._media_ids = set()
+        self._lock = threading.Lock()
+
+    def claim(self, hashes: Tuple[int, int]) -> bool:
+        """
+        記事内にほぼ同じ画像がなければハッシュを登録
+
+        Returns:
+            登録できた場合はTrue、記事内にほぼ同じ画像がある場合はFalse
+        """
+        with self._lock:
+            if any(hash_distance(hashes, other) <= self.threshold for other in self._hashes):
+                return False
+            self._hashes.append(hashes)
+            return True
+
+    def release(self, hashes: Tuple[int, int]):
+        """登録したハッシュを取り消す（アップロードに失敗した場合など）"""
+        with self._lock:
+            if hashes in self._hashes:
+                self._hashes.remove(hashes)
+
+    def use_media(self, media_id: int) -> bool:
+        """
+        メディアをこの記事で使用済みにする
+
+        Returns:
+            まだ使っていなかった場合はTrue
+        """
+        with self._lock:
+            if media_id in self._media_ids:
+                return False
+            self._media_ids.add(media_id)
+            return True
+
+class ImageHashIndex(SQLiteStore):
+    """サイトごとにアップロード済みメディアの知覚ハッシュを保存する索引"""
+
+    def __init__(self, db_path: str = "cache/image_hashes.sqlite3", threshold: int = 6):
+        """
+        索引の初期化
+
+        Args:
+            db_path: SQLiteファイルのパス
+            threshold: ほぼ同じ画像とみなすハッシュ距離の上限（0〜64）
+        """
+        self.threshold = threshold
+
+        super().__init__(db_path)
+
+    def _create_tables(self, conn: sqlite3.Connection):
+        # SQLiteのINTEGERは符号付き64ビットのため、ハッシュは16進文字列で保存する
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS image_hashes (
+                site TEXT NOT NULL,
+                media_id INTEGER NOT NULL,
+                source_url TEXT NOT NULL,
+                ahash TEXT NOT NULL,
+                dhash TEXT NOT NULL,
+                label TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (site, media_id)
+            )
+            """
+        )
+
+    def find_similar(self, site: str, hashes: Tuple[int, int]) -> Optional[Tuple[int, str, str]]:
+        """
+        サイトにアップロード済みの、ほぼ同じ画像を探す
+
+        Args:
+            site: サイトURL
+            hashes: (aHash, dHash)
+
+        Returns:
+            最も近い画像の (メディアID, source_url, 見出し)。見つからない場合はNone
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT media_id, source_url, ahash, dhash, label FROM image_hashes WHERE site = ?", (site,)
+            ).fetchall()
+
+        best = None
+        best_distance = self.threshold + 1
+        for media_id, source_url, ahash, dhash, label in rows:
+            distance = hash_distance(hashes, (int(ahash, 16), int(dhash, 16)))
+            if distance < best_distance:
+                best, best_distance = (media_id, source_url, label), distance
+        return best
+
+    def add(self, site: str, media_id: int, source_url: str, hashes: Tuple[int, int], label: str = ""):
+        """
+        アップロードしたメディアのハッシュを記録
+
+        Args:
+            site: サイトURL
+            media_id: WordPressのメディアID
+            source_url: メディアのURL
+            hashes: (aHash, dHash)
+            label: 見出し（確認用）
+        """
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO image_hashes (site, media_id, source_url, ahash, dhash, label, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (site, media_id, source_url, f"{hashes[0]:016x}", f"{hashes[1]:016x}", label, time.time())
+            )
+
+    def remove(self, site: str, media_id: int):
+        """メディアを索引から削除（WordPress側で削除されていた場合など）"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM image_hashes WHERE site = ? AND media_id = ?", (site, media_id))
+
+    def stats(self) -> Dict[str, int]:
+        """
+        索引の統計情報を取得
+
+        Returns:
+            サイト数・メディア数
+        """
+        with self._connect() as conn:
+            sites, media = conn.execute(
+                "SELECT COUNT(DISTINCT site), COUNT(*) FROM image_hashes"
+            ).fetchone()
+        return {"sites": sites, "media": media}
+
+_default_index = SharedInstance(lambda: ImageHashIndex(
+    db_path=os.getenv("IMAGE_DEDUP_PATH", "cache/image_hashes.sqlite3"),
+    threshold=int(os.getenv("IMAGE_DEDUP_THRESHOLD", "6"))
+), enabled_env="IMAGE_DEDUP")
+
+def get_image_hash_index() -> Optional[ImageHashIndex]:
+    """
+    環境変数の設定に基づく共有ハッシュ索引を取得
+    IMAGE_DEDUP=false の場合はNone（重複検出なし）
+    """
+    return _default_index.get()
@@ -0,0 +1,269 @@
+"""
+見出し画像の後追い処理（バックフィル）用ジョブキュー
+本文を先に投稿し、見出しごとの画像生成・アップロード・記事への反映を後から行うためのジョブをSQLiteに保存する
+
+ジョブの状態: pending（未処理）→ uploaded（メディアをアップロード済み・記事に未反映）→ done（反映済み）
+失敗した場合は pending に戻して再試行の待ち時間（試行ごとに倍増）だけ占有を延ばし、試行回数の上限に達したら failed にする。
+処理中のジョブは記事単位でリース（期限付きの占有）を取り、期限切れのジョブは別のワーカーが引き継ぐ。
+占有の期限は占有の確認にも使い、引き継がれた後の更新は LeaseLostError で中断する
+"""
+
+import os
+import time
+import sqlite3
+from typing import Any, Dict, Iterable, List, Optional
+
+from utils.shared_instance import SharedInstance
+from utils.sqlite_store import SQLiteStore
+
+class LeaseLostError(Exception):
+    """記事の占有が期限切れになり、別のワーカーに引き継がれた"""
+
+class ImageJobQueue(SQLiteStore):
+    """見出し画像ジョブの永続キュー"""
+
+    row_factory = sqlite3.Row
+
+    def __init__(self, db_path: str = "cache/image_jobs.sqlite3", max_attempts: int = 3, retry_backoff: float = 60):
+        """
+        キューの初期化
+
+        Args:
+            db_path: SQLiteファイルのパス
+            max_attempts: 1ジョブあたりの最大試行回数（超えたら failed）
+            retry_backoff: 失敗したジョブを再試行するまでの待ち時間（秒。試行ごとに倍増）
+        """
+        self.max_attempts = max(1, max_attempts)
+        self.retry_backoff = max(0.0, retry_backoff)
+
+        super().__init__(db_path)
+
+    def _create_tables(self, conn: sqlite3.Connection):
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS image_jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                site TEXT NOT NULL,
+                post_id INTEGER NOT NULL,
+                position INTEGER NOT NULL,
+                heading TEXT NOT NULL,
+                slot TEXT NOT NULL,
+                publish_status TEXT,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                media_id INTEGER,
+                source_url TEXT,
+                error TEXT,
+                lease_until REAL NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                UNIQUE (site, post_id, position)
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_image_jobs_status ON image_jobs(site, status)")
+
+    def enqueue(self, site: str, post_id: int, headings: List[str], publish_status: Optional[str] = None) -> int:
+        """
+        記事の見出しごとに画像ジョブを登録（同じ記事・同じ位置のジョブは重複登録しない）
+
+        Args:
+            site: サイトURL
+            post_id: WordPressの投稿ID
+            headings: h2見出しのテキスト（先頭の見出しの画像がアイキャッチ画像になる）
+            publish_status: 全ジョブの完了後に設定する投稿ステータス（下書きで投稿した場合など。Noneで変更しない）
+
+        Returns:
+            新たに登録したジョブ数
+        """
+        now = time.time()
+        with self._connect() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO image_jobs "
+                "(site, post_id, position, heading, slot, publish_status, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(site, post_id, position, heading, "featured" if position == 0 else "inline",
+                  publish_status, now, now)
+                 for position, heading in enumerate(headings)]
+            )
+            return conn.total_changes - before
+
+    def claim_post(self,
+                   site: str,
+                   lease_seconds: float = 600,
+                   post_id: Optional[int] = None,
+                   exclude: Iterable[int] = ()) -> List[Dict[str, Any]]:
+        """
+        未完了のジョブがある記事を1件選び、その記事の未完了ジョブをまとめて占有
+        （同じ記事の本文を複数のワーカーが同時に書き換えないよう記事単位で占有する）
+
+        Args:
+            site: サイトURL
+            lease_seconds: 占有の期限（秒）。期限を過ぎたジョブは処理が止まったとみなして別のワーカーが引き継ぐ
+            post_id: 対象の投稿ID（省略時は最も古い記事）
+            exclude: 対象外の投稿ID（この実行で処理済みの記事など）
+
+        Returns:
+            占有したジョブ（位置順）。対象がない場合は空リスト。
+            各ジョブの lease_until（占有の期限）を以降の更新に渡し、占有が続いているかを確認する
+        """
+        now = time.time()
+        condition = "site = ? AND status IN ('pending', 'uploaded')"
+        params: list = [site]
+        if post_id is not None:
+            condition += " AND post_id = ?"
+            params.append(post_id)
+        exclude = list(exclude)
+        if exclude:
+            condition += f" AND post_id NOT IN ({', '.join('?' * len(exclude))})"
+            params.extend(exclude)
+
+        # 選択と占有の間に他のワーカーが割り込まないよう書き込みロックを取る
+        with self._write_lock() as conn:
+            row = conn.execute(
+                f"SELECT post_id FROM image_jobs WHERE {condition} GROUP BY post_id "
+                "HAVING MAX(lease_until) < ? ORDER BY MIN(created_at) LIMIT 1",
+                params + [now]
+            ).fetchone()
+            if row is None:
+                return []
+
+            conn.execute(
+                "UPDATE image_jobs SET lease_until = ?, updated_at = ? "
+                "WHERE site = ? AND post_id = ? AND status IN ('pending', 'uploaded')",
+                (now + lease_seconds, now, site, row["post_id"])
+            )
+            jobs = conn.execute(
+                "SELECT * FROM image_jobs WHERE site = ? AND post_id = ? AND status IN ('pending', 'uploaded') "
+                "ORDER BY position",
+                (site, row["post_id"])
+            ).fetchall()
+        return [dict(job) for job in jobs]
+
+    def renew(self, site: str, post_id: int, lease: float, lease_seconds: float = 600) -> float:
+        """
+        記事の占有を延長（反映のたびに延長し、画像の多い記事の処理中に期限が切れないようにする）
+
+        Args:
+            site: サイトURL
+            post_id: 投稿ID
+            lease: 占有時・前回の延長時の期限（占有の確認に使う）
+            lease_seconds: 延長後の期限（秒）
+
+        Returns:
+            新しい期限（以降の更新ではこの値を lease に渡す）
+        """
+        new_lease = time.time() + lease_seconds
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE image_jobs SET lease_until = ? "
+                "WHERE site = ? AND post_id = ? AND status IN ('pending', 'uploaded') AND lease_until = ?",
+                (new_lease, site, post_id, lease)
+            )
+            if cursor.rowcount == 0:
+                raise LeaseLostError(f"投稿ID {post_id} の占有が失われました")
+        return new_lease
+
+    def _update_leased(self, conn: sqlite3.Connection, job_id: int, lease: float, sql: str, params: tuple):
+        """占有中のジョブだけを更新（期限切れで別のワーカーが占有し直していれば LeaseLostError）"""
+        cursor = conn.execute(f"{sql} WHERE id = ? AND lease_until = ?", params + (job_id, lease))
+        if cursor.rowcount == 0:
+            raise LeaseLostError(f"ジョブ {job_id} の占有が失われました")
+
+    def mark_uploaded(self, job_id: int, media_id: int, source_url: str, lease: float):
+        """メディアのアップロード完了を記録（記事への反映前に落ちても再アップロードしない）"""
+        with self._connect() as conn:
+            self._update_leased(
+                conn, job_id, lease,
+                "UPDATE image_jobs SET status = 'uploaded', media_id = ?, source_url = ?, error = NULL, updated_at = ?",
+                (media_id, source_url, time.time())
+            )
+
+    def complete(self, job_id: int, lease: float):
+        """記事への反映完了を記録"""
+        with self._connect() as conn:
+            self._update_leased(
+                conn, job_id, lease,
+                "UPDATE image_jobs SET status = 'done', lease_until = 0, updated_at = ?",
+                (time.time(),)
+            )
+
+    def fail(self, job_id: int, error: str, lease: float, permanent: bool = False):
+        """
+        失敗を記録（試行回数の上限まではアップロード前の状態に戻し、再試行の待ち時間が過ぎたら再試行対象にする）
+
+        Args:
+            job_id: ジョブID
+            error: エラー内容
+            lease: 占有の期限（claim_post・renew の値）
+            permanent: Trueの場合は再試行せず failed にする（記事が削除されていた場合など）
+        """
+        now = time.time()
+        with self._connect() as conn:
+            self._update_leased(
+                conn, job_id, lease,
+                "UPDATE image_jobs SET attempts = attempts + 1, error = ?, updated_at = ?, "
+                "lease_until = CASE WHEN ? OR attempts + 1 >= ? THEN 0 ELSE ? * (1 << attempts) + ? END, "
+                "status = CASE WHEN ? OR attempts + 1 >= ? THEN 'failed' "
+                "WHEN media_id IS NOT NULL THEN 'uploaded' ELSE 'pending' END",
+                (error[:1000], now, permanent, self.max_attempts, self.retry_backoff, now,
+                 permanent, self.max_attempts)
+            )
+
+    def release(self, site: str, post_id: int, lease: float):
+        """記事の占有を解除（処理を中断した場合。別のワーカーが占有し直したジョブには触れない）"""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE image_jobs SET lease_until = 0 WHERE site = ? AND post_id = ? AND lease_until = ?",
+                (site, post_id, lease)
+            )
+
+    def post_jobs(self, site: str, post_id: int) -> List[Dict[str, Any]]:
+        """記事の全ジョブ（位置順）"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM image_jobs WHERE site = ? AND post_id = ? ORDER BY position", (site, post_id)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def is_finished(self, site: str, post_id: int) -> bool:
+        """記事のジョブがすべて完了（done / failed）したか"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT COUNT(*) FROM image_jobs WHERE site = ? AND post_id = ? AND status IN ('pending', 'uploaded')",
+                (site, post_id)
+            ).fetchone()
+        return row[0] == 0
+
+    def stats(self, site: Optional[str] = None) -> Dict[str, int]:
+        """
+        状態ごとのジョブ数
+
+        Args:
+            site: サイトURL（省略時は全サイト）
+        """
+        with self._connect() as conn:
+            if site is None:
+                rows = conn.execute("SELECT status, COUNT(*) FROM image_jobs GROUP BY status").fetchall()
+            else:
+                rows = conn.execute(
+                    "SELECT status, COUNT(*) FROM image_jobs WHERE site = ? GROUP BY status", (site,)
+                ).fetchall()
+        stats = {"pending": 0, "uploaded": 0, "done": 0, "failed": 0}
+        stats.update({row[0]: row[1] for row in rows})
+        return stats
+
+_default_queue = SharedInstance(lambda: ImageJobQueue(
+    db_path=os.getenv("IMAGE_JOBS_PATH", "cache/image_jobs.sqlite3"),
+    max_attempts=int(os.getenv("IMAGE_JOBS_MAX_ATTEMPTS", "3")),
+    retry_backoff=float(os.getenv("IMAGE_JOBS_RETRY_BACKOFF_SECONDS", "60"))
+))
+
+def get_image_job_queue() -> ImageJobQueue:
+    """
+    環境変数の設定に基づく共有ジョブキューを取得
+    IMAGE_JOBS_PATH で保存先、IMAGE_JOBS_MAX_ATTEMPTS で最大試行回数、
+    IMAGE_JOBS_RETRY_BACKOFF_SECONDS で再試行までの待ち時間を設定
+    """
+    return _default_queue.get()
@@ -0,0 +1,70 @@
+"""
+画像生成の用途（スロット）ごとのティア設定
+アイキャッチ・本文中の見出し画像・フォールバック用に、モデル・サイズ・画質・タイムアウトを使い分け、
+記事の所要時間の予算（ARTICLE_LATENCY_BUDGET）が残り少ない場合は安価で小さいティアに切り替える
+"""
+
+import os
+from typing import Any, Dict, Optional
+
+# ティアごとの既定値（timeout は1回の呼び出しの読み取りタイムアウト秒数）
+# 本文中の画像は 800x600 に縮小されるため 1024x1024 で十分。フォールバックは DALL·E 2 の 512x512
+DEFAULT_TIERS = {
+    "featured": {"model": "dall-e-3", "size": "1792x1024", "quality": "standard", "timeout": 90.0},
+    "inline": {"model": "dall-e-3", "size": "1024x1024", "quality": "standard", "timeout": 60.0},
+    "fallback": {"model": "dall-e-2", "size": "512x512", "quality": "standard", "timeout": 30.0}
+}
+
+# DALL·E 2 のプロンプトの最大文字数
+DALLE2_PROMPT_LIMIT = 1000
+
+def get_image_tier(name: str) -> Dict[str, Any]:
+    """
+    ティアの設定を取得
+    IMAGE_TIER_<ティア>_MODEL / _SIZE / _QUALITY / _TIMEOUT で上書き可能（例: IMAGE_TIER_INLINE_SIZE=1792x1024）
+
+    Args:
+        name: featured / inline / fallback
+    """
+    tier = dict(DEFAULT_TIERS.get(name, DEFAULT_TIERS["inline"]))
+    for field in ("model", "size", "quality", "timeout"):
+        value = os.getenv(f"IMAGE_TIER_{name.upper()}_{field.upper()}")
+        if value:
+            tier[field] = float(value) if field == "timeout" else value
+    tier["name"] = name
+    return tier
+
+def select_image_tier(slot: str, remaining: Optional[float] = None) -> Dict[str, Any]:
+    """
+    用途に合うティアを選択（残り時間に用途のティアのタイムアウトが収まらない場合は fallback）
+
+    Args:
+        slot: featured / inline / fallback
+        remaining: 記事の所要時間の予算の残り秒数（Noneで無制限）
+    """
+    tier = get_image_tier(slot)
+    if slot != "fallback" and remaining is not None and tier["timeout"] > remaining:
+        print(f"⏱️ 残り時間が{max(0.0, remaining):.0f}秒のため {slot} ではなく fallback ティアで画像を生成します")
+        return get_image_tier("fallback")
+    return tier
+
+def image_request_params(tier: Dict[str, Any], image_prompt: str) -> Dict[str, Any]:
+    """
+    images.generate に渡すティアごとの引数
+
+    Returns:
+        model・prompt・size・timeout（DALL·E 3 の場合は quality も）
+    """
+    params = {"model": tier["model"], "size": tier["size"], "timeout": tier["timeout"]}
+    if tier["model"] == "dall-e-2":
+        params["prompt"] = image_prompt[:DALLE2_PROMPT_LIMIT]
+    else:
+        params["prompt"] = image_prompt
+        params["quality"] = tier["quality"]
+    return params
+
+def fallback_tier(tier: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """ティアでの生成に失敗したときに切り替えるティア（既に fallback の場合はNone）"""
+    if tier["name"] == "fallback" or os.getenv("IMAGE_TIER_FALLBACK_ON_ERROR", "true").lower() != "true":
+        return None
+    return get_image_tier("fallback")
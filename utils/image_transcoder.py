@@ -0,0 +1,231 @@
+"""
+画像のトランスコード（デコード・縮小・エンコード）
+CPU負荷の高い処理をプロセスプールで実行し、並列処理中もGILを奪い合わないようにする
+"""
+
+import io
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Tuple
+
+from utils.shared_instance import SharedInstance
+
+# 出力形式ごとのContent-Typeと拡張子
+IMAGE_FORMATS = {
+    "AVIF": ("image/avif", "avif"),
+    "WEBP": ("image/webp", "webp"),
+    "JPEG": ("image/jpeg", "jpg"),
+    "PNG": ("image/png", "png")
+}
+
+# 画像の用途（スロット）ごとの既定値: 最大サイズと目標バイト数（KB、0で指定なし）
+DEFAULT_SLOTS = {
+    "featured": {"max_size": (1200, 675), "target_kb": 150},
+    "inline": {"max_size": (800, 600), "target_kb": 80}
+}
+
+def _is_supported(image_format: str) -> bool:
+    """インストールされているPillowで書き出せる形式か"""
+    from PIL import Image, features
+
+    Image.init()
+    if image_format not in Image.SAVE:
+        return False
+    if image_format in ("WEBP", "AVIF"):
+        try:
+            return bool(features.check(image_format.lower()))
+        except ValueError:
+            return False
+    return True
+
+def resolve_format(image_format: str) -> str:
+    """
+    出力形式を決定（AVIF → WEBP → JPEG の順に、書き出せる形式にフォールバック）
+    """
+    image_format = image_format.upper().replace("JPG", "JPEG")
+    candidates = {"AVIF": ["AVIF", "WEBP", "JPEG"], "WEBP": ["WEBP", "JPEG"]}.get(image_format, [image_format, "JPEG"])
+    for candidate in candidates:
+        if candidate in IMAGE_FORMATS and _is_supported(candidate):
+            return candidate
+    return "JPEG"
+
+def detect_content_type(data: bytes) -> str:
+    """画像データの先頭バイトからContent-Typeを判定（判定できない場合は image/jpeg）"""
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return "image/png"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    if data[4:12] in (b"ftypavif", b"ftypavis"):
+        return "image/avif"
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    return "image/jpeg"
+
+def _encode(img, image_format: str, quality: int) -> bytes:
+    buffer = io.BytesIO()
+    if image_format == "JPEG":
+        img.save(buffer, format="JPEG", quality=quality, optimize=True, progressive=True)
+    elif image_format == "WEBP":
+        img.save(buffer, format="WEBP", quality=quality, method=4)
+    elif image_format == "AVIF":
+        img.save(buffer, format="AVIF", quality=quality)
+    else:
+        img.save(buffer, format=image_format, optimize=True)
+    return buffer.getvalue()
+
+def transcode_image(data: bytes,
+                    max_size: Tuple[int, int] = (800, 600),
+                    image_format: str = "WEBP",
+                    quality: int = 82,
+                    target_bytes: int = 0,
+                    min_quality: int = 50) -> Dict[str, Any]:
+    """
+    画像を縮小して再エンコード（プロセスプールから呼び出すためモジュール直下に定義）
+    JPEGは draft でデコード時に縮小し、それ以外は reduce で整数倍に粗く縮小してから LANCZOS で仕上げる
+    target_bytes を指定した場合は、そのサイズに収まる最も高い画質を二分探索する
+
+    Args:
+        data: 元画像のデータ
+        max_size: 最大サイズ（アスペクト比は保持）
+        image_format: 出力形式（AVIF / WEBP / JPEG / PNG。書き出せない場合はフォールバック）
+        quality: 画質の上限
+        target_bytes: 目標バイト数（0で指定なし）
+        min_quality: 目標バイト数を目指すときの画質の下限
+
+    Returns:
+        data（エンコード後のデータ）・format・content_type・extension・quality・original_size・size
+    """
+    from PIL import Image
+
+    image_format = resolve_format(image_format)
+    with Image.open(io.BytesIO(data)) as img:
+        original_size = img.size
+        # JPEGはDCTのスケーリングで縮小しながらデコードする（全画素をデコードしない）
+        img.draft("RGB", max_size)
+
+        factor = min(img.width // max_size[0], img.height // max_size[1])
+        resized = img.reduce(factor) if factor >= 2 else img
+        resized.thumbnail(max_size, Image.Resampling.LANCZOS)
+
+        if image_format == "JPEG" and resized.mode != "RGB":
+            resized = resized.convert("RGB")
+        elif resized.mode not in ("RGB", "RGBA"):
+            resized = resized.convert("RGBA" if "A" in resized.getbands() else "RGB")
+
+        encoded = _encode(resized, image_format, quality)
+        chosen_quality = quality
+        if target_bytes > 0 and len(encoded) > target_bytes and image_format != "PNG":
+            # 目標サイズに収まる最も高い画質を二分探索（収まらない場合は下限の画質）
+            low, high = min_quality, quality - 1
+            best = None
+            while low <= high:
+                middle = (low + high) // 2
+                candidate = _encode(resized, image_format, middle)
+                if len(candidate) <= target_bytes:
+                    best = (candidate, middle)
+                    low = middle + 1
+                else:
+                    high = middle - 1
+            encoded, chosen_quality = best or (_encode(resized, image_format, min_quality), min_quality)
+
+        content_type, extension = IMAGE_FORMATS[image_format]
+        return {
+            "data": encoded,
+            "format": image_format,
+            "content_type": content_type,
+            "extension": extension,
+            "quality": chosen_quality,
+            "original_size": original_size,
+            "size": resized.size
+        }
+
+def get_slot_settings(slot: str = "inline") -> Dict[str, Any]:
+    """
+    画像の用途（featured / inline）ごとの変換設定を取得
+    IMAGE_FORMAT・IMAGE_QUALITY・IMAGE_MIN_QUALITY と、
+    IMAGE_<スロット>_MAX_SIZE（例: 1200x675）・IMAGE_<スロット>_TARGET_KB で上書き可能
+    """
+    defaults = DEFAULT_SLOTS.get(slot, DEFAULT_SLOTS["inline"])
+    max_size = defaults["max_size"]
+    size_value = os.getenv(f"IMAGE_{slot.upper()}_MAX_SIZE")
+    if size_value:
+        width, height = size_value.lower().split("x", 1)
+        max_size = (int(width), int(height))
+
+    return {
+        "max_size": max_size,
+        "image_format": os.getenv("IMAGE_FORMAT", "webp"),
+        "quality": int(os.getenv("IMAGE_QUALITY", "82")),
+        "min_quality": int(os.getenv("IMAGE_MIN_QUALITY", "50")),
+        "target_bytes": int(os.getenv(f"IMAGE_{slot.upper()}_TARGET_KB", str(defaults["target_kb"]))) * 1024
+    }
+
+class ImageTranscoder:
+    """画像トランスコードをプロセスプールで実行するクラス"""
+
+    def __init__(self, max_workers: int = 2, use_pool: bool = True):
+        """
+        トランスコーダーの初期化
+
+        Args:
+            max_workers: プロセス数
+            use_pool: Falseの場合は呼び出し元のプロセスで実行
+        """
+        self.max_workers = max(1, max_workers)
+        self.use_pool = use_pool
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # 呼び出し元にはイベントループなどのスレッドがあるため fork ではなく spawn で起動する
+                # （spawn の子プロセスは起動時に呼び出し元のスクリプトを読み込み直すため、起動は最初の変換時の1回だけにする）
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    def run(self, func: Callable[..., Any], data: bytes, **kwargs) -> Any:
+        """
+        画像処理関数をプロセスプールで実行（func はモジュール直下に定義した関数）
+        プロセスプールが使えない場合は呼び出し元のプロセスで実行する
+        """
+        if not self.use_pool:
+            return func(data, **kwargs)
+
+        try:
+            return self._get_executor().submit(func, data, **kwargs).result()
+        except (BrokenProcessPool, OSError) as e:
+            print(f"⚠️ 画像変換プロセスが利用できません（このプロセスで変換します）: {e}")
+            self.shutdown()
+            return func(data, **kwargs)
+
+    def transcode(self, data: bytes, **kwargs) -> Dict[str, Any]:
+        """画像を縮小して再エンコード（引数・戻り値は transcode_image と同じ）"""
+        return self.run(transcode_image, data, **kwargs)
+
+    def shutdown(self):
+        """プロセスプールを停止"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+def _create_image_transcoder() -> ImageTranscoder:
+    """環境変数の設定からトランスコーダーを作成"""
+    workers = int(os.getenv("IMAGE_TRANSCODE_WORKERS", str(min(4, os.cpu_count() or 1))))
+    return ImageTranscoder(max_workers=workers, use_pool=workers > 0)
+
+_default_transcoder = SharedInstance(_create_image_transcoder)
+
+def get_image_transcoder() -> ImageTranscoder:
+    """
+    環境変数の設定に基づく共有トランスコーダーを取得
+    IMAGE_TRANSCODE_WORKERS でプロセス数（0で呼び出し元のプロセスで実行）
+    """
+    return _default_transcoder.get()
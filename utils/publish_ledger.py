@@ -0,0 +1,173 @@
+"""
+記事投稿の冪等化台帳
+投稿前に記事の指紋（キーワードグループ・スラッグ・本文のハッシュ）と予定のスラッグを記録し、
+投稿後に投稿ID・URLを書き込む。投稿がタイムアウトしてWordPress側では作成済みだった場合でも、
+再試行・次回のcron実行は新規投稿せず既存の投稿の更新になる。
+同じ記事を複数のワーカーが同時に投稿しないよう、投稿中の記事は期限付きで占有する
+"""
+
+import os
+import time
+import hashlib
+import sqlite3
+from typing import Any, Dict, Optional, Tuple
+
+from utils.shared_instance import SharedInstance
+from utils.sqlite_store import SQLiteStore
+
+def article_fingerprint(keyword_group: str, slug: str, content: str) -> Tuple[str, str]:
+    """
+    記事の指紋を計算
+
+    Args:
+        keyword_group: キーワードグループ（グループIDやキーワード）
+        slug: 予定のスラッグ
+        content: 本文のHTML
+
+    Returns:
+        (指紋, 本文のハッシュ)
+    """
+    content_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()
+    fingerprint = hashlib.sha256(f"{keyword_group}\n{slug}\n{content_hash}".encode("utf-8")).hexdigest()
+    return fingerprint, content_hash
+
+class PublishLedger(SQLiteStore):
+    """記事の指紋と投稿IDの対応（サイトごと）"""
+
+    row_factory = sqlite3.Row
+
+    def __init__(self, db_path: str = "cache/publish_ledger.sqlite3"):
+        """
+        台帳の初期化
+
+        Args:
+            db_path: SQLiteファイルのパス
+        """
+        super().__init__(db_path)
+
+    def _create_tables(self, conn: sqlite3.Connection):
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS publishes (
+                site TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                keyword_group TEXT NOT NULL,
+                slug TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                post_id INTEGER,
+                link TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                lease_until REAL NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (site, fingerprint)
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_publishes_slug ON publishes(site, slug)")
+
+    def claim(self,
+              site: str,
+              fingerprint: str,
+              keyword_group: str,
+              slug: str,
+              content_hash: str,
+              lease_seconds: float = 300) -> Optional[Dict[str, Any]]:
+        """
+        投稿前に記事を記録して占有
+
+        Args:
+            site: サイトURL
+            fingerprint: 記事の指紋
+            keyword_group: キーワードグループ
+            slug: 予定のスラッグ
+            content_hash: 本文のハッシュ
+            lease_seconds: 占有の期限（秒）。期限を過ぎた占有は投稿が止まったとみなして引き継ぐ
+
+        Returns:
+            占有前の記録（初回は attempts=0・post_id=None）。別のワーカーが投稿中の場合はNone
+        """
+        now = time.time()
+        # 確認と占有の間に他のワーカーが割り込まないよう書き込みロックを取る
+        with self._write_lock() as conn:
+            row = conn.execute(
+                "SELECT * FROM publishes WHERE site = ? AND fingerprint = ?", (site, fingerprint)
+            ).fetchone()
+            if row is not None and row["status"] == "pending" and row["lease_until"] > now:
+                return None
+
+            if row is None:
+                record = {
+                    "site": site, "fingerprint": fingerprint, "keyword_group": keyword_group, "slug": slug,
+                    "content_hash": content_hash, "status": "pending", "post_id": None, "link": None, "attempts": 0
+                }
+                conn.execute(
+                    "INSERT INTO publishes (site, fingerprint, keyword_group, slug, content_hash, attempts, "
+                    "lease_until, created_at, updated_at) VALUES (?, ?, ?, ?, ?, 1, ?, ?, ?)",
+                    (site, fingerprint, keyword_group, slug, content_hash, now + lease_seconds, now, now)
+                )
+            else:
+                record = dict(row)
+                conn.execute(
+                    "UPDATE publishes SET attempts = attempts + 1, lease_until = ?, updated_at = ? "
+                    "WHERE site = ? AND fingerprint = ?",
+                    (now + lease_seconds, now, site, fingerprint)
+                )
+        return record
+
+    def find_slug(self, site: str, slug: str) -> Optional[Dict[str, Any]]:
+        """スラッグで投稿済みの記録を検索（最新のもの）"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT * FROM publishes WHERE site = ? AND slug = ? AND post_id IS NOT NULL "
+                "ORDER BY updated_at DESC LIMIT 1",
+                (site, slug)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def record_post(self, site: str, fingerprint: str, post_id: int, link: str):
+        """投稿・更新の完了を記録して占有を解除"""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE publishes SET status = 'posted', post_id = ?, link = ?, lease_until = 0, updated_at = ? "
+                "WHERE site = ? AND fingerprint = ?",
+                (post_id, link, time.time(), site, fingerprint)
+            )
+
+    def release(self, site: str, fingerprint: str):
+        """占有を解除（投稿に失敗した場合。記録は残し、次回は既存投稿の有無を確認してから投稿する）"""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE publishes SET lease_until = 0, updated_at = ? WHERE site = ? AND fingerprint = ?",
+                (time.time(), site, fingerprint)
+            )
+
+    def stats(self, site: Optional[str] = None) -> Dict[str, int]:
+        """
+        状態ごとの記事数
+
+        Args:
+            site: サイトURL（省略時は全サイト）
+        """
+        with self._connect() as conn:
+            if site is None:
+                rows = conn.execute("SELECT status, COUNT(*) FROM publishes GROUP BY status").fetchall()
+            else:
+                rows = conn.execute(
+                    "SELECT status, COUNT(*) FROM publishes WHERE site = ? GROUP BY status", (site,)
+                ).fetchall()
+        stats = {"pending": 0, "posted": 0}
+        stats.update({row[0]: row[1] for row in rows})
+        return stats
+
+_default_ledger = SharedInstance(lambda: PublishLedger(
+    db_path=os.getenv("PUBLISH_LEDGER_PATH", "cache/publish_ledger.sqlite3")
+), enabled_env="PUBLISH_LEDGER")
+
+def get_publish_ledger() -> Optional[PublishLedger]:
+    """
+    環境変数の設定に基づく共有台帳を取得
+    PUBLISH_LEDGER=false の場合はNone（確認せずに新規投稿する）
+    """
+    return _default_ledger.get()
@@ -0,0 +1,200 @@
+"""
+OpenAI APIのプロセス間共有レートリミッター
+モデルごとにRPM（リクエスト数/分）とTPM（トークン数/分）のトークンバケットを
+ファイルロック付きの状態ファイルで管理し、同じマシン上のすべてのプロセスで共有する
+"""
+
+import os
+import json
+import time
+import fcntl
+import asyncio
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.shared_instance import SharedInstance
+
+# モデルごとの既定上限 (RPM, TPM)。TPMが0の場合はトークン数を制限しない
+DEFAULT_LIMITS = {
+    "gpt-4o": (500, 30000),
+    "gpt-3.5-turbo": (3500, 200000),
+    "dall-e-3": (5, 0),
+    "dall-e-2": (5, 0),
+    "*": (500, 30000)
+}
+
+def _parse_limits(value: str) -> Dict[str, int]:
+    """'gpt-4o=500,dall-e-3=5' 形式の設定を辞書に変換"""
+    limits = {}
+    for item in value.split(","):
+        if "=" not in item:
+            continue
+        model, number = item.split("=", 1)
+        limits[model.strip()] = int(number.strip())
+    return limits
+
+class RateLimiter:
+    """プロセス間で共有するモデル別トークンバケット"""
+
+    def __init__(self,
+                 state_file: str = "/tmp/wp-auto-ratelimit.json",
+                 limits: Optional[Dict[str, Tuple[int, int]]] = None,
+                 enabled: bool = True):
+        """
+        レートリミッターの初期化
+
+        Args:
+            state_file: バケットの状態を保存するファイル（全プロセスで共通のパスを指定）
+            limits: モデル名 → (RPM, TPM)。"*" はその他のモデルに適用
+            enabled: Falseの場合は待機せずにすべて許可
+        """
+        self.state_file = state_file
+        self.limits = dict(DEFAULT_LIMITS)
+        self.limits.update(limits or {})
+        self.enabled = enabled
+
+    def get_limits(self, model: str) -> Tuple[int, int]:
+        """モデルの (RPM, TPM) を取得"""
+        return self.limits.get(model) or self.limits["*"]
+
+    @staticmethod
+    def estimate_tokens(messages: Optional[List[Dict[str, Any]]], max_tokens: Optional[int] = None) -> int:
+        """
+        リクエストが消費するトークン数を見積もり（応答後に usage で補正する）
+        日本語は1文字≒1トークンとして、プロンプトの文字数に最大出力トークン数を加える
+
+        Args:
+            messages: 会話のメッセージリスト
+            max_tokens: 最大出力トークン数
+
+        Returns:
+            見積もりトークン数
+        """
+        prompt_chars = sum(len(str(m.get("content", ""))) + 4 for m in messages or [])
+        return prompt_chars + (max_tokens or 1000)
+
+    @contextmanager
+    def _locked_state(self):
+        """状態ファイルを排他ロックして読み書きする"""
+        directory = os.path.dirname(self.state_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with open(self.state_file, "a+", encoding="utf-8") as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                try:
+                    state = json.loads(f.read() or "{}")
+                except json.JSONDecodeError:
+                    state = {}
+                yield state
+                f.seek(0)
+                f.truncate()
+                json.dump(state, f)
+                f.flush()
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _refill(self, state: Dict[str, Any], model: str, now: float) -> Dict[str, float]:
+        """経過時間に応じてバケットを補充"""
+        rpm, tpm = self.get_limits(model)
+        bucket = state.get(model) or {"requests": float(rpm), "tokens": float(tpm), "updated": now}
+        elapsed = max(0.0, now - bucket["updated"])
+        bucket["requests"] = min(float(rpm), bucket["requests"] + elapsed * rpm / 60)
+        bucket["tokens"] = min(float(tpm), bucket["tokens"] + elapsed * tpm / 60)
+        bucket["updated"] = now
+        state[model] = bucket
+        return bucket
+
+    def _try_acquire(self, model: str, tokens: int) -> float:
+        """
+        バケットから消費を試みる
+
+        Returns:
+            取得できた場合は0、できない場合は再試行までの待機秒数
+        """
+        rpm, tpm = self.get_limits(model)
+        # 1回のリクエストがTPM上限を超える場合はバケットが満杯になるまで待てば通す
+        needed_tokens = min(tokens, tpm) if tpm > 0 else 0
+
+        with self._locked_state() as state:
+            bucket = self._refill(state, model, time.time())
+            if bucket["requests"] >= 1 and bucket["tokens"] >= needed_tokens:
+                bucket["requests"] -= 1
+                if tpm > 0:
+                    bucket["tokens"] -= tokens
+                return 0.0
+
+            wait = 0.0
+            if bucket["requests"] < 1:
+                wait = max(wait, (1 - bucket["requests"]) * 60 / rpm)
+            if tpm > 0 and bucket["tokens"] < needed_tokens:
+                wait = max(wait, (needed_tokens - bucket["tokens"]) * 60 / tpm)
+            return max(wait, 0.05)
+
+    def acquire(self, model: str, tokens: int = 0):
+        """
+        リクエスト1回分と見積もりトークン数を確保する（上限に達している場合は待機）
+
+        Args:
+            model: モデル名
+            tokens: 見積もりトークン数（画像生成など対象外の場合は0）
+        """
+        if not self.enabled:
+            return
+        while True:
+            wait = self._try_acquire(model, tokens)
+            if wait <= 0:
+                return
+            time.sleep(min(wait, 5.0))
+
+    async def acquire_async(self, model: str, tokens: int = 0):
+        """acquire の非同期版（待機中もイベントループを止めない）"""
+        if not self.enabled:
+            return
+        while True:
+            wait = self._try_acquire(model, tokens)
+            if wait <= 0:
+                return
+            await asyncio.sleep(min(wait, 5.0))
+
+    def record_usage(self, model: str, estimated_tokens: int, actual_tokens: int):
+        """
+        応答の usage で見積もりとの差分を補正する
+
+        Args:
+            model: モデル名
+            estimated_tokens: acquire 時に確保したトークン数
+            actual_tokens: 実際に消費したトークン数（失敗したリクエストは0）
+        """
+        if not self.enabled or self.get_limits(model)[1] <= 0:
+            return
+        with self._locked_state() as state:
+            bucket = self._refill(state, model, time.time())
+            bucket["tokens"] += estimated_tokens - actual_tokens
+
+def _create_rate_limiter() -> RateLimiter:
+    """環境変数の設定からレートリミッターを作成"""
+    limits = dict(DEFAULT_LIMITS)
+    rpm_limits = _parse_limits(os.getenv("OPENAI_RPM_LIMITS", ""))
+    tpm_limits = _parse_limits(os.getenv("OPENAI_TPM_LIMITS", ""))
+    for model in set(rpm_limits) | set(tpm_limits):
+        rpm, tpm = limits.get(model) or limits["*"]
+        limits[model] = (rpm_limits.get(model, rpm), tpm_limits.get(model, tpm))
+
+    return RateLimiter(
+        state_file=os.getenv("RATE_LIMIT_STATE_FILE", "/tmp/wp-auto-ratelimit.json"),
+        limits=limits,
+        enabled=os.getenv("RATE_LIMIT", "true").lower() == "true"
+    )
+
+_default_limiter = SharedInstance(_create_rate_limiter)
+
+def get_rate_limiter() -> RateLimiter:
+    """
+    環境変数の設定に基づく共有レートリミッターを取得
+    RATE_LIMIT=false の場合は制限しない
+    OPENAI_RPM_LIMITS / OPENAI_TPM_LIMITS で 'gpt-4o=500,dall-e-3=5' のようにモデル別上限を上書き
+    """
+    return _default_limiter.get()
@@ -0,0 +1,274 @@
+"""
+外部API呼び出しの共通リトライポリシー
+指数バックオフ＋ジッター、Retry-After の尊重、呼び出し種別ごとのタイムアウトと最大経過時間を提供する
+"""
+
+import os
+import time
+import random
+import asyncio
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
+
+import requests
+
+# 呼び出し種別ごとの既定値
+# 投稿・メディアなど冪等でない書き込みは、サーバーが処理していないことが明らかな応答（429/503・接続失敗）のみ再試行する
+DEFAULT_POLICIES = {
+    "openai_chat": {"max_attempts": 4, "base_delay": 1.0, "max_delay": 30.0, "max_elapsed": 180.0,
+                    "timeout": 120.0, "connect_timeout": 10.0},
+    "openai_image": {"max_attempts": 3, "base_delay": 2.0, "max_delay": 30.0, "max_elapsed": 300.0,
+                     "timeout": 180.0, "connect_timeout": 10.0},
+    "wp_read": {"max_attempts": 4, "base_delay": 0.5, "max_delay": 10.0, "max_elapsed": 60.0,
+                "timeout": 15.0, "connect_timeout": 5.0},
+    "wp_write": {"max_attempts": 3, "base_delay": 1.0, "max_delay": 15.0, "max_elapsed": 90.0,
+                 "timeout": 30.0, "connect_timeout": 5.0, "idempotent": False},
+    "wp_media": {"max_attempts": 3, "base_delay": 1.0, "max_delay": 15.0, "max_elapsed": 180.0,
+                 "timeout": 60.0, "connect_timeout": 5.0, "idempotent": False},
+    "download": {"max_attempts": 3, "base_delay": 0.5, "max_delay": 10.0, "max_elapsed": 60.0,
+                 "timeout": 30.0, "connect_timeout": 5.0}
+}
+
+RETRY_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+NON_IDEMPOTENT_RETRY_STATUSES = {429, 503}
+
+class RetryPolicy:
+    """1種類の外部呼び出しに適用するリトライ設定"""
+
+    def __init__(self,
+                 name: str = "default",
+                 max_attempts: int = 3,
+                 base_delay: float = 1.0,
+                 max_delay: float = 30.0,
+                 max_elapsed: float = 120.0,
+                 timeout: float = 30.0,
+                 connect_timeout: float = 5.0,
+                 idempotent: bool = True,
+                 retry_statuses: Optional[Iterable[int]] = None):
+        """
+        リトライポリシーの初期化
+
+        Args:
+            name: 呼び出し種別名（ログ表示用）
+            max_attempts: 最大試行回数（初回を含む）
+            base_delay: バックオフの基準秒数
+            max_delay: 1回の待機の上限秒数
+            max_elapsed: 初回からの経過時間の上限秒数（これを超える待機はせずに諦める）
+            timeout: 1回の呼び出しの読み取りタイムアウト秒数
+            connect_timeout: 接続タイムアウト秒数
+            idempotent: Falseの場合はサーバーで処理済みの可能性がある失敗（5xx・読み取りタイムアウト）を再試行しない
+            retry_statuses: 再試行するHTTPステータス
+        """
+        self.name = name
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_elapsed = max_elapsed
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.idempotent = idempotent
+        if retry_statuses is None:
+            retry_statuses = RETRY_STATUSES if idempotent else NON_IDEMPOTENT_RETRY_STATUSES
+        self.retry_statuses = set(retry_statuses)
+
+    @property
+    def requests_timeout(self) -> tuple:
+        """requests に渡す (接続, 読み取り) タイムアウト"""
+        return (self.connect_timeout, self.timeout)
+
+    @staticmethod
+    def parse_retry_after(headers: Optional[Any]) -> Optional[float]:
+        """
+        Retry-After（秒数またはHTTP日付）/ retry-after-ms ヘッダーから待機秒数を取得
+
+        Args:
+            headers: レスポンスヘッダー
+
+        Returns:
+            待機秒数。指定がない場合はNone
+        """
+        if not headers:
+            return None
+
+        retry_after_ms = headers.get("retry-after-ms")
+        if retry_after_ms:
+            try:
+                return max(0.0, float(retry_after_ms) / 1000)
+            except ValueError:
+                pass
+
+        retry_after = headers.get("retry-after")
+        if not retry_after:
+            return None
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    def compute_delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        次の試行までの待機秒数（フルジッター付き指数バックオフ。Retry-After があればそれ以上待つ）
+
+        Args:
+            attempt: 失敗した試行の番号（0始まり）
+            retry_after: サーバーが指定した待機秒数
+        """
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    def _is_retryable_status(self, status: Optional[int]) -> bool:
+        return status is not None and status in self.retry_statuses
+
+    def classify_exception(self, error: Exception) -> tuple:
+        """
+        例外が再試行可能かを判定
+
+        Returns:
+            (再試行可能か, Retry-Afterの秒数)
+        """
+        # 利用枠の不足による429は待っても解消しない
+        if getattr(error, "code", None) == "insufficient_quota":
+            return False, None
+
+        response = getattr(error, "response", None)
+        status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+        retry_after = self.parse_retry_after(getattr(response, "headers", None))
+        if status is not None:
+            return self._is_retryable_status(status), retry_after
+
+        # 接続自体ができなかった場合はサーバー側で処理されていないので常に再試行してよい
+        if isinstance(error, requests.exceptions.ConnectTimeout):
+            return True, None
+        if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+            return self.idempotent, None
+
+        # OpenAI SDKの接続エラー・タイムアウト（APITimeoutErrorはAPIConnectionErrorのサブクラス）
+        if type(error).__name__ in ("APIConnectionError", "APITimeoutError"):
+            return self.idempotent, None
+        return False, None
+
+    def _next_delay(self, attempt: int, started: float, retry_after: Optional[float]) -> Optional[float]:
+        """次の待機秒数。試行回数・経過時間の上限に達した場合はNone"""
+        if attempt + 1 >= self.max_attempts:
+            return None
+        delay = self.compute_delay(attempt, retry_after)
+        if time.monotonic() - started + delay > self.max_elapsed:
+            return None
+        return delay
+
+    def call(self, func: Callable[[], Any]) -> Any:
+        """
+        関数をリトライ付きで実行（例外を送出する呼び出し用）
+
+        Args:
+            func: 引数なしで呼び出す関数
+
+        Returns:
+            関数の戻り値
+        """
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            try:
+                return func()
+            except Exception as e:
+                retryable, retry_after = self.classify_exception(e)
+                delay = self._next_delay(attempt, started, retry_after) if retryable else None
+                if delay is None:
+                    raise
+                print(f"🔁 {self.name} 再試行 {attempt + 1}/{self.max_attempts - 1}（{delay:.1f}秒後）: {e}")
+                time.sleep(delay)
+                attempt += 1
+
+    async def call_async(self, func: Callable[[], Awaitable[Any]]) -> Any:
+        """call の非同期版（func はコルーチンを返す関数）"""
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            try:
+                return await func()
+            except Exception as e:
+                retryable, retry_after = self.classify_exception(e)
+                delay = self._next_delay(attempt, started, retry_after) if retryable else None
+                if delay is None:
+                    raise
+                print(f"🔁 {self.name} 再試行 {attempt + 1}/{self.max_attempts - 1}（{delay:.1f}秒後）: {e}")
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    def request(self, method: str, url: str, session: Optional[requests.Session] = None, **kwargs) -> requests.Response:
+        """
+        HTTPリクエストをリトライ付きで送信（タイムアウト未指定時はポリシーの値を使用）
+        再試行対象のステータスが上限まで続いた場合は最後のレスポンスをそのまま返す
+
+        Args:
+            method: HTTPメソッド
+            url: URL
+            session: 使用するセッション（省略時は requests モジュール）
+            **kwargs: requests に渡す引数
+
+        Returns:
+            レスポンス
+        """
+        kwargs.setdefault("timeout", self.requests_timeout)
+        sender = session or requests
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            try:
+                response = sender.request(method, url, **kwargs)
+            except Exception as e:
+                retryable, retry_after = self.classify_exception(e)
+                delay = self._next_delay(attempt, started, retry_after) if retryable else None
+                if delay is None:
+                    raise
+                print(f"🔁 {self.name} 再試行 {attempt + 1}/{self.max_attempts - 1}（{delay:.1f}秒後）: {e}")
+            else:
+                if not self._is_retryable_status(response.status_code):
+                    return response
+                delay = self._next_delay(attempt, started, self.parse_retry_after(response.headers))
+                if delay is None:
+                    return response
+                print(f"🔁 {self.name} 再試行 {attempt + 1}/{self.max_attempts - 1}（{delay:.1f}秒後）: HTTP {response.status_code}")
+            time.sleep(delay)
+            attempt += 1
+
+_policies: Dict[str, RetryPolicy] = {}
+
+def get_retry_policy(name: str) -> RetryPolicy:
+    """
+    呼び出し種別のリトライポリシーを取得
+    RETRY_<種別>_<項目> の環境変数で上書き可能（例: RETRY_WP_READ_TIMEOUT=20, RETRY_OPENAI_CHAT_MAX_ATTEMPTS=5）
+
+    Args:
+        name: openai_chat / openai_image / wp_read / wp_write / wp_media / download
+    """
+    policy = _policies.get(name)
+    if policy is None:
+        settings = dict(DEFAULT_POLICIES.get(name, {}))
+        for field, cast in (("max_attempts", int), ("base_delay", float), ("max_delay", float),
+                            ("max_elapsed", float), ("timeout", float), ("connect_timeout", float)):
+            value = os.getenv(f"RETRY_{name.upper()}_{field.upper()}")
+            if value:
+                settings[field] = cast(value)
+        policy = RetryPolicy(name=name, **settings)
+        _policies[name] = policy
+    return policy
+
+def request_with_retry(method: str, url: str, call_class: str = "wp_read", **kwargs) -> requests.Response:
+    """
+    呼び出し種別のポリシーでHTTPリクエストを送信
+
+    Args:
+        method: HTTPメソッド
+        url: URL
+        call_class: 呼び出し種別（get_retry_policy を参照）
+        **kwargs: requests に渡す引数
+    """
+    return get_retry_policy(call_class).request(method, url, **kwargs)
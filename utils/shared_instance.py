@@ -0,0 +1,36 @@
+"""
+環境変数の設定に基づくプロセス内の共有インスタンス
+キャッシュ・ジョブキュー・クライアントなどを初回の取得時に生成し、以降は使い回す
+"""
+
+import os
+import threading
+from typing import Callable, Generic, Optional, TypeVar
+
+T = TypeVar("T")
+
+class SharedInstance(Generic[T]):
+    """初回の取得時に生成する共有インスタンス（スレッドセーフ）"""
+
+    def __init__(self, factory: Callable[[], T], enabled_env: Optional[str] = None):
+        """
+        共有インスタンスの初期化
+
+        Args:
+            factory: インスタンスを生成する関数（環境変数は初回の取得時に読む）
+            enabled_env: 有効・無効を切り替える環境変数（"true" 以外ならNoneを返す。省略時は常に有効）
+        """
+        self.factory = factory
+        self.enabled_env = enabled_env
+        self._instance: Optional[T] = None
+        self._lock = threading.Lock()
+
+    def get(self) -> Optional[T]:
+        """共有インスタンスを取得（無効の場合はNone）"""
+        if self.enabled_env and os.getenv(self.enabled_env, "true").lower() != "true":
+            return None
+
+        with self._lock:
+            if self._instance is None:
+                self._instance = self.factory()
+        return self._instance
@@ -0,0 +1,64 @@
+"""
+SQLiteに保存するキャッシュ・ジョブキュー・台帳の共通処理
+接続はスレッド・プロセス間で共有せず都度作成し、WALモードで読み込みと書き込みを並行させる
+"""
+
+import os
+import sqlite3
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Iterator
+
+class SQLiteStore(ABC):
+    """SQLiteファイル1つに保存するストアの基底クラス（サブクラスは _create_tables でテーブルを作成する）"""
+
+    # 行を列名で参照する場合はサブクラスで sqlite3.Row を指定
+    row_factory = None
+
+    def __init__(self, db_path: str):
+        """
+        保存先の初期化（ディレクトリ・テーブルがなければ作成）
+
+        Args:
+            db_path: SQLiteファイルのパス
+        """
+        self.db_path = db_path
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._create_tables(conn)
+
+    @abstractmethod
+    def _create_tables(self, conn: sqlite3.Connection):
+        """テーブル・インデックスを作成"""
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """SQLite接続を作成（終了時にコミットして閉じる）"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = self.row_factory
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _write_lock(self) -> Iterator[sqlite3.Connection]:
+        """書き込みロックを取ったトランザクション（確認と更新の間に他のワーカーが割り込まないようにする）"""
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = self.row_factory
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
@@ -0,0 +1,262 @@
+"""
+WordPressのタグ・カテゴリのID対応表（サイトごと）
+(タクソノミー, 名前, 親ID) → タームID をSQLiteに保存し、検索はメモリ上で行う。
+作成したタームはその場で書き込み、WordPress側で削除されていたIDは無効化する
+"""
+
+import os
+import html
+import time
+import sqlite3
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+from utils.shared_instance import SharedInstance
+from utils.sqlite_store import SQLiteStore
+
+class TermCache(SQLiteStore):
+    """タグ・カテゴリ名とタームIDの対応表"""
+
+    def __init__(self, db_path: str = "cache/term_cache.sqlite3", max_age: int = 0):
+        """
+        キャッシュの初期化
+
+        Args:
+            db_path: SQLiteファイルのパス
+            max_age: 対応を信頼する期間（秒）。これより古い対応はWordPressに問い合わせ直す。0以下の場合は無期限
+        """
+        self.max_age = max_age
+        self._memory: Dict[Tuple[str, str], Dict[Tuple[str, int], Tuple[int, float]]] = {}
+        self._lock = threading.Lock()
+
+        super().__init__(db_path)
+
+    def _create_tables(self, conn: sqlite3.Connection):
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS sync_state (
+                site TEXT NOT NULL,
+                taxonomy TEXT NOT NULL,
+                max_id INTEGER NOT NULL,
+                full_synced_at REAL NOT NULL,
+                synced_at REAL NOT NULL,
+                PRIMARY KEY (site, taxonomy)
+            )
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS terms (
+                site TEXT NOT NULL,
+                taxonomy TEXT NOT NULL,
+                name_key TEXT NOT NULL,
+                parent INTEGER NOT NULL,
+                term_id INTEGER NOT NULL,
+                name TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (site, taxonomy, name_key, parent)
+            )
+            """
+        )
+
+    @staticmethod
+    def normalize(name: str) -> str:
+        """
+        ターム名を正規化（WordPressが返すHTMLエスケープ済みの名前・前後の空白・大文字/小文字の違いを吸収）
+        """
+        return html.unescape(name).strip().casefold()
+
+    def _entries(self, site: str, taxonomy: str) -> Dict[Tuple[str, int], Tuple[int, float]]:
+        """サイト・タクソノミーの対応表（初回はSQLiteから読み込む。呼び出し側でロックを取る）"""
+        entries = self._memory.get((site, taxonomy))
+        if entries is None:
+            with self._connect() as conn:
+                rows = conn.execute(
+                    "SELECT name_key, parent, term_id, updated_at FROM terms WHERE site = ? AND taxonomy = ?",
+                    (site, taxonomy)
+                ).fetchall()
+            entries = {(name_key, parent): (term_id, updated_at) for name_key, parent, term_id, updated_at in rows}
+            self._memory[(site, taxonomy)] = entries
+        return entries
+
+    def get(self, site: str, taxonomy: str, name: str, parent: int = 0) -> Optional[int]:
+        """
+        タームIDを取得
+
+        Args:
+            site: サイトURL
+            taxonomy: tags / categories
+            name: ターム名
+            parent: 親タームID（タグは0）
+
+        Returns:
+            タームID。対応がない・期限切れの場合はNone
+        """
+        with self._lock:
+            entry = self._entries(site, taxonomy).get((self.normalize(name), parent))
+        if entry is None:
+            return None
+        term_id, updated_at = entry
+        if self.max_age > 0 and time.time() - updated_at > self.max_age:
+            return None
+        return term_id
+
+    def set(self, site: str, taxonomy: str, name: str, term_id: int, parent: int = 0):
+        """
+        タームIDを記録（取得・作成のたびに書き込む）
+
+        Args:
+            site: サイトURL
+            taxonomy: tags / categories
+            name: ターム名
+            term_id: タームID
+            parent: 親タームID（タグは0）
+        """
+        self.set_many(site, taxonomy, [(name, parent, term_id)])
+
+    def set_many(self, site: str, taxonomy: str, terms: Iterable[Tuple[str, int, int]]):
+        """
+        複数のタームIDをまとめて記録
+
+        Args:
+            site: サイトURL
+            taxonomy: tags / categories
+            terms: (ターム名, 親タームID, タームID) のリスト
+        """
+        now = time.time()
+        rows = [(site, taxonomy, self.normalize(name), parent, term_id, html.unescape(name), now)
+                for name, parent, term_id in terms]
+        if not rows:
+            return
+        with self._lock:
+            with self._connect() as conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO terms (site, taxonomy, name_key, parent, term_id, name, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+            entries = self._entries(site, taxonomy)
+            for _, _, name_key, parent, term_id, _, updated_at in rows:
+                entries[(name_key, parent)] = (term_id, updated_at)
+
+    def replace_all(self, site: str, taxonomy: str, terms: Iterable[Tuple[str, int, int]]):
+        """
+        サイト・タクソノミーの対応表を丸ごと置き換える（一括同期用。WordPress側で削除されたタームも消える）
+
+        Args:
+            site: サイトURL
+            taxonomy: tags / categories
+            terms: (ターム名, 親タームID, タームID) のリスト
+        """
+        now = time.time()
+        rows = [(site, taxonomy, self.normalize(name), parent, term_id, html.unescape(name), now)
+                for name, parent, term_id in terms]
+        with self._lock:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM terms WHERE site = ? AND taxonomy = ?", (site, taxonomy))
+                conn.executemany(
+                    "INSERT OR REPLACE INTO terms (site, taxonomy, name_key, parent, term_id, name, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+            self._memory[(site, taxonomy)] = {
+                (name_key, parent): (term_id, updated_at)
+                for _, _, name_key, parent, term_id, _, updated_at in rows
+            }
+
+    def get_sync_state(self, site: str, taxonomy: str) -> Optional[Dict[str, float]]:
+        """
+        一括同期の状態を取得
+
+        Returns:
+            max_id（同期済みの最大タームID）・full_synced_at（全件同期の時刻）・synced_at（最後の同期の時刻）。
+            未同期の場合はNone
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT max_id, full_synced_at, synced_at FROM sync_state WHERE site = ? AND taxonomy = ?",
+                (site, taxonomy)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"max_id": row[0], "full_synced_at": row[1], "synced_at": row[2]}
+
+    def set_sync_state(self, site: str, taxonomy: str, max_id: int, full: bool = False):
+        """
+        一括同期の状態を記録
+
+        Args:
+            site: サイトURL
+            taxonomy: tags / categories
+            max_id: 同期済みの最大タームID
+            full: 全件同期の場合はTrue
+        """
+        now = time.time()
+        state = self.get_sync_state(site, taxonomy)
+        full_synced_at = now if full or state is None else state["full_synced_at"]
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sync_state (site, taxonomy, max_id, full_synced_at, synced_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (site, taxonomy, max_id, full_synced_at, now)
+            )
+
+    def invalidate_ids(self, site: str, taxonomy: str, term_ids: Iterable[int]):
+        """
+        タームIDの対応を削除（WordPress側で削除されていた場合。子タームの対応も削除する）
+
+        Args:
+            site: サイトURL
+            taxonomy: tags / categories
+            term_ids: 削除されていたタームID
+        """
+        term_ids = list(term_ids)
+        if not term_ids:
+            return
+        placeholders = ",".join("?" * len(term_ids))
+        with self._lock:
+            with self._connect() as conn:
+                conn.execute(
+                    f"DELETE FROM terms WHERE site = ? AND taxonomy = ? "
+                    f"AND (term_id IN ({placeholders}) OR parent IN ({placeholders}))",
+                    [site, taxonomy] + term_ids + term_ids
+                )
+            entries = self._entries(site, taxonomy)
+            for key, (term_id, _) in list(entries.items()):
+                if term_id in term_ids or key[1] in term_ids:
+                    del entries[key]
+
+    def clear(self, site: Optional[str] = None):
+        """対応表を削除（site を省略した場合は全サイト）"""
+        with self._lock:
+            with self._connect() as conn:
+                if site is None:
+                    conn.execute("DELETE FROM terms")
+                    conn.execute("DELETE FROM sync_state")
+                else:
+                    conn.execute("DELETE FROM terms WHERE site = ?", (site,))
+                    conn.execute("DELETE FROM sync_state WHERE site = ?", (site,))
+            self._memory.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        対応表の統計情報を取得
+
+        Returns:
+            サイト数・ターム数
+        """
+        with self._connect() as conn:
+            sites, terms = conn.execute("SELECT COUNT(DISTINCT site), COUNT(*) FROM terms").fetchone()
+        return {"sites": sites, "terms": terms}
+
+_default_cache = SharedInstance(lambda: TermCache(
+    db_path=os.getenv("TERM_CACHE_PATH", "cache/term_cache.sqlite3"),
+    max_age=int(float(os.getenv("TERM_CACHE_MAX_AGE_DAYS", "30")) * 86400)
+), enabled_env="TERM_CACHE")
+
+def get_term_cache() -> Optional[TermCache]:
+    """
+    環境変数の設定に基づく共有タームキャッシュを取得
+    TERM_CACHE=false の場合はNone（毎回WordPressに問い合わせる）
+    """
+    return _default_cache.get()
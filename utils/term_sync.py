@@ -0,0 +1,129 @@
+"""
+WordPressのタグ・カテゴリをタームキャッシュへ一括同期
+全件同期: /wp/v2/tags・/wp/v2/categories を1ページ100件で取得し（1ページ目の X-WP-TotalPages を見て
+残りのページを並列取得）、対応表を1回で置き換える。
+差分同期: IDの降順で取得し、前回同期した最大IDより新しいタームだけを追加する（通常は1リクエスト）
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from utils.term_cache import TermCache
+from utils.wp_client import WordPressClient
+
+# 1ページの件数（REST APIの上限）と取得するフィールド
+TERM_PAGE_SIZE = 100
+TERM_FIELDS = "id,name,parent,slug"
+
+def fetch_term_page(client: WordPressClient, taxonomy: str, page: int, order: str = "asc") -> Tuple[List[dict], int]:
+    """
+    タームを1ページ取得（ページ位置がずれないようIDの順に並べる）
+
+    Args:
+        client: WordPress REST APIクライアント
+        taxonomy: tags / categories
+        page: ページ番号（1から）
+        order: asc / desc
+
+    Returns:
+        (タームのリスト, 総ページ数)
+    """
+    resp = client.get(
+        f"wp/v2/{taxonomy}",
+        fields=TERM_FIELDS,
+        params={"per_page": TERM_PAGE_SIZE, "page": page, "orderby": "id", "order": order}
+    )
+    if resp.status_code == 400 and page > 1:
+        # 取得中にタームが減り、ページ数が縮んだ場合
+        return [], page - 1
+    resp.raise_for_status()
+    return resp.json(), int(resp.headers.get("X-WP-TotalPages", "1") or 1)
+
+def fetch_all_terms(client: WordPressClient, taxonomy: str, max_workers: int = 4) -> List[dict]:
+    """
+    タームを全件取得（2ページ目以降は並列取得）
+
+    Args:
+        client: WordPress REST APIクライアント
+        taxonomy: tags / categories
+        max_workers: ページの並列取得数
+    """
+    terms, total_pages = fetch_term_page(client, taxonomy, 1)
+    if total_pages > 1:
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            for page_terms, _ in executor.map(
+                lambda page: fetch_term_page(client, taxonomy, page), range(2, total_pages + 1)
+            ):
+                terms.extend(page_terms)
+    return terms
+
+def fetch_new_terms(client: WordPressClient, taxonomy: str, since_id: int) -> List[dict]:
+    """
+    since_id より新しいタームを取得（IDの降順に、既知のIDに達するまでページを進める）
+
+    Args:
+        client: WordPress REST APIクライアント
+        taxonomy: tags / categories
+        since_id: 前回同期した最大タームID
+    """
+    new_terms = []
+    page = 1
+    while True:
+        terms, total_pages = fetch_term_page(client, taxonomy, page, order="desc")
+        new_terms.extend(term for term in terms if term["id"] > since_id)
+        if not terms or terms[-1]["id"] <= since_id or page >= total_pages:
+            return new_terms
+        page += 1
+
+def _rows(terms: Iterable[dict]) -> List[Tuple[str, int, int]]:
+    """APIのタームを TermCache の (ターム名, 親タームID, タームID) に変換（タグには parent がない）"""
+    return [(term["name"], term.get("parent", 0), term["id"]) for term in terms]
+
+def sync_terms(client: WordPressClient,
+               cache: TermCache,
+               site: str,
+               taxonomies: Iterable[str] = ("categories", "tags"),
+               mode: str = "auto",
+               interval: float = 3600,
+               full_interval: float = 86400,
+               max_workers: int = 4) -> Dict[str, Optional[int]]:
+    """
+    タグ・カテゴリをタームキャッシュへ同期
+
+    Args:
+        client: WordPress REST APIクライアント
+        cache: タームキャッシュ
+        site: サイトURL（キャッシュのキー）
+        taxonomies: 同期するタクソノミー
+        mode: full（全件）/ incremental（差分。未同期なら全件）/
+              auto（未同期・前回の全件同期から full_interval 秒経過なら全件、前回の同期から interval 秒経過なら差分）
+        interval: auto の差分同期の間隔（秒）
+        full_interval: auto の全件同期の間隔（秒）。削除されたタームは全件同期でだけ対応表から消える
+        max_workers: 全件同期のページの並列取得数
+
+    Returns:
+        タクソノミーごとの取得件数（同期しなかった場合はNone）
+    """
+    results: Dict[str, Optional[int]] = {}
+    for taxonomy in taxonomies:
+        state = cache.get_sync_state(site, taxonomy)
+        now = time.time()
+        full = mode == "full" or state is None or (
+            mode == "auto" and now - state["full_synced_at"] >= full_interval
+        )
+        if not full and mode == "auto" and now - state["synced_at"] < interval:
+            results[taxonomy] = None
+            continue
+
+        if full:
+            terms = fetch_all_terms(client, taxonomy, max_workers)
+            cache.replace_all(site, taxonomy, _rows(terms))
+            max_id = max((term["id"] for term in terms), default=0)
+        else:
+            terms = fetch_new_terms(client, taxonomy, state["max_id"])
+            cache.set_many(site, taxonomy, _rows(terms))
+            max_id = max([state["max_id"]] + [term["id"] for term in terms])
+        cache.set_sync_state(site, taxonomy, max_id, full=full)
+        results[taxonomy] = len(terms)
+    return results
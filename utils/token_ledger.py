@@ -0,0 +1,304 @@
+"""
+実行ごとのトークン・コスト台帳
+チャット・画像生成の各呼び出しをステージ名付きで記録し、実行の最後に集計を表示する
+"""
+
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+# モデル別単価（USD / 100万トークン）: (入力, キャッシュ済み入力, 出力)
+CHAT_PRICES = {
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-3.5-turbo": (0.50, 0.50, 1.50)
+}
+
+# 画像1枚あたりの単価（USD）: (モデル, 品質, サイズ)
+IMAGE_PRICES = {
+    ("dall-e-3", "standard", "1024x1024"): 0.040,
+    ("dall-e-3", "standard", "1792x1024"): 0.080,
+    ("dall-e-3", "standard", "1024x1792"): 0.080,
+    ("dall-e-3", "hd", "1024x1024"): 0.080,
+    ("dall-e-3", "hd", "1792x1024"): 0.120,
+    ("dall-e-3", "hd", "1024x1792"): 0.120,
+    ("dall-e-2", "standard", "256x256"): 0.016,
+    ("dall-e-2", "standard", "512x512"): 0.018,
+    ("dall-e-2", "standard", "1024x1024"): 0.020
+}
+
+_current_stage: ContextVar[Optional[str]] = ContextVar("token_ledger_stage", default=None)
+
+@contextmanager
+def ledger_stage(name: str):
+    """
+    このブロック内の呼び出しを指定したステージ名で記録する
+    （呼び出し側で stage を指定していない場合に使われる）
+    """
+    token = _current_stage.set(name)
+    try:
+        yield
+    finally:
+        _current_stage.reset(token)
+
+def current_stage(default: str = "other") -> str:
+    """現在のステージ名を取得"""
+    return _current_stage.get() or default
+
+def _ratio(part: int, whole: int) -> float:
+    return part / whole if whole else 0.0
+
+class TokenLedger:
+    """1回の実行（1記事）分のトークン・コスト台帳"""
+
+    def __init__(self, run_id: Optional[str] = None, budget_tokens: int = 0, budget_seconds: float = 0):
+        """
+        台帳の初期化
+
+        Args:
+            run_id: 実行ID
+            budget_tokens: 1記事あたりのトークン予算（0の場合は無制限）
+            budget_seconds: 1記事あたりの所要時間の予算（秒、0の場合は無制限）
+        """
+        self.run_id = run_id or time.strftime("%Y%m%d-%H%M%S")
+        self.budget_tokens = budget_tokens
+        self.budget_seconds = budget_seconds
+        self.started = time.monotonic()
+        self.entries: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def record_chat(self,
+                    stage: str,
+                    model: str,
+                    usage: Optional[Any],
+                    latency: float,
+                    cache_hit: bool = False):
+        """
+        チャット補完の呼び出しを記録
+
+        Args:
+            stage: ステージ名
+            model: モデル名
+            usage: 応答の usage（prompt_tokens / completion_tokens / prompt_tokens_details）
+            latency: 所要時間（秒）
+            cache_hit: ローカルキャッシュから返した場合はTrue（課金なし）
+        """
+        prompt_tokens = completion_tokens = cached_tokens = 0
+        if usage is not None and not cache_hit:
+            prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+            completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+            details = getattr(usage, "prompt_tokens_details", None)
+            cached_tokens = getattr(details, "cached_tokens", 0) or 0
+
+        input_price, cached_price, output_price = CHAT_PRICES.get(model, CHAT_PRICES["gpt-4o"])
+        cost = ((prompt_tokens - cached_tokens) * input_price
+                + cached_tokens * cached_price
+                + completion_tokens * output_price) / 1_000_000
+
+        self._append({
+            "kind": "chat",
+            "stage": stage,
+            "model": model,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "cached_tokens": cached_tokens,
+            "cache_hit": cache_hit,
+            "latency": round(latency, 3),
+            "cost": cost
+        })
+
+    def record_image(self, stage: str, model: str, size: str, quality: str, latency: float):
+        """
+        画像生成の呼び出しを記録
+
+        Args:
+            stage: ステージ名
+            model: モデル名
+            size: 画像サイズ
+            quality: 画質
+            latency: 所要時間（秒）
+        """
+        self._append({
+            "kind": "image",
+            "stage": stage,
+            "model": model,
+            "size": size,
+            "quality": quality,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "cached_tokens": 0,
+            "cache_hit": False,
+            "latency": round(latency, 3),
+            "cost": IMAGE_PRICES.get((model, quality, size), 0.0)
+        })
+
+    def _append(self, entry: Dict[str, Any]):
+        entry["timestamp"] = time.time()
+        with self._lock:
+            self.entries.append(entry)
+
+    def total_tokens(self) -> int:
+        """課金対象の合計トークン数"""
+        with self._lock:
+            return sum(e["prompt_tokens"] + e["completion_tokens"] for e in self.entries)
+
+    def over_budget(self) -> bool:
+        """トークン予算を超えているか"""
+        return self.budget_tokens > 0 and self.total_tokens() >= self.budget_tokens
+
+    def remaining_seconds(self) -> Optional[float]:
+        """所要時間の予算の残り秒数（予算なしの場合はNone）"""
+        if self.budget_seconds <= 0:
+            return None
+        return self.budget_seconds - (time.monotonic() - self.started)
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        ステージ別の集計
+
+        Returns:
+            合計値とステージ別の内訳
+        """
+        stages: Dict[str, Dict[str, Any]] = {}
+        with self._lock:
+            entries = list(self.entries)
+
+        for e in entries:
+            stage = stages.setdefault(e["stage"], {
+                "calls": 0, "images": 0, "cache_hits": 0, "prompt_tokens": 0,
+                "completion_tokens": 0, "cached_tokens": 0, "latency": 0.0, "cost": 0.0, "models": []
+            })
+            stage["calls"] += 1
+            stage["images"] += 1 if e["kind"] == "image" else 0
+            stage["cache_hits"] += 1 if e["cache_hit"] else 0
+            for key in ("prompt_tokens", "completion_tokens", "cached_tokens", "latency", "cost"):
+                stage[key] += e[key]
+            if e["model"] not in stage["models"]:
+                stage["models"].append(e["model"])
+
+        # プロバイダー側のプロンプトキャッシュに載った入力トークンの割合
+        for stage in stages.values():
+            stage["prompt_cache_ratio"] = _ratio(stage["cached_tokens"], stage["prompt_tokens"])
+        prompt_tokens = sum(s["prompt_tokens"] for s in stages.values())
+        cached_tokens = sum(s["cached_tokens"] for s in stages.values())
+
+        return {
+            "run_id": self.run_id,
+            "budget_tokens": self.budget_tokens,
+            "total_tokens": sum(s["prompt_tokens"] + s["completion_tokens"] for s in stages.values()),
+            "prompt_tokens": prompt_tokens,
+            "cached_tokens": cached_tokens,
+            "prompt_cache_ratio": _ratio(cached_tokens, prompt_tokens),
+            "images": sum(s["images"] for s in stages.values()),
+            "cost": sum(s["cost"] for s in stages.values()),
+            "stages": stages
+        }
+
+    def print_summary(self):
+        """集計を表示"""
+        summary = self.summary()
+        if not summary["stages"]:
+            return
+        print("\n💰 トークン・コスト集計")
+        print(f"{'ステージ':<22}{'呼出':>5}{'入力':>9}{'出力':>8}{'キャッシュ':>10}{'率':>6}{'秒':>8}{'USD':>9}")
+        ranked = sorted(summary["stages"].items(), key=lambda item: item[1]["cost"], reverse=True)
+        for name, s in ranked:
+            print(f"{name:<22}{s['calls']:>5}{s['prompt_tokens']:>9}{s['completion_tokens']:>8}"
+                  f"{s['cached_tokens']:>10}{s['prompt_cache_ratio']:>6.0%}{s['latency']:>8.1f}{s['cost']:>9.4f}")
+        budget = f" / 予算 {summary['budget_tokens']}" if summary["budget_tokens"] else ""
+        print(f"合計: {summary['total_tokens']}トークン{budget}・画像{summary['images']}枚・${summary['cost']:.4f}")
+        print(f"プロンプトキャッシュ: 入力{summary['prompt_tokens']}トークン中{summary['cached_tokens']}トークン"
+              f"（{summary['prompt_cache_ratio']:.0%}）")
+
+    def load(self, directory: str = "ledgers") -> int:
+        """
+        保存済みの同じ実行IDの台帳（中断した前回の実行分）を読み込み、記録の先頭に追加する
+
+        Returns:
+            読み込んだ記録の件数
+        """
+        path = os.path.join(directory, f"{self.run_id}.json")
+        if not os.path.exists(path):
+            return 0
+        with open(path, "r", encoding="utf-8") as f:
+            entries = json.load(f).get("entries", [])
+        with self._lock:
+            self.entries[:0] = entries
+        return len(entries)
+
+    def save(self, directory: str = "ledgers") -> str:
+        """
+        台帳をJSONで保存
+
+        Returns:
+            保存したファイルのパス
+        """
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{self.run_id}.json")
+        with self._lock:
+            entries = list(self.entries)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"summary": self.summary(), "entries": entries}, f, ensure_ascii=False, indent=2)
+        return path
+
+# 記事ごとの台帳（同じイベントループ上で複数の記事を並行生成しても、記事ごとに別の台帳・予算になる）
+_current_ledger: ContextVar[Optional[TokenLedger]] = ContextVar("token_ledger", default=None)
+# 記事の台帳を開始していないコンテキスト（単発のスクリプトなど）で使う台帳
+_fallback_ledger = None
+_fallback_ledger_lock = threading.Lock()
+
+def _new_ledger(run_id: Optional[str] = None) -> TokenLedger:
+    return TokenLedger(run_id=run_id,
+                       budget_tokens=int(os.getenv("ARTICLE_TOKEN_BUDGET", "0")),
+                       budget_seconds=float(os.getenv("ARTICLE_LATENCY_BUDGET", "0")))
+
+def start_token_ledger(run_id: Optional[str] = None) -> TokenLedger:
+    """
+    新しい記事の台帳を開始（ARTICLE_TOKEN_BUDGET でトークン予算、ARTICLE_LATENCY_BUDGET で所要時間の予算を設定）
+    台帳は現在のコンテキストに設定されるため、記事を並行生成する場合は各記事のタスク内で呼び出す
+    run_id を指定した場合、同じ実行IDの保存済み台帳があれば読み込む（再開した実行は前回分に追記して保存する）
+    """
+    ledger = _new_ledger(run_id)
+    if run_id:
+        try:
+            loaded = ledger.load(os.getenv("TOKEN_LEDGER_DIR", "ledgers"))
+            if loaded:
+                print(f"🔁 トークン台帳を再開: {loaded}件")
+        except (OSError, ValueError) as e:
+            print(f"⚠️ トークン台帳の読み込みエラー: {e}")
+    _current_ledger.set(ledger)
+    return ledger
+
+def get_token_ledger() -> TokenLedger:
+    """現在の記事の台帳を取得（未開始の場合はプロセス共通の台帳）"""
+    global _fallback_ledger
+    ledger = _current_ledger.get()
+    if ledger is not None:
+        return ledger
+    with _fallback_ledger_lock:
+        if _fallback_ledger is None:
+            _fallback_ledger = _new_ledger()
+        return _fallback_ledger
+
+def finish_token_ledger(directory: Optional[str] = None) -> Optional[str]:
+    """
+    現在の実行の集計を表示し、台帳を保存（TOKEN_LEDGER_DIR、既定は ledgers/）
+
+    Returns:
+        保存したファイルのパス。記録がない場合はNone
+    """
+    ledger = get_token_ledger()
+    if not ledger.entries:
+        return None
+    ledger.print_summary()
+    try:
+        path = ledger.save(directory or os.getenv("TOKEN_LEDGER_DIR", "ledgers"))
+        print(f"💾 トークン台帳: {path}")
+        return path
+    except OSError as e:
+        print(f"⚠️ トークン台帳の保存エラー: {e}")
+        return None
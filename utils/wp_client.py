@@ -0,0 +1,170 @@
+"""
+WordPress REST API クライアント
+認証情報を設定した keep-alive の requests.Session を共有し、投稿・メディア・タクソノミーの呼び出しで
+TCP/TLS 接続を再利用する。タイムアウトと再試行は utils.retry_policy の呼び出し種別ごとの設定に従う
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils.retry_policy import get_retry_policy
+from utils.shared_instance import SharedInstance
+
+# /batch/v1 で1回に送れるリクエスト数（WordPressの既定の上限）
+BATCH_MAX_REQUESTS = 25
+
+class WordPressClient:
+    """1サイト分のWordPress REST APIクライアント（スレッド間で共有可能）"""
+
+    def __init__(self,
+                 base_url: str,
+                 user: Optional[str] = None,
+                 app_password: Optional[str] = None,
+                 pool_connections: int = 2,
+                 pool_maxsize: int = 10,
+                 use_batch: bool = True):
+        """
+        クライアントの初期化
+
+        Args:
+            base_url: サイトURL（例: https://example.com）
+            user: ユーザー名
+            app_password: アプリケーションパスワード
+            pool_connections: 接続プールを保持するホスト数
+            pool_maxsize: 1ホストあたりに保持する接続数（画像の並列アップロード数以上にする）
+            use_batch: Falseの場合は /batch/v1 を使わず個別リクエストを並列送信する
+        """
+        self.base_url = base_url.rstrip("/")
+        # /batch/v1 に対応しているか（None: 未確認）
+        self.batch_supported: Optional[bool] = None if use_batch else False
+        self.session = requests.Session()
+        if user and app_password:
+            self.session.auth = (user, app_password)
+        self.session.headers.update({"Accept": "application/json"})
+
+        # 再試行は RetryPolicy で行うため urllib3 側の再試行は無効化
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def url(self, path: str) -> str:
+        """REST APIのパス（例: wp/v2/posts）をURLに変換"""
+        return f"{self.base_url}/wp-json/{path.lstrip('/')}"
+
+    def request(self,
+                method: str,
+                path: str,
+                call_class: str = "wp_read",
+                fields: Optional[str] = None,
+                **kwargs) -> requests.Response:
+        """
+        共有セッションでリクエストを送信（呼び出し種別のタイムアウト・再試行を適用）
+
+        Args:
+            method: HTTPメソッド
+            path: REST APIのパス（例: wp/v2/posts）
+            call_class: 呼び出し種別（wp_read / wp_write / wp_media）
+            fields: レスポンスに含めるフィールド（_fields。例: id,link）。省略時はすべて
+            **kwargs: requests に渡す引数
+
+        Returns:
+            レスポンス
+        """
+        if fields:
+            kwargs["params"] = dict(kwargs.get("params") or {}, _fields=fields)
+        return get_retry_policy(call_class).request(method, self.url(path), session=self.session, **kwargs)
+
+    def get(self, path: str, fields: Optional[str] = None, **kwargs) -> requests.Response:
+        """GETリクエスト（wp_read）"""
+        return self.request("GET", path, call_class="wp_read", fields=fields, **kwargs)
+
+    def post(self, path: str, call_class: str = "wp_write", fields: Optional[str] = None, **kwargs) -> requests.Response:
+        """POSTリクエスト（既定は wp_write。メディアのアップロードは wp_media）"""
+        return self.request("POST", path, call_class=call_class, fields=fields, **kwargs)
+
+    def batch(self, requests_: List[Dict[str, Any]], max_workers: int = 4) -> List[Tuple[int, Dict[str, Any]]]:
+        """
+        複数の書き込みリクエストを /batch/v1 でまとめて送信（BATCH_MAX_REQUESTS 件ごと、サーバー側で順に処理される）
+        /batch/v1 に対応していないサーバー（WordPress 5.6未満など）では個別リクエストを並列送信する
+
+        Args:
+            requests_: {"method": "POST", "path": "wp/v2/tags", "body": {...}, "fields": "id"} のリスト
+                       （fields はレスポンスに含めるフィールド。省略時はすべて）
+            max_workers: 個別リクエストの並列送信数
+
+        Returns:
+            リクエストと同じ順の (ステータスコード, レスポンスのJSON)
+        """
+        results = []
+        for start in range(0, len(requests_), BATCH_MAX_REQUESTS):
+            chunk = requests_[start:start + BATCH_MAX_REQUESTS]
+            responses = self._send_batch(chunk) if self.batch_supported is not False else None
+            if responses is None:
+                responses = self._send_concurrently(chunk, max_workers)
+            results.extend(responses)
+        return results
+
+    def _send_batch(self, chunk: List[Dict[str, Any]]) -> Optional[List[Tuple[int, Dict[str, Any]]]]:
+        """/batch/v1 で送信（送信できなかった場合はNone）"""
+        resp = self.post("batch/v1", json={
+            "requests": [
+                {"method": r.get("method", "POST"), "path": self._batch_path(r), "body": r.get("body", {})}
+                for r in chunk
+            ]
+        })
+        if resp.status_code in (404, 405):
+            print("ℹ️ /batch/v1 に対応していないため、個別リクエストを並列送信します")
+            self.batch_supported = False
+            return None
+        if resp.status_code != 200:
+            print(f"⚠️ /batch/v1 の送信に失敗しました（{resp.status_code}）。個別リクエストを並列送信します")
+            return None
+        self.batch_supported = True
+        responses = resp.json().get("responses", [])
+        return [(item.get("status", 500), item.get("body") or {}) for item in responses]
+
+    @staticmethod
+    def _batch_path(r: Dict[str, Any]) -> str:
+        """バッチ内のリクエストのパス（_fields はクエリ文字列で指定する）"""
+        path = "/" + r["path"].lstrip("/")
+        if r.get("fields"):
+            path += f"?_fields={r['fields']}"
+        return path
+
+    def _send_concurrently(self, chunk: List[Dict[str, Any]], max_workers: int) -> List[Tuple[int, Dict[str, Any]]]:
+        """個別リクエストを並列送信"""
+        def send(r: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+            resp = self.request(
+                r.get("method", "POST"), r["path"], call_class="wp_write", fields=r.get("fields"), json=r.get("body", {})
+            )
+            try:
+                body = resp.json()
+            except ValueError:
+                body = {}
+            return resp.status_code, body if isinstance(body, dict) else {}
+
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            return list(executor.map(send, chunk))
+
+    def close(self):
+        """セッションを閉じる"""
+        self.session.close()
+
+_default_client = SharedInstance(lambda: WordPressClient(
+    base_url=os.getenv("WP_URL", ""),
+    user=os.getenv("WP_USER"),
+    app_password=os.getenv("WP_APP_PASS"),
+    pool_maxsize=int(os.getenv("WP_POOL_MAXSIZE", "10")),
+    use_batch=os.getenv("WP_BATCH", "true").lower() == "true"
+))
+
+def get_wp_client() -> WordPressClient:
+    """
+    環境変数（WP_URL / WP_USER / WP_APP_PASS）のサイトの共有クライアントを取得
+    WP_POOL_MAXSIZE で1ホストあたりに保持する接続数、WP_BATCH=false で /batch/v1 を使わない設定
+    """
+    return _default_client.get()